@@ -0,0 +1,4 @@
+"""Performance benchmarks for query-stash.
+
+Run with `python -m benchmarks.run`; see `benchmarks/run.py` for options.
+"""
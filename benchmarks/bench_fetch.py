@@ -0,0 +1,71 @@
+from benchmarks.datasets import (
+    MIXED_ROWS,
+    NARROW_ROWS,
+    WIDE_COLUMNS,
+    WIDE_ROWS,
+    scaled,
+)
+from query_stash.connectors.duckdb import (
+    DuckDBCursor,
+    DuckDBDictCursor,
+    get_duckdb_connection,
+)
+
+QUERIES = {
+    "narrow": """\
+SELECT range AS id, 'customer ' || range AS name, range * 7 AS num_orders
+FROM range({n})""",
+    "wide": "SELECT "
+    + ", ".join(f"range + {c} AS col_{c}" for c in range(WIDE_COLUMNS))
+    + " FROM range({n})",
+    "long_strings": """\
+SELECT
+    range AS id
+    , repeat('x', 100 + (hash(range) % 1901)::INTEGER) AS payload
+    , 'lorem ipsum' || chr(10) AS note
+FROM range({n})""",
+    "nulls": """\
+SELECT
+    range AS id
+    , CASE WHEN range % 10 = 0 THEN 'name ' || range END AS maybe_name
+    , CASE WHEN range % 10 = 0 THEN range END AS maybe_total
+FROM range({n})""",
+    "decimals": """\
+SELECT range AS id, (range / 7)::DECIMAL(18, 6) AS amount, range / 13 AS ratio
+FROM range({n})""",
+    "datetimes": """\
+SELECT range AS id, TIMESTAMP '2023-01-01' + to_seconds(range) AS created_at
+FROM range({n})""",
+}
+
+SIZES = {
+    "narrow": NARROW_ROWS,
+    "wide": WIDE_ROWS,
+    "long_strings": MIXED_ROWS,
+    "nulls": MIXED_ROWS,
+    "decimals": MIXED_ROWS,
+    "datetimes": MIXED_ROWS,
+}
+
+
+class DuckDBFetchSuite:
+    """DuckDB -> pandas -> dicts (or value lists) on an in-memory db"""
+
+    params = list(QUERIES)
+
+    def setup(self, dataset: str):
+        self.conn = get_duckdb_connection({"path": ":memory:"})
+        self.query = QUERIES[dataset].format(n=scaled(SIZES[dataset]))
+
+    def time_fetchall(self, dataset: str):
+        cursor = DuckDBDictCursor(self.conn)
+        cursor.execute(self.query)
+        cursor.fetchall()
+
+    def time_fetchall_tuples(self, dataset: str):
+        cursor = DuckDBCursor(self.conn)
+        cursor.execute(self.query)
+        cursor.fetchall()
+
+    def teardown(self, dataset: str):
+        self.conn.close()
@@ -0,0 +1,67 @@
+"""CSV exports from a real Postgres: COPY vs server-side cursor + csv.writer
+
+Set QUERY_STASH_BENCH_POSTGRES_DSN (e.g. "dbname=postgres user=postgres
+host=localhost") to run these; they're skipped otherwise.
+"""
+
+import os
+import tempfile
+from itertools import chain
+
+import psycopg2
+
+from benchmarks.datasets import NARROW_ROWS, scaled
+from query_stash.connectors.postgres import (
+    copy_postgres_csv,
+    get_postgres_streaming_cursor,
+)
+from query_stash.export import CsvWriter, write_batches
+
+DSN_VARIABLE = "QUERY_STASH_BENCH_POSTGRES_DSN"
+BATCH_SIZE = 10_000
+
+QUERIES = {
+    "narrow": """\
+SELECT i AS id, 'customer ' || i AS name, i * 7 AS num_orders
+FROM generate_series(1, {n}) AS i""",
+    "mixed": """\
+SELECT
+    i AS id
+    , (i / 7.0)::NUMERIC(18, 6) AS amount
+    , TIMESTAMP '2023-01-01' + i * INTERVAL '1 second' AS created_at
+    , CASE WHEN i % 10 = 0 THEN 'name ' || i END AS maybe_name
+FROM generate_series(1, {n}) AS i""",
+}
+
+
+class PostgresCsvExportSuite:
+    params = list(QUERIES)
+
+    def setup(self, dataset: str):
+        dsn = os.environ.get(DSN_VARIABLE)
+        if not dsn:
+            raise NotImplementedError(f"set {DSN_VARIABLE} to run")
+        self.conn = psycopg2.connect(dsn)
+        self.query = QUERIES[dataset].format(n=scaled(NARROW_ROWS))
+        self.output_dir = tempfile.TemporaryDirectory()
+        self.output_path = os.path.join(self.output_dir.name, "export.csv")
+
+    def time_cursor_export(self, dataset: str):
+        cursor = get_postgres_streaming_cursor(self.conn, BATCH_SIZE)
+        cursor.execute(self.query)
+        # a named cursor only has a description once rows have been fetched
+        first_batch = cursor.fetchmany(BATCH_SIZE)
+        column_names = [column.name for column in cursor.description]
+        batches = chain([first_batch], iter(lambda: cursor.fetchmany(BATCH_SIZE), []))
+        write_batches(CsvWriter(self.output_path, column_names), batches)
+        cursor.close()
+        self.conn.rollback()
+
+    def time_copy_export(self, dataset: str):
+        with open(self.output_path, "w") as output_file:
+            copy_postgres_csv(self.conn, self.query, output_file)
+        self.conn.rollback()
+
+    def teardown(self, dataset: str):
+        self.conn.close()
+        self.output_dir.cleanup()
@@ -0,0 +1,34 @@
+from benchmarks.datasets import DATASETS, get_dataset
+from query_stash.render import get_rendered_table
+from query_stash.schema import Schema
+
+
+class RenderSuite:
+    """Building ColumnSpecs and formatting rows for each synthetic dataset"""
+
+    params = list(DATASETS)
+
+    def setup(self, dataset: str):
+        self.rows = get_dataset(dataset)
+        self.rendered_table = get_rendered_table(self.rows)
+        self.parallel_rendered_table = get_rendered_table(self.rows, processes=4)
+        self.schema = Schema.from_rows(self.rows)
+        self.tuple_rows = [tuple(row.values()) for row in self.rows]
+
+    def time_get_rendered_table(self, dataset: str):
+        get_rendered_table(self.rows)
+
+    def time_get_rendered_table_tuple_rows(self, dataset: str):
+        get_rendered_table(self.tuple_rows, schema=self.schema)
+
+    def time_str_rendered_table(self, dataset: str):
+        str(self.rendered_table)
+
+    def time_str_rendered_table_4_processes(self, dataset: str):
+        str(self.parallel_rendered_table)
+
+    def time_get_rendered_table_sampled_widths(self, dataset: str):
+        get_rendered_table(self.rows, width_sample_size=1_000)
+
+    def time_render_fit_to_terminal(self, dataset: str):
+        str(get_rendered_table(self.rows, max_table_width=200))
@@ -0,0 +1,69 @@
+import os
+import tempfile
+
+from benchmarks.datasets import get_dataset
+from query_stash.diff import diff_results, diff_whole_rows
+from query_stash.query_stash import get_stashed_diff_side
+from query_stash.render import get_rendered_table
+from query_stash.sqlite import QueryStasher, ResultRowSettings
+
+
+# no limits, so every dataset's rows are stored
+UNLIMITED_ROWS = ResultRowSettings(None, None)
+
+
+class StashSuite:
+    """QueryStasher.stash of a rendered table and its rows into a fresh SQLite
+    FTS5 database"""
+
+    params = ["narrow", "wide", "long_strings"]
+
+    def setup(self, dataset: str):
+        self.directory = tempfile.TemporaryDirectory()
+        db_path = os.path.join(self.directory.name, "query-stash.db")
+        self.stasher = QueryStasher(db_path, result_row_settings=UNLIMITED_ROWS)
+        self.rendered_table = get_rendered_table(get_dataset(dataset))
+        self.table_text = str(self.rendered_table)
+
+    def time_stash(self, dataset: str):
+        self.stasher.stash(
+            "SELECT * FROM benchmark",
+            self.table_text,
+            "",
+            "bench",
+            "duckdb",
+            rows=self.rendered_table.rows,
+            schema=self.rendered_table.schema,
+        )
+
+    def teardown(self, dataset: str):
+        self.directory.cleanup()
+
+
+class DiffSuite:
+    """Diffing two stashed results by hash, on their id key and on whole rows"""
+
+    params = ["narrow", "decimals"]
+
+    def setup(self, dataset: str):
+        self.directory = tempfile.TemporaryDirectory()
+        db_path = os.path.join(self.directory.name, "query-stash.db")
+        self.stasher = QueryStasher(db_path, result_row_settings=UNLIMITED_ROWS)
+        rows = get_dataset(dataset)
+        changed = [
+            {**row, "id": -row["id"]} if i % 100 == 0 else row
+            for i, row in enumerate(rows)
+        ]
+        old_id = self.stasher.stash("SELECT 1", "", "", "bench", "duckdb", rows=rows)
+        new_id = self.stasher.stash("SELECT 1", "", "", "bench", "duckdb", rows=changed)
+        self.old = get_stashed_diff_side(self.stasher, old_id)
+        self.new = get_stashed_diff_side(self.stasher, new_id)
+
+    def time_diff_on_key(self, dataset: str):
+        diff_results(self.old, self.new, ["id"])
+
+    def time_diff_whole_rows(self, dataset: str):
+        diff_whole_rows(self.old, self.new)
+
+    def teardown(self, dataset: str):
+        self.directory.cleanup()
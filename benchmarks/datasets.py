@@ -0,0 +1,95 @@
+"""Synthetic datasets shaped like the results query-stash renders and stashes"""
+
+import os
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import List
+
+from query_stash.types import RowDict
+
+SCALE = float(os.environ.get("QUERY_STASH_BENCH_SCALE", "1.0"))
+
+NARROW_ROWS = 1_000_000
+WIDE_ROWS = 10_000
+WIDE_COLUMNS = 200
+MIXED_ROWS = 100_000
+
+START = datetime(2023, 1, 1)
+
+
+def scaled(n: int) -> int:
+    return max(2, int(n * SCALE))
+
+
+def narrow_rows(n: int = NARROW_ROWS) -> List[RowDict]:
+    n = scaled(n)
+    return [{"id": i, "name": f"customer {i}", "num_orders": i * 7} for i in range(n)]
+
+
+def wide_rows(n: int = WIDE_ROWS, columns: int = WIDE_COLUMNS) -> List[RowDict]:
+    n = scaled(n)
+    names = [f"col_{c}" for c in range(columns)]
+    return [{name: i + c for c, name in enumerate(names)} for i in range(n)]
+
+
+def null_heavy_rows(n: int = MIXED_ROWS) -> List[RowDict]:
+    n = scaled(n)
+    rng = random.Random(0)
+    return [
+        {
+            "id": i,
+            "maybe_name": f"name {i}" if rng.random() < 0.1 else None,
+            "maybe_total": rng.randint(0, 10_000) if rng.random() < 0.1 else None,
+            "maybe_updated_at": START if rng.random() < 0.1 else None,
+        }
+        for i in range(n)
+    ]
+
+
+def long_string_rows(n: int = MIXED_ROWS) -> List[RowDict]:
+    n = scaled(n)
+    rng = random.Random(0)
+    return [
+        {"id": i, "payload": "x" * rng.randint(100, 2_000), "note": "lorem ipsum\n"}
+        for i in range(n)
+    ]
+
+
+def decimal_rows(n: int = MIXED_ROWS) -> List[RowDict]:
+    n = scaled(n)
+    return [
+        {
+            "id": i,
+            "amount": Decimal(i) / Decimal(7),
+            "sum_revenue": Decimal(i * 1_000) / Decimal(3),
+            "ratio": i / 13,
+        }
+        for i in range(n)
+    ]
+
+
+def datetime_rows(n: int = MIXED_ROWS) -> List[RowDict]:
+    n = scaled(n)
+    return [
+        {
+            "id": i,
+            "created_at": START + timedelta(seconds=i),
+            "updated_at": START + timedelta(minutes=i),
+        }
+        for i in range(n)
+    ]
+
+
+DATASETS = {
+    "narrow": narrow_rows,
+    "wide": wide_rows,
+    "nulls": null_heavy_rows,
+    "long_strings": long_string_rows,
+    "decimals": decimal_rows,
+    "datetimes": datetime_rows,
+}
+
+
+def get_dataset(name: str) -> List[RowDict]:
+    return DATASETS[name]()
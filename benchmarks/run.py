@@ -0,0 +1,182 @@
+"""Run the asv-style benchmark suites and compare them against stored baselines.
+
+Each `bench_*.py` module holds classes with an optional `params` list and
+`setup`/`teardown` methods; every `time_*` method is timed once per param.
+A `setup` raising NotImplementedError skips the benchmark (e.g. when the
+database it needs isn't configured).
+
+    python -m benchmarks.run                     # run and compare to baselines
+    python -m benchmarks.run --filter render     # only matching benchmarks
+    python -m benchmarks.run --scale 0.1 --save  # record new baselines
+
+The run fails (exit code 1) when a benchmark is slower than its baseline by
+more than the regression threshold, or has no baseline at all (record one with
+`--save`).  Runs at a scale the baselines weren't recorded at aren't compared.
+"""
+
+import argparse
+import importlib
+import inspect
+import json
+import pkgutil
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+import benchmarks
+from benchmarks import datasets
+
+BASELINES_PATH = Path(__file__).parent / "baselines.json"
+DEFAULT_THRESHOLD = 1.5
+
+
+class Benchmark(NamedTuple):
+    name: str
+    suite: type
+    method: str
+    param: Optional[str]
+
+
+class Result(NamedTuple):
+    name: str
+    seconds: float
+    baseline: Optional[float]
+
+    @property
+    def ratio(self) -> Optional[float]:
+        if self.baseline is None:
+            return None
+        return self.seconds / self.baseline
+
+
+def discover_benchmarks() -> Iterator[Benchmark]:
+    for module_info in pkgutil.iter_modules(benchmarks.__path__):
+        if not module_info.name.startswith("bench_"):
+            continue
+        module = importlib.import_module(f"benchmarks.{module_info.name}")
+        for class_name, suite in inspect.getmembers(module, inspect.isclass):
+            if suite.__module__ != module.__name__:
+                continue
+            methods = [m for m in dir(suite) if m.startswith("time_")]
+            params = getattr(suite, "params", [None])
+            for method in methods:
+                for param in params:
+                    name = f"{module_info.name}.{class_name}.{method}"
+                    if param is not None:
+                        name = f"{name}({param})"
+                    yield Benchmark(name, suite, method, param)
+
+
+def time_benchmark(benchmark: Benchmark, repeat: int) -> Optional[float]:
+    """Best-of-`repeat` wall clock time, with setup run once outside the timing
+
+    None if the benchmark was skipped.
+    """
+    instance = benchmark.suite()
+    args = [] if benchmark.param is None else [benchmark.param]
+    if hasattr(instance, "setup"):
+        try:
+            instance.setup(*args)
+        except NotImplementedError:
+            return None
+    try:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            getattr(instance, benchmark.method)(*args)
+            timings.append(time.perf_counter() - start)
+    finally:
+        if hasattr(instance, "teardown"):
+            instance.teardown(*args)
+    return min(timings)
+
+
+def load_baselines(scale: float) -> Optional[Dict[str, float]]:
+    """The stored baselines, or None if they were recorded at another scale"""
+    if not BASELINES_PATH.exists():
+        return {}
+    stored = json.loads(BASELINES_PATH.read_text())
+    if stored.get("scale") != scale:
+        print(
+            f"Baselines were recorded at scale {stored.get('scale')}, not {scale}; "
+            "not comparing",
+            file=sys.stderr,
+        )
+        return None
+    return stored["benchmarks"]
+
+
+def save_baselines(results: List[Result], scale: float):
+    stored = {"scale": scale, "benchmarks": {}}
+    if BASELINES_PATH.exists():
+        existing = json.loads(BASELINES_PATH.read_text())
+        if existing.get("scale") == scale:
+            stored = existing
+    for result in results:
+        stored["benchmarks"][result.name] = round(result.seconds, 6)
+    stored["benchmarks"] = dict(sorted(stored["benchmarks"].items()))
+    BASELINES_PATH.write_text(json.dumps(stored, indent=4) + "\n")
+
+
+def format_result(result: Result, threshold: float) -> str:
+    line = f"{result.name:<70} {result.seconds:>10.4f}s"
+    if result.ratio is None:
+        return f"{line}   (no baseline)"
+    flag = "  REGRESSION" if result.ratio > threshold else ""
+    return f"{line}   {result.ratio:>5.2f}x baseline{flag}"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--filter", default="", help="Substring of benchmark names")
+    parser.add_argument(
+        "--scale",
+        type=float,
+        default=datasets.SCALE,
+        help="Multiplier applied to every dataset's row count",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Fail when a benchmark takes more than this multiple of its baseline",
+    )
+    parser.add_argument(
+        "--save", action="store_true", help="Store results as baselines"
+    )
+    args = parser.parse_args(argv)
+
+    datasets.SCALE = args.scale
+    baselines = load_baselines(args.scale)
+    results = []
+    for benchmark in discover_benchmarks():
+        if args.filter not in benchmark.name:
+            continue
+        seconds = time_benchmark(benchmark, args.repeat)
+        if seconds is None:
+            print(f"{benchmark.name:<70}    skipped", flush=True)
+            continue
+        baseline = None if baselines is None else baselines.get(benchmark.name)
+        result = Result(benchmark.name, seconds, baseline)
+        print(format_result(result, args.threshold), flush=True)
+        results.append(result)
+
+    if args.save:
+        save_baselines(results, args.scale)
+        print(f"Saved {len(results)} baselines to {BASELINES_PATH}")
+        return 0
+    regressions = [
+        r for r in results if r.ratio is not None and r.ratio > args.threshold
+    ]
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) regressed past {args.threshold}x")
+    missing = [r for r in results if baselines is not None and r.baseline is None]
+    if missing:
+        print(f"{len(missing)} benchmark(s) have no baseline; record them with --save")
+    return 1 if regressions or missing else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
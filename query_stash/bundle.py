@@ -0,0 +1,164 @@
+"""Move stash entries between machines in compressed bundles
+
+    query-stash export team.qsb.gz --since 1200     # entries after stash id 1200
+    query-stash import team.qsb.gz
+
+A bundle is gzipped JSON lines: a header, then each entry (a stashed query with
+its stats, timings and result columns) followed by its result rows in batches,
+so neither end holds a whole result in memory.  Importing skips entries the
+stash already has (the same query run at the same time on the same connection),
+so bundles can overlap or be imported twice.
+"""
+
+import gzip
+import itertools
+import json
+import re
+from typing import IO, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from query_stash.sqlite import QueryStasher, StashEntry
+
+BUNDLE_FORMAT = "query-stash-bundle"
+BUNDLE_VERSION = 1
+ROW_BATCH_SIZE = 10_000
+TIMESTAMP_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}([ T]\d{2}:\d{2}(:\d{2})?)?$")
+
+
+class BundleException(Exception):
+    pass
+
+
+class Watermark(NamedTuple):
+    """Where an export starts: after a stash id, or after a time"""
+
+    query_id: int = 0
+    queried_at: str = ""
+
+
+class BundleSummary(NamedTuple):
+    entries: int
+    skipped: int
+    last_query_id: Optional[int]
+
+
+def parse_watermark(since: Optional[str]) -> Watermark:
+    """A stash id or a `YYYY-MM-DD[ HH:MM[:SS]]` time (UTC, like the stash)"""
+    if since is None:
+        return Watermark()
+    since = since.strip()
+    if since.isdigit():
+        return Watermark(query_id=int(since))
+    if TIMESTAMP_PATTERN.match(since):
+        return Watermark(queried_at=since.replace("T", " "))
+    raise BundleException(f"--since takes a stash id or a date/time, not {since!r}")
+
+
+def write_record(output: IO[str], record: dict):
+    output.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def write_bundle(
+    stasher: QueryStasher, output: IO[str], watermark: Watermark = Watermark()
+) -> BundleSummary:
+    write_record(output, {"format": BUNDLE_FORMAT, "version": BUNDLE_VERSION})
+    entries = 0
+    last_query_id = None
+    for entry in stasher.iter_entries(watermark.query_id, watermark.queried_at):
+        write_record(output, {"entry": entry._asdict()})
+        # rows keep their stored JSON text, so they hash the same when diffed
+        for batch in stasher.iter_result_row_json(entry.query_id, ROW_BATCH_SIZE):
+            write_record(output, {"rows": batch})
+        entries += 1
+        last_query_id = entry.query_id
+    return BundleSummary(entries, 0, last_query_id)
+
+
+def read_records(lines: Iterable[str]) -> Iterator[dict]:
+    lines = iter(lines)
+    header = json.loads(next(lines, "{}"))
+    if header.get("format") != BUNDLE_FORMAT:
+        raise BundleException("Not a query-stash bundle")
+    if header.get("version", 0) > BUNDLE_VERSION:
+        raise BundleException(
+            f"Bundle version {header['version']} is newer than this query-stash"
+        )
+    for line in lines:
+        yield json.loads(line)
+
+
+def number_entries(records: Iterable[dict]) -> Iterator[Tuple[int, dict]]:
+    """Records numbered by the entry they belong to"""
+    number = 0
+    for record in records:
+        if "entry" in record:
+            number += 1
+        yield number, record
+
+
+def group_entries(
+    records: Iterable[dict],
+) -> Iterator[Tuple[StashEntry, Iterator[List[str]]]]:
+    """Each entry with its row batches, read lazily as they're consumed"""
+    grouped = itertools.groupby(
+        number_entries(records), key=lambda numbered: numbered[0]
+    )
+    for _, group in grouped:
+        _, first = next(group)
+        if "entry" not in first:
+            raise BundleException("Bundle rows found before any entry")
+        entry = first["entry"]
+        entry = StashEntry(
+            **{
+                **entry,
+                "stats": None if entry["stats"] is None else tuple(entry["stats"]),
+                "timings": [tuple(timing) for timing in entry["timings"]],
+                "columns": [tuple(column) for column in entry["columns"]],
+            }
+        )
+        yield entry, (record["rows"] for _, record in group)
+
+
+def merge_bundle(stasher: QueryStasher, lines: Iterable[str]) -> BundleSummary:
+    entries = skipped = 0
+    last_query_id = None
+    for entry, row_batches in group_entries(read_records(lines)):
+        query_id = stasher.merge_entry(entry, row_batches)
+        if query_id is None:
+            skipped += 1
+        else:
+            entries += 1
+            last_query_id = query_id
+    return BundleSummary(entries, skipped, last_query_id)
+
+
+def export_bundle(
+    path: str, since: Optional[str] = None, stasher: Optional[QueryStasher] = None
+) -> str:
+    """Write stash entries after `since` (a stash id or time) to a bundle"""
+    try:
+        watermark = parse_watermark(since)
+    except BundleException as e:
+        return str(e)
+    stasher = stasher or QueryStasher()
+    with gzip.open(path, "wt", encoding="utf-8") as output:
+        summary = write_bundle(stasher, output, watermark)
+    if summary.last_query_id is None:
+        return f"No stashed queries to export; wrote an empty bundle to {path}"
+    return (
+        f"Exported {summary.entries:,} stashed queries to {path} "
+        f"(next time use --since {summary.last_query_id})"
+    )
+
+
+def import_bundle(path: str, stasher: Optional[QueryStasher] = None) -> str:
+    """Merge a bundle's entries into the stash, skipping ones it already has"""
+    stasher = stasher or QueryStasher()
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as lines:
+            summary = merge_bundle(stasher, lines)
+    except (BundleException, OSError, ValueError) as e:
+        return f"Can't import {path}: {e}"
+    return (
+        f"Imported {summary.entries:,} stashed queries from {path} "
+        f"({summary.skipped:,} already stashed)"
+    )
@@ -1,12 +1,32 @@
 # -*- coding: utf-8 -*-
 
 """Console script for query_stash."""
+import cProfile
+import shutil
 import sys
-from typing import Optional
+from typing import Optional, Tuple
 
 import click
 
-from query_stash.query_stash import connect_and_query_db
+from query_stash.bundle import export_bundle, import_bundle
+from query_stash.export import ARROW_FORMATS, EXPORT_FORMATS, STDOUT_PATH
+from query_stash.pager import run_pager
+from query_stash.params import ParameterException, get_param_sets
+from query_stash.query_stash import (
+    collect_submitted_queries,
+    connect_and_export_query,
+    connect_and_query_db,
+    diff_query_results,
+    get_query_stats,
+    get_result_scan,
+    query_stash_locally,
+    search_stash,
+    submit_queries,
+)
+from query_stash.render import OVERFLOW_POLICIES
+from query_stash.repl import run_repl
+from query_stash.sqlite import QueryStasher
+from query_stash.timing import Timings
 
 
 @click.group()
@@ -14,8 +34,14 @@ def cli():
     pass
 
 
+def confirm_over_limit(message: str) -> bool:
+    """Ask whether to run a query over the cost guard's limits (only when
+    there's someone at the terminal to answer)"""
+    return sys.stdin.isatty() and click.confirm(f"{message}\nRun it anyway?")
+
+
 @cli.command()
-@click.argument("query", type=str)
+@click.argument("query", type=str, required=False)
 @click.option(
     "--config-path",
     default=None,
@@ -28,13 +54,481 @@ def cli():
     default=None,
     type=str,
 )
+@click.option(
+    "--profile",
+    is_flag=True,
+    default=False,
+    help="Print how long each phase of the query took (to stderr)",
+)
+@click.option(
+    "--profile-output",
+    default=None,
+    help="Run under cProfile and dump pstats to this path (implies --profile)",
+    type=str,
+)
+@click.option(
+    "--format",
+    "export_format",
+    type=click.Choice(("table",) + EXPORT_FORMATS),
+    default="table",
+    help="Print a table, or stream the results out in this file format",
+)
+@click.option(
+    "--output",
+    default=None,
+    help="File to write --format csv/jsonl/parquet/arrow results to (csv/jsonl default to stdout)",
+    type=str,
+)
+@click.option(
+    "--batch-size",
+    default=None,
+    help="Rows fetched and written per batch when exporting "
+    "(default: the connection's batch_size, or 10,000)",
+    type=click.IntRange(min=1),
+)
+@click.option(
+    "--width-sample",
+    "width_sample_size",
+    default=None,
+    help="Estimate column widths from a random sample of this many rows",
+    type=click.IntRange(min=2),
+)
+@click.option(
+    "--max-width",
+    default=None,
+    help="Cap every column at this many characters",
+    type=click.IntRange(min=2),
+)
+@click.option(
+    "--overflow",
+    type=click.Choice(OVERFLOW_POLICIES),
+    default="truncate",
+    help="How to shorten values wider than their column",
+)
+@click.option(
+    "--columns",
+    default=None,
+    help="Comma-separated columns to show, in this order",
+    type=str,
+)
+@click.option(
+    "--fit",
+    is_flag=True,
+    default=False,
+    help="Only show the columns that fit the terminal width; name the rest",
+)
+@click.option(
+    "--render-processes",
+    "processes",
+    default=1,
+    help="Format big tables in this many processes (0: one per CPU)",
+    type=click.IntRange(min=0),
+)
+@click.option(
+    "--pager",
+    is_flag=True,
+    default=False,
+    help="Browse the results in the built-in pager instead of printing them",
+)
+@click.option(
+    "--result-of",
+    default=None,
+    help="Re-read this stashed Snowflake query's result (RESULT_SCAN) instead of running QUERY",
+    type=int,
+)
+@click.option(
+    "--param",
+    "params",
+    multiple=True,
+    help="A value for a :name parameter in QUERY, as name=value (repeatable)",
+    type=str,
+)
+@click.option(
+    "--param-file",
+    default=None,
+    help="JSON or CSV file of parameter sets; QUERY runs once per set",
+    type=click.Path(exists=True, dir_okay=False),
+)
+@click.option(
+    "--many",
+    is_flag=True,
+    default=False,
+    help="Run a statement returning no rows for every parameter set in one batch",
+)
 def query(
-    query: str, config_path: Optional[str] = None, connection_name: Optional[str] = None
+    query: Optional[str],
+    config_path: Optional[str] = None,
+    connection_name: Optional[str] = None,
+    profile: bool = False,
+    profile_output: Optional[str] = None,
+    export_format: str = "table",
+    output: Optional[str] = None,
+    batch_size: Optional[int] = None,
+    width_sample_size: Optional[int] = None,
+    max_width: Optional[int] = None,
+    overflow: str = "truncate",
+    columns: Optional[str] = None,
+    fit: bool = False,
+    pager: bool = False,
+    result_of: Optional[int] = None,
+    processes: int = 1,
+    params: Tuple[str, ...] = (),
+    param_file: Optional[str] = None,
+    many: bool = False,
+):
+    if result_of is not None:
+        if query is not None:
+            raise click.UsageError("Give a QUERY or --result-of, not both")
+        result_scan = get_result_scan(result_of)
+        if result_scan is None:
+            raise click.ClickException(f"No Snowflake query id stashed for {result_of}")
+        query, stashed_connection_name = result_scan
+        connection_name = connection_name or stashed_connection_name
+    elif query is None:
+        raise click.UsageError("Missing argument 'QUERY'")
+    if export_format in ARROW_FORMATS and output in (None, STDOUT_PATH):
+        raise click.UsageError(f"--format {export_format} needs an --output path")
+    param_sets = None
+    if params or param_file:
+        if export_format != "table":
+            raise click.UsageError("--param and --param-file print tables only")
+        try:
+            param_sets = get_param_sets(params, param_file)
+        except ParameterException as e:
+            raise click.UsageError(str(e))
+    elif many:
+        raise click.UsageError("--many needs parameter sets (--param-file)")
+    timings = Timings()
+    profiler = cProfile.Profile() if profile_output else None
+    if profiler is not None:
+        profiler.enable()
+    query_id = None
+    if export_format == "table":
+        rendered_table, query_id = connect_and_query_db(
+            config_path=config_path,
+            connection_name=connection_name,
+            query=query,
+            timings=timings,
+            width_sample_size=width_sample_size,
+            max_width=max_width,
+            overflow=overflow,
+            columns=None if columns is None else [c.strip() for c in columns.split(",")],
+            max_table_width=shutil.get_terminal_size().columns if fit else None,
+            processes=processes,
+            confirm_over_limit=confirm_over_limit,
+            param_sets=param_sets,
+            many=many,
+            pager=pager,
+        )
+    else:
+        rendered_table = connect_and_export_query(
+            config_path=config_path,
+            connection_name=connection_name,
+            query=query,
+            export_format=export_format,
+            output_path=output,
+            batch_size=batch_size,
+            timings=timings,
+            confirm_over_limit=confirm_over_limit,
+        )
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(profile_output)
+    if pager and query_id is not None:
+        # only this query's result: an error or empty result stashes none
+        run_pager(QueryStasher(), query_id)
+    elif export_format == "table" or output not in (None, STDOUT_PATH):
+        print(rendered_table)
+    else:
+        # the results themselves went to stdout
+        click.echo(rendered_table, err=True)
+    if profile or profile_output:
+        click.echo(timings, err=True)
+        if profile_output:
+            click.echo(f"cProfile stats written to {profile_output}", err=True)
+    return 0
+
+
+@cli.command()
+@click.argument("query", type=str)
+@click.option(
+    "--config-path",
+    default=None,
+    help="Path to query-stash.toml config file",
+    type=str,
+)
+@click.option(
+    "--profile",
+    is_flag=True,
+    default=False,
+    help="Print how long each phase of the query took (to stderr)",
+)
+@click.option(
+    "--max-width",
+    default=None,
+    help="Cap every column at this many characters",
+    type=click.IntRange(min=2),
+)
+@click.option(
+    "--overflow",
+    type=click.Choice(OVERFLOW_POLICIES),
+    default="truncate",
+    help="How to shorten values wider than their column",
+)
+@click.option(
+    "--columns",
+    default=None,
+    help="Comma-separated columns to show, in this order",
+    type=str,
+)
+@click.option(
+    "--fit",
+    is_flag=True,
+    default=False,
+    help="Only show the columns that fit the terminal width; name the rest",
+)
+@click.option(
+    "--render-processes",
+    "processes",
+    default=1,
+    help="Format big tables in this many processes (0: one per CPU)",
+    type=click.IntRange(min=0),
+)
+def local(
+    query: str,
+    config_path: Optional[str] = None,
+    profile: bool = False,
+    max_width: Optional[int] = None,
+    overflow: str = "truncate",
+    columns: Optional[str] = None,
+    fit: bool = False,
+    processes: int = 1,
+):
+    """Query stashed results with DuckDB, e.g. SELECT * FROM stash.q_1234"""
+    timings = Timings()
+    print(
+        query_stash_locally(
+            config_path=config_path,
+            query=query,
+            timings=timings,
+            max_width=max_width,
+            overflow=overflow,
+            columns=None if columns is None else [c.strip() for c in columns.split(",")],
+            max_table_width=shutil.get_terminal_size().columns if fit else None,
+            processes=processes,
+        )
+    )
+    if profile:
+        click.echo(timings, err=True)
+    return 0
+
+
+@cli.command()
+@click.option(
+    "--connection-name",
+    help="Only include queries run against this connection",
+    default=None,
+    type=str,
+)
+@click.option(
+    "--fingerprint",
+    help="Show every run of the query with this fingerprint",
+    default=None,
+    type=str,
+)
+@click.option(
+    "--since",
+    help="Only include queries run at or after this UTC time (YYYY-MM-DD[ HH:MM:SS])",
+    default=None,
+    type=str,
+)
+def stats(
+    connection_name: Optional[str] = None,
+    fingerprint: Optional[str] = None,
+    since: Optional[str] = None,
+):
+    """Latency (p50/p95, trend) of stashed queries grouped by fingerprint"""
+    print(get_query_stats(connection_name, fingerprint, since))
+    return 0
+
+
+@cli.command()
+@click.argument("old_query_id", type=int)
+@click.argument("new_query_id", type=int, required=False)
+@click.option(
+    "--key",
+    default=None,
+    help="Comma-separated key columns matching rows up (default: an id column)",
+    type=str,
+)
+@click.option(
+    "--limit",
+    default=10,
+    help="Show at most this many rows of each kind of difference",
+    type=click.IntRange(min=0),
+)
+@click.option(
+    "--config-path",
+    default=None,
+    help="Path to query-stash.toml config file",
+    type=str,
+)
+def diff(
+    old_query_id: int,
+    new_query_id: Optional[int] = None,
+    key: Optional[str] = None,
+    limit: int = 10,
+    config_path: Optional[str] = None,
 ):
-    rendered_table = connect_and_query_db(
-        config_path=config_path, connection_name=connection_name, query=query
+    """Rows added, removed or changed between two stashed results
+
+    With one stash id, its query is re-run and the live result compared.
+    """
+    key_columns = None if key is None else [c.strip() for c in key.split(",")]
+    print(
+        diff_query_results(old_query_id, new_query_id, key_columns, limit, config_path)
     )
-    print(rendered_table)
+    return 0
+
+
+@cli.command()
+@click.argument("queries", type=str, nargs=-1, required=True)
+@click.option(
+    "--config-path",
+    default=None,
+    help="Path to query-stash.toml config file",
+    type=str,
+)
+@click.option(
+    "--connection-name",
+    help="Snowflake connection to run the queries on",
+    default=None,
+    type=str,
+)
+def submit(queries, config_path: Optional[str] = None, connection_name=None):
+    """Start queries on Snowflake without waiting; `collect` fetches them"""
+    for query_id in submit_queries(config_path, connection_name, queries):
+        print(query_id)
+    return 0
+
+
+@cli.command()
+@click.option(
+    "--wait/--no-wait",
+    default=True,
+    help="Wait for running queries (default), or only collect finished ones",
+)
+@click.option(
+    "--max-width",
+    default=None,
+    help="Cap every column at this many characters",
+    type=click.IntRange(min=2),
+)
+@click.option(
+    "--config-path",
+    default=None,
+    help="Path to query-stash.toml config file",
+    type=str,
+)
+def collect(
+    wait: bool = True,
+    max_width: Optional[int] = None,
+    config_path: Optional[str] = None,
+):
+    """Print and stash the results of submitted queries as they finish"""
+    for text in collect_submitted_queries(config_path, wait, max_width):
+        print(text, flush=True)
+    return 0
+
+
+@cli.command()
+@click.argument("path", type=click.Path(dir_okay=False, writable=True))
+@click.option(
+    "--since",
+    default=None,
+    help="Only stashed queries after this stash id or date/time",
+    type=str,
+)
+def export(path: str, since: Optional[str] = None):
+    """Write stashed queries and their results to a compressed bundle"""
+    print(export_bundle(path, since))
+    return 0
+
+
+@cli.command(name="import")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+def import_(path: str):
+    """Merge a bundle into the stash, skipping queries it already has"""
+    print(import_bundle(path))
+    return 0
+
+
+@cli.command()
+@click.argument("text", type=str)
+@click.option(
+    "--limit",
+    default=20,
+    help="Show at most this many queries, latest first",
+    type=click.IntRange(min=1),
+)
+def search(text: str, limit: int = 20):
+    """Stashed queries whose text, tags or results contain TEXT"""
+    print(search_stash(text, limit))
+    return 0
+
+
+@cli.command()
+@click.option(
+    "--config-path",
+    default=None,
+    help="Path to query-stash.toml config file",
+    type=str,
+)
+@click.option(
+    "--connection-name",
+    help="Connection to run queries on",
+    default=None,
+    type=str,
+)
+@click.option(
+    "--max-width",
+    default=None,
+    help="Cap every column at this many characters",
+    type=click.IntRange(min=2),
+)
+@click.option(
+    "--fit",
+    is_flag=True,
+    default=False,
+    help="Only show the columns that fit the terminal width; name the rest",
+)
+def repl(
+    config_path: Optional[str] = None,
+    connection_name: Optional[str] = None,
+    max_width: Optional[int] = None,
+    fit: bool = False,
+):
+    """Run queries interactively on one open connection (\\? for commands)"""
+    run_repl(
+        config_path,
+        connection_name,
+        confirm_over_limit,
+        max_width=max_width,
+        max_table_width=shutil.get_terminal_size().columns if fit else None,
+    )
+    return 0
+
+
+@cli.command()
+@click.argument("query_id", type=int, required=False)
+def view(query_id: Optional[int] = None):
+    """Page through a stashed result (the latest one by default)"""
+    stasher = QueryStasher()
+    if query_id is None:
+        query_id = stasher.get_latest_result_query_id()
+    if query_id is None or not stasher.get_result_columns(query_id):
+        raise click.ClickException("No stashed results to view")
+    run_pager(stasher, query_id)
     return 0
 
 
@@ -1,31 +1,157 @@
+import json
 import os
 import sys
 from os.path import expanduser
 from pathlib import Path
+from typing import Dict, NamedTuple, Tuple
 
-import toml
+try:
+    import tomllib
+except ImportError:  # python < 3.11
+    import toml as tomllib  # type: ignore
 
 from query_stash.types import ConfigDict
 
 CONFIG_DIRECTORY = "~/.config/query-stash"
 DEFAULT_CONFIG_PATH = f"{CONFIG_DIRECTORY}/query-stash.toml"
+CONFIG_CACHE_PATH = f"{CONFIG_DIRECTORY}/config-cache.json"
+
+SECRET_SUFFIX = "_env"
+# settings that hold a secret when written into the file rather than read from
+# the environment; configs with any aren't cached on disk
+SECRET_SETTINGS = ("password",)
+REQUIRED_SETTINGS = {
+    "postgres": ("host", "user", "password", "port", "dbname"),
+    "snowflake": ("user", "password", "account", "database", "warehouse", "role"),
+    "duckdb": ("path",),
+    "mysql": ("host", "user", "password", "port", "dbname"),
+    "clickhouse": ("host", "user", "port", "dbname"),
+}
 
 
 class ConfigException(Exception):
     pass
 
 
-def get_config(config_path: str | None = None) -> ConfigDict:
-    make_config_directory_if_not_exists()
-    if config_path is None:
-        config_path = DEFAULT_CONFIG_PATH
+class ConnectionConfig(NamedTuple):
+    """A connection entry from the config file, checked when the file is loaded
+
+    Settings named `<setting>_env` (e.g. `password_env = "PGPASSWORD"`) are
+    read from that environment variable, but only by `resolve`, so only the
+    connection actually used needs its secrets set.
+    """
+
+    name: str
+    type: str
+    settings: ConfigDict
+    problems: Tuple[str, ...] = ()
+
+    def resolve(self) -> ConfigDict:
+        """The connection's settings, with secrets read from the environment"""
+        if self.problems:
+            raise ConfigException(
+                f"Connection {self.name!r} is misconfigured: {'; '.join(self.problems)}"
+            )
+        resolved = {}
+        for key, value in self.settings.items():
+            if key.endswith(SECRET_SUFFIX) and key != SECRET_SUFFIX:
+                if value not in os.environ:
+                    raise ConfigException(
+                        f"Connection {self.name!r} reads {key[: -len(SECRET_SUFFIX)]}"
+                        f" from ${value}, which isn't set"
+                    )
+                resolved[key[: -len(SECRET_SUFFIX)]] = os.environ[value]
+            else:
+                resolved[key] = value
+        return resolved
+
+
+def validate_connection(name: str, settings: ConfigDict) -> ConnectionConfig:
+    connection_type = settings.get("type")
+    problems = []
+    if connection_type not in REQUIRED_SETTINGS:
+        problems.append(f"unknown type {connection_type!r}")
+    else:
+        provided = {key.removesuffix(SECRET_SUFFIX) for key in settings}
+        missing = [s for s in REQUIRED_SETTINGS[connection_type] if s not in provided]
+        if missing:
+            problems.append(f"missing {', '.join(missing)}")
+    return ConnectionConfig(name, str(connection_type), settings, tuple(problems))
+
+
+class LoadedConfig(NamedTuple):
+    """A parsed config file, its validated connections, and what it was read from"""
+
+    mtime_ns: int
+    size: int
+    config: ConfigDict
+    connections: Dict[str, ConnectionConfig]
+
+
+_loaded_configs: Dict[str, LoadedConfig] = {}
+_config_directory_checked = False
+
+
+def parse_config(config_text: str) -> ConfigDict:
+    return tomllib.loads(config_text)
+
+
+def read_config_cache(config_path: str, mtime_ns: int, size: int) -> ConfigDict | None:
+    """The config parsed by an earlier run, if the file hasn't changed since"""
     try:
-        with open(expanduser(config_path)) as conf_file:
-            config = toml.loads(conf_file.read())
-    except FileNotFoundError:
-        print(f"Could not find config file {expanduser(config_path)}")
-        print(
-            """Make a toml config file at that location.  Example:
+        with open(expanduser(CONFIG_CACHE_PATH)) as cache_file:
+            entry = json.load(cache_file)[config_path]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    if entry.get("mtime_ns") != mtime_ns or entry.get("size") != size:
+        return None
+    return entry.get("config")
+
+
+def has_plaintext_secrets(config: ConfigDict) -> bool:
+    """Whether any connection has a secret written into the config file"""
+    connections = config.get("connections", {})
+    return any(
+        isinstance(settings, dict) and settings.get(key)
+        for settings in connections.values()
+        for key in SECRET_SETTINGS
+    )
+
+
+def write_config_cache(config_path: str, mtime_ns: int, size: int, config: ConfigDict):
+    """Keep the parsed config for the next run (skipped if it isn't plain JSON)
+
+    Configs with passwords in them aren't cached, so there's no second copy of
+    the passwords to know about; they're read from the file every time, and an
+    entry cached before the file had any is dropped.
+    """
+    cache_path = expanduser(CONFIG_CACHE_PATH)
+    try:
+        with open(cache_path) as cache_file:
+            cache = json.load(cache_file)
+    except (OSError, ValueError):
+        cache = {}
+    if not isinstance(cache, dict):
+        cache = {}
+    if not has_plaintext_secrets(config):
+        cache[config_path] = {"mtime_ns": mtime_ns, "size": size, "config": config}
+    elif cache.pop(config_path, None) is None:
+        return
+    try:
+        cache_text = json.dumps(cache)
+        temp_path = f"{cache_path}.{os.getpid()}"
+        # only readable by its owner, as connection details are sensitive too
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as cache_file:
+            cache_file.write(cache_text)
+        os.replace(temp_path, cache_path)
+    except (OSError, TypeError, ValueError):
+        pass
+
+
+def print_missing_config_help(config_path: str):
+    print(f"Could not find config file {config_path}")
+    print("""Make a toml config file at that location.  Example:
 [connections]
     [connections.dbt-postgres]
     type = "postgres"
@@ -37,27 +163,84 @@ def get_config(config_path: str | None = None) -> ConfigDict:
 
     [connections.duckdb-jaffle]
     type = "duckdb"
-    path = "~/src/github.com/dbt-labs/jaffle_shop_duckdb/jaffle_shop.duckdb" """
-        )
+    path = "~/src/github.com/dbt-labs/jaffle_shop_duckdb/jaffle_shop.duckdb" """)
+
+
+def load_config(config_path: str | None = None) -> LoadedConfig:
+    """Parse and validate the config file, at most once per change to it
+
+    Parsed configs are cached in-process and on disk, keyed on the file's
+    modification time and size, so repeated invocations skip the TOML parse.
+    """
+    make_config_directory_if_not_exists()
+    if config_path is None:
+        config_path = DEFAULT_CONFIG_PATH
+    config_path = os.path.abspath(expanduser(config_path))
+    try:
+        stat = os.stat(config_path)
+    except FileNotFoundError:
+        print_missing_config_help(config_path)
         sys.exit(1)
-    return config
+    loaded = _loaded_configs.get(config_path)
+    if loaded is not None and (loaded.mtime_ns, loaded.size) == (
+        stat.st_mtime_ns,
+        stat.st_size,
+    ):
+        return loaded
+    config = read_config_cache(config_path, stat.st_mtime_ns, stat.st_size)
+    if config is None:
+        with open(config_path) as conf_file:
+            config = parse_config(conf_file.read())
+        write_config_cache(config_path, stat.st_mtime_ns, stat.st_size, config)
+    connections = {
+        name: validate_connection(name, settings)
+        for name, settings in config.get("connections", {}).items()
+    }
+    loaded = LoadedConfig(stat.st_mtime_ns, stat.st_size, config, connections)
+    _loaded_configs[config_path] = loaded
+    return loaded
 
 
-def get_connection_from_config(config: ConfigDict, connection: str | None = None):
+def get_config(config_path: str | None = None) -> ConfigDict:
+    return load_config(config_path).config
+
+
+def choose_connection_name(connection_names: list, connection: str | None) -> str:
     if connection is not None:
-        return config["connections"][connection]
-    elif len(config["connections"].keys()) == 1:
-        return list(config["connections"].values())[0]
+        return connection
+    elif len(connection_names) == 1:
+        return connection_names[0]
     else:
         raise ConfigException("You need to specify a connection")
 
 
+def get_connection_from_config(config: ConfigDict, connection: str | None = None):
+    connection = choose_connection_name(list(config["connections"].keys()), connection)
+    return config["connections"][connection]
+
+
+def get_connection_config(
+    loaded_config: LoadedConfig, connection: str | None = None
+) -> ConnectionConfig:
+    connection = choose_connection_name(list(loaded_config.connections), connection)
+    if connection not in loaded_config.connections:
+        raise ConfigException(
+            f"Unknown connection {connection!r}; connections are: "
+            f"{', '.join(loaded_config.connections)}"
+        )
+    return loaded_config.connections[connection]
+
+
 def config_directory_exists() -> bool:
     return os.path.isdir(expanduser(CONFIG_DIRECTORY))
 
 
 def make_config_directory_if_not_exists():
+    global _config_directory_checked
+    if _config_directory_checked:
+        return
     if not config_directory_exists():
         print("Query stash config directory does not yet exist.")
         print(f"Creating directory at {CONFIG_DIRECTORY}")
         Path(expanduser(CONFIG_DIRECTORY)).mkdir(parents=True, exist_ok=True)
+    _config_directory_checked = True
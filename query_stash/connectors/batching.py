@@ -0,0 +1,87 @@
+"""How many rows to fetch per round trip when streaming a result
+
+A connection can set a fixed `batch_size`, or `batch_size = "adaptive"`: then
+batches start small, so a tiny result comes back in one quick round trip, and
+grow while round trips stay quick, until a batch's rows would take up about
+`batch_memory_mb` of memory (measured from the rows already fetched).
+"""
+
+import sys
+import time
+from typing import Any, Iterator, List, NamedTuple, Sequence
+
+from query_stash.config import ConfigException
+from query_stash.types import ConfigDict
+
+DEFAULT_BATCH_SIZE = 10_000
+ADAPTIVE_BATCH_SIZE = "adaptive"
+DEFAULT_BATCH_MEMORY_MB = 64
+FIRST_ADAPTIVE_BATCH_SIZE = 1_000
+MIN_BATCH_SIZE = 100
+MAX_BATCH_SIZE = 1_000_000
+GROWTH_FACTOR = 4
+# a round trip quicker than this is mostly overhead, so batches grow
+QUICK_ROUND_TRIP_SECONDS = 0.25
+ROW_SAMPLE_SIZE = 100
+
+
+class BatchSettings(NamedTuple):
+    batch_size: int = DEFAULT_BATCH_SIZE
+    adaptive: bool = False
+    memory_budget_bytes: int = DEFAULT_BATCH_MEMORY_MB * 2**20
+
+
+def get_batch_settings(connection_config: ConfigDict) -> BatchSettings:
+    """A connection's `batch_size` (rows, or "adaptive") and `batch_memory_mb`"""
+    batch_size = connection_config.get("batch_size", DEFAULT_BATCH_SIZE)
+    memory_mb = connection_config.get("batch_memory_mb", DEFAULT_BATCH_MEMORY_MB)
+    if not isinstance(memory_mb, (int, float)) or memory_mb <= 0:
+        raise ConfigException("batch_memory_mb must be a positive number of MB")
+    memory_budget_bytes = int(memory_mb * 2**20)
+    if batch_size == ADAPTIVE_BATCH_SIZE:
+        return BatchSettings(FIRST_ADAPTIVE_BATCH_SIZE, True, memory_budget_bytes)
+    if not isinstance(batch_size, int) or batch_size < 1:
+        raise ConfigException(
+            f'batch_size must be a number of rows or "{ADAPTIVE_BATCH_SIZE}"'
+        )
+    return BatchSettings(batch_size, False, memory_budget_bytes)
+
+
+def estimate_row_bytes(rows: Sequence[Sequence[Any]]) -> float:
+    """Average memory taken by a row (and its values), from a sample of rows"""
+    step = max(len(rows) // ROW_SAMPLE_SIZE, 1)
+    sample = rows[::step]
+    total = sum(
+        sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+        for row in sample
+    )
+    return total / len(sample)
+
+
+class AdaptiveBatchSize:
+    """The next batch size, from how big and how slow the last batch was"""
+
+    def __init__(self, settings: BatchSettings):
+        self.size = settings.batch_size
+        self.memory_budget_bytes = settings.memory_budget_bytes
+
+    def observe(self, rows: Sequence[Sequence[Any]], seconds: float):
+        if not rows:
+            return
+        budget_rows = int(self.memory_budget_bytes / estimate_row_bytes(rows))
+        size = self.size
+        if seconds < QUICK_ROUND_TRIP_SECONDS:
+            size *= GROWTH_FACTOR
+        self.size = max(MIN_BATCH_SIZE, min(size, budget_rows, MAX_BATCH_SIZE))
+
+
+def iter_adaptive_batches(cursor, settings: BatchSettings) -> Iterator[List[Any]]:
+    """`cursor.fetchmany` batches, sized by `AdaptiveBatchSize`"""
+    batch_size = AdaptiveBatchSize(settings)
+    while True:
+        start = time.perf_counter()
+        rows = cursor.fetchmany(batch_size.size)
+        if not rows:
+            return
+        batch_size.observe(rows, time.perf_counter() - start)
+        yield rows
@@ -1,9 +1,13 @@
-from typing import Any, MutableMapping
+from itertools import islice
+from typing import Any, Iterator, List, MutableMapping, Optional
 
-from clickhouse_driver import connect
+from clickhouse_driver import Client, connect
 from clickhouse_driver.dbapi.connection import \
     Connection as ClickhouseConnection
-from clickhouse_driver.dbapi.extras import DictCursor as ClickhouseDictCursor
+
+from query_stash.types import Values
+
+from .cost import PlanEstimate
 
 
 def get_clickhouse_connection(config: MutableMapping[str, Any]) -> ClickhouseConnection:
@@ -24,5 +28,153 @@ def get_clickhouse_connection(config: MutableMapping[str, Any]) -> ClickhouseCon
     )
 
 
-def get_clickhouse_dict_cursor(conn: ClickhouseConnection) -> ClickhouseDictCursor:
-    return conn.cursor(cursor_factory=ClickhouseDictCursor)
+def get_clickhouse_client(
+    conn: ClickhouseConnection, settings: MutableMapping[str, Any]
+) -> Client:
+    """A native-protocol Client for the same server as a DB-API connection"""
+    return Client(
+        conn.host,
+        port=conn.port,
+        user=conn.user,
+        password=conn.password,
+        database=conn.database,
+        settings=settings,
+        **conn.connection_kwargs,
+    )
+
+
+class ClickhouseCursor:
+    """Runs queries with the native Client's `execute`, which returns the
+    rows as tuples without the DB-API cursor's bookkeeping"""
+
+    def __init__(self, client: Client):
+        self.client = client
+        self.description = None
+        self.rowcount = -1
+        self.rows: List[tuple] = []
+
+    def execute(self, query: str, params: Optional[Values] = None):
+        self.rows, columns_with_types = self.client.execute(
+            query, params, with_column_types=True
+        )
+        self.description = [(name, type_name) for name, type_name in columns_with_types]
+        self.rowcount = len(self.rows)
+
+    def executemany(self, query: str, value_sets: List[Values]):
+        # inserts return how many rows they wrote
+        self.rowcount = self.client.execute(query, value_sets)
+        self.rows = []
+
+    def fetchall(self) -> List[tuple]:
+        rows, self.rows = self.rows, []
+        return rows
+
+    def close(self):
+        self.client.disconnect()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def get_clickhouse_cursor(conn: ClickhouseConnection) -> ClickhouseCursor:
+    return ClickhouseCursor(get_clickhouse_client(conn, {}))
+
+
+class ClickhouseStreamingCursor:
+    """Streams a result through the native Client's `execute_iter`, with the
+    server sending blocks of up to `batch_size` rows"""
+
+    def __init__(self, client: Client, batch_size: int):
+        self.client = client
+        self.batch_size = batch_size
+        self.description = None
+        self.rows: Iterator[Any] = iter(())
+
+    def execute(self, query: str):
+        self.rows = self.client.execute_iter(
+            query,
+            with_column_types=True,
+            settings={"max_block_size": self.batch_size},
+        )
+        # With column types the first item is the header block's columns, so
+        # even an empty result has column names
+        columns_with_types = next(self.rows, [])
+        self.description = [(name, type_name) for name, type_name in columns_with_types]
+
+    def fetchmany(self, size: int) -> List[tuple]:
+        return list(islice(self.rows, size))
+
+    def close(self):
+        self.client.disconnect()
+
+
+class ClickhouseColumnarCursor:
+    """Reads a whole result as columns with the native Client's
+    `execute(..., columnar=True)`, for exports that want columns"""
+
+    def __init__(self, client: Client, batch_size: int, use_numpy: bool = False):
+        self.client = client
+        self.batch_size = batch_size
+        self.use_numpy = use_numpy
+        self.description = None
+        self.columns: List[Any] = []
+
+    def execute(self, query: str):
+        self.columns, columns_with_types = self.client.execute(
+            query,
+            with_column_types=True,
+            columnar=True,
+            settings={"max_block_size": self.batch_size, "use_numpy": self.use_numpy},
+        )
+        self.description = [(name, type_name) for name, type_name in columns_with_types]
+
+    def close(self):
+        self.client.disconnect()
+
+
+def get_clickhouse_streaming_cursor(
+    conn: ClickhouseConnection,
+    batch_size: int,
+    arrow: bool = False,
+    use_numpy: bool = False,
+) -> ClickhouseStreamingCursor | ClickhouseColumnarCursor:
+    """A cursor on a native Client that streams rows from the server, or with
+    `arrow` one that reads the result as columns
+
+    With `use_numpy` (needs `clickhouse-driver[numpy]`) the columns come back
+    as NumPy arrays, which pyarrow takes without converting value by value.
+    """
+    client = get_clickhouse_client(conn, {})
+    if arrow:
+        return ClickhouseColumnarCursor(client, batch_size, use_numpy)
+    return ClickhouseStreamingCursor(client, batch_size)
+
+
+def iter_clickhouse_arrow_batches(cursor: ClickhouseColumnarCursor, batch_size: int):
+    """Arrow record batches of up to `batch_size` rows, sliced from an array
+    per column (needs pyarrow)"""
+    import pyarrow
+
+    names = [column[0] for column in cursor.description]
+    if not cursor.columns:
+        return
+    arrays = [pyarrow.array(column) for column in cursor.columns]
+    table = pyarrow.Table.from_arrays(arrays, names=names)
+    yield from table.to_batches(max_chunksize=batch_size)
+
+
+def get_clickhouse_plan_estimate(
+    conn: ClickhouseConnection, query: str, values: Optional[Values] = None
+) -> PlanEstimate:
+    """The rows ClickHouse expects to read, from the parts and marks it selects"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"EXPLAIN ESTIMATE {query}", values)
+        tables = cursor.fetchall()
+    finally:
+        cursor.close()
+    # one row per table read: database, table, parts, rows, marks
+    return PlanEstimate(rows=sum(table[3] for table in tables))
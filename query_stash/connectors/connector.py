@@ -1,44 +1,108 @@
-from typing import List
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
 
+import psycopg2
 from snowflake.connector.errors import ProgrammingError
 
-from query_stash.config import get_config, get_connection_from_config
-from query_stash.types import ConfigDict, RowDict
+from query_stash.config import LoadedConfig, get_connection_config, load_config
+from query_stash.params import ParameterException
+from query_stash.schema import Schema
+from query_stash.stats import fingerprint_query
+from query_stash.timing import span
+from query_stash.types import ConfigDict, Params, Row, Values
 
+from .batching import (
+    DEFAULT_BATCH_SIZE,
+    BatchSettings,
+    get_batch_settings,
+    iter_adaptive_batches,
+)
 from .clickhouse import (
     ClickhouseConnection,
-    ClickhouseDictCursor,
     get_clickhouse_connection,
-    get_clickhouse_dict_cursor,
+    get_clickhouse_cursor,
+    get_clickhouse_plan_estimate,
+    get_clickhouse_streaming_cursor,
+    iter_clickhouse_arrow_batches,
+)
+from .cost import (
+    PlanEstimate,
+    get_cost_guard_settings,
+    get_exceeded_limits,
 )
 from .duckdb import (
-    DuckDBDictCursor,
     DuckDBPyConnection,
     get_duckdb_connection,
-    get_duckdb_dict_cursor,
+    get_duckdb_cursor,
+    get_duckdb_plan_estimate,
+    get_duckdb_streaming_cursor,
+    iter_duckdb_arrow_batches,
+)
+from .mysql import (
+    MySQLConnection,
+    get_mysql_connection,
+    get_mysql_cursor,
+    get_mysql_prepared_cursor,
+    get_mysql_streaming_cursor,
 )
-from .mysql import MySQLConnection, get_mysql_connection, get_mysql_dict_cursor
 from .postgres import (
     PostgresConnection,
-    PostgresDictCursor,
+    PostgresPreparedStatement,
+    copy_postgres_csv,
     get_postgres_connection,
-    get_postgres_dict_cursor,
+    get_postgres_cursor,
+    get_postgres_plan_estimate,
+    get_postgres_streaming_cursor,
 )
+from .prepared import NUMERIC, PYFORMAT, QMARK, BoundQuery, CursorStatement, bind_query
 from .snowflake import (
     SnowflakeConnection,
-    SnowflakeDictCursor,
     get_snowflake_connection,
-    get_snowflake_dict_cursor,
+    get_snowflake_cursor,
+    get_snowflake_plan_estimate,
+    get_snowflake_results_cursor,
+    get_snowflake_streaming_cursor,
+    iter_snowflake_arrow_batches,
+    snowflake_query_is_running,
+    submit_snowflake_query,
 )
 
 
+def get_backend_query_id(cursor) -> str | None:
+    """The warehouse's id for the last query (only Snowflake exposes one)"""
+    return getattr(cursor, "sfqid", None)
+
+
+def format_error(e: Exception) -> str:
+    return "\n".join([f"┆{x}┆" for x in str(e).split("\n")])
+
+
 class Connector:
-    def __init__(self, config_path: str | None, connection_name: str):
-        config = get_config(config_path)
-        self.connection_config = get_connection_from_config(config, connection_name)
+    def __init__(
+        self,
+        config_path: str | None,
+        connection_name: str,
+        loaded_config: LoadedConfig | None = None,
+        confirm_over_limit: Callable[[str], bool] | None = None,
+    ):
+        """`confirm_over_limit` is asked whether to run a query the cost guard
+        flags, on connections set to `over_limit = "prompt"` (see `cost`)"""
+        with span("config"):
+            if loaded_config is None:
+                loaded_config = load_config(config_path)
+            self.config = loaded_config.config
+            self.connection_config = get_connection_config(
+                loaded_config, connection_name
+            ).resolve()
         self.connection_type = self.connection_config["type"]
-        self.conn = self.get_connection(self.connection_config)
+        self.batch_settings = get_batch_settings(self.connection_config)
+        self.cost_guard = get_cost_guard_settings(self.connection_config)
+        self.confirm_over_limit = confirm_over_limit
+        self.plan_estimates: Dict[str, PlanEstimate] = {}
+        with span("connect"):
+            self.conn = self.get_connection(self.connection_config)
         self.connection_name = connection_name
+        self.last_query_id: str | None = None
 
     def get_connection(
         self, config: ConfigDict
@@ -55,30 +119,286 @@ class Connector:
             return get_clickhouse_connection(config)
         raise Exception(f"Unknown connection type: {self.connection_type}")
 
-    def get_dict_cursor(
-        self,
-    ) -> PostgresDictCursor | SnowflakeDictCursor | DuckDBDictCursor | ClickhouseDictCursor:
+    def explain(
+        self, query: str, values: Optional[Values] = None
+    ) -> PlanEstimate | None:
+        if self.is_postgres:
+            return get_postgres_plan_estimate(self.conn, query, values)
+        if self.is_snowflake:
+            return get_snowflake_plan_estimate(self.conn, query, values)
+        if self.is_duckdb:
+            return get_duckdb_plan_estimate(self.conn, query, values)
+        if self.is_clickhouse:
+            return get_clickhouse_plan_estimate(self.conn, query, values)
+        return None
+
+    def estimate_query(
+        self, query: str, values: Optional[Values] = None
+    ) -> PlanEstimate | None:
+        """The backend's EXPLAIN estimates for a query, cached by fingerprint
+        (None if it can't explain the query)
+
+        A query with placeholders is explained with the `values` bound to them,
+        and only for the first set of values it's run with.
+        """
+        fingerprint = fingerprint_query(query)
+        if fingerprint not in self.plan_estimates:
+            try:
+                with span("explain"):
+                    estimate = self.explain(query, values)
+            except Exception:
+                # e.g. statements EXPLAIN doesn't take; running them reports
+                # any real error
+                return None
+            if estimate is None:
+                return None
+            self.plan_estimates[fingerprint] = estimate
+        return self.plan_estimates[fingerprint]
+
+    def check_cost(self, query: str, values: Optional[Values] = None) -> str | None:
+        """Why the cost guard won't run a query (None if it will)"""
+        if not self.cost_guard.enabled:
+            return None
+        estimate = self.estimate_query(query, values)
+        if estimate is None:
+            return None
+        exceeded = get_exceeded_limits(estimate, self.cost_guard)
+        if not exceeded:
+            return None
+        message = (
+            f"The query plan is over {self.connection_name}'s limits: "
+            f"{'; '.join(exceeded)}"
+        )
+        if (
+            self.cost_guard.over_limit == "prompt"
+            and self.confirm_over_limit is not None
+            and self.confirm_over_limit(message)
+        ):
+            return None
+        return message
+
+    def get_cursor(self):
+        """The backend's default cursor, which returns rows as tuples"""
         if self.is_postgres:
-            return get_postgres_dict_cursor(self.conn)
+            return get_postgres_cursor(self.conn)
         if self.is_snowflake:
-            return get_snowflake_dict_cursor(self.conn)
+            return get_snowflake_cursor(self.conn)
         if self.is_duckdb:
-            return get_duckdb_dict_cursor(self.conn)
+            return get_duckdb_cursor(self.conn)
         if self.is_mysql:
-            return get_mysql_dict_cursor(self.conn)
+            return get_mysql_cursor(self.conn)
         if self.is_clickhouse:
-            return get_clickhouse_dict_cursor(self.conn)
+            return get_clickhouse_cursor(self.conn)
         raise Exception(f"Unknown connection type: {self.connection_type}")
 
-    def get_results(self, query: str) -> tuple[str | None, List[RowDict]]:
-        with self.get_dict_cursor() as dict_cursor:
+    def get_rows(self, query: str) -> tuple[str | None, Schema, List[Row]]:
+        """Run a query and return (error, schema, rows), with the rows as tuples
+        in the order of the schema's columns
+
+        No dict is built per row, and the column names are cleaned just once.
+        """
+        err = self.check_cost(query)
+        if err is not None:
+            return err, Schema(()), []
+        with self.get_cursor() as cursor:
             try:
-                dict_cursor.execute(query)
-                results = [dict(r) for r in dict_cursor.fetchall()]
-                return None, results
+                with span("execute"):
+                    cursor.execute(query)
+                self.last_query_id = get_backend_query_id(cursor)
+                with span("fetch"):
+                    rows = cursor.fetchall()
+                return None, Schema.from_description(cursor.description), rows
             except ProgrammingError as e:
-                err = "\n".join([f"┆{x}┆" for x in str(e).split("\n")])
-                return err, []
+                return format_error(e), Schema(()), []
+
+    def get_streaming_cursor(self, batch_size: int, arrow: bool = False):
+        if self.is_postgres:
+            return get_postgres_streaming_cursor(self.conn, batch_size)
+        if self.is_snowflake:
+            return get_snowflake_streaming_cursor(self.conn, batch_size)
+        if self.is_duckdb:
+            return get_duckdb_streaming_cursor(self.conn, batch_size)
+        if self.is_mysql:
+            return get_mysql_streaming_cursor(self.conn, batch_size)
+        if self.is_clickhouse:
+            return get_clickhouse_streaming_cursor(
+                self.conn,
+                batch_size,
+                arrow=arrow,
+                use_numpy=self.connection_config.get("use_numpy", False),
+            )
+        raise Exception(f"Unknown connection type: {self.connection_type}")
+
+    @property
+    def supports_arrow_batches(self) -> bool:
+        return self.is_duckdb or self.is_snowflake or self.is_clickhouse
+
+    def iter_arrow_batches(self, cursor, batch_size: int) -> Iterator[Any]:
+        if self.is_duckdb:
+            return iter_duckdb_arrow_batches(cursor, batch_size)
+        if self.is_snowflake:
+            return iter_snowflake_arrow_batches(cursor, batch_size)
+        if self.is_clickhouse:
+            return iter_clickhouse_arrow_batches(cursor, batch_size)
+        raise Exception(f"No arrow batches from {self.connection_type} connections")
+
+    def stream_results(
+        self, query: str, batch_size: int | None = None, arrow: bool = False
+    ) -> tuple[str | None, List[str], Iterator[Any]]:
+        """Run a query and return its column names and an iterator of batches
+
+        Batches are lists of row tuples, or pyarrow RecordBatches when `arrow`
+        is set (see `supports_arrow_batches`).  Nothing is turned into a
+        RowDict, so memory stays flat however many rows the query returns.
+        Batches hold `batch_size` rows, or as many as the connection's batch
+        settings ask for (see `batching`); adaptive sizing only applies to
+        tuple batches.
+        """
+        err = self.check_cost(query)
+        if err is not None:
+            return err, [], iter(())
+        settings = self.batch_settings
+        if batch_size is not None:
+            settings = BatchSettings(batch_size)
+        # adaptive batches are sliced from the backend's usual-sized fetches
+        batch_size = DEFAULT_BATCH_SIZE if settings.adaptive else settings.batch_size
+        cursor = self.get_streaming_cursor(batch_size, arrow=arrow)
+        try:
+            with span("execute"):
+                cursor.execute(query)
+            self.last_query_id = get_backend_query_id(cursor)
+            if arrow:
+                batches = self.iter_arrow_batches(cursor, batch_size)
+            elif settings.adaptive:
+                batches = iter_adaptive_batches(cursor, settings)
+            else:
+                batches = iter(lambda: cursor.fetchmany(batch_size), [])
+            # some cursors (e.g. postgres server-side ones) only have a
+            # description once the first rows have been fetched
+            with span("fetch"):
+                first_batch = next(batches, None)
+            column_names = [column[0] for column in cursor.description]
+        except ProgrammingError as e:
+            cursor.close()
+            return format_error(e), [], iter(())
+        return None, column_names, self._iter_batches(cursor, first_batch, batches)
+
+    @property
+    def uses_postgres_copy(self) -> bool:
+        """CSV exports from Postgres go through COPY unless the connection sets
+        `copy_exports = false`"""
+        return self.is_postgres and self.connection_config.get("copy_exports", True)
+
+    def copy_results_to_csv(self, query: str, output_file) -> tuple[str | None, int]:
+        """Write the results as CSV (with a header) using Postgres' COPY"""
+        err = self.check_cost(query)
+        if err is not None:
+            return err, 0
+        try:
+            with span("fetch"):
+                return None, copy_postgres_csv(self.conn, query, output_file)
+        except psycopg2.Error as e:
+            self.conn.rollback()
+            return format_error(e), 0
+
+    def _iter_batches(
+        self, cursor, first_batch: Any, batches: Iterator[Any]
+    ) -> Iterator[Any]:
+        try:
+            batch = first_batch
+            while batch is not None:
+                yield batch
+                with span("fetch"):
+                    batch = next(batches, None)
+        finally:
+            cursor.close()
+
+    def submit_query(self, query: str) -> tuple[str | None, str | None]:
+        """Start a query without waiting for it: (error, warehouse query id)
+
+        Only Snowflake runs queries asynchronously.
+        """
+        if not self.is_snowflake:
+            return f"Can't submit queries to {self.connection_type} connections", None
+        err = self.check_cost(query)
+        if err is not None:
+            return err, None
+        try:
+            with span("submit"):
+                return None, submit_snowflake_query(self.conn, query)
+        except ProgrammingError as e:
+            return format_error(e), None
+
+    def poll_submitted_query(self, query_id: str) -> tuple[str | None, bool]:
+        """(error, still running) for a submitted query"""
+        try:
+            return None, snowflake_query_is_running(self.conn, query_id)
+        except ProgrammingError as e:
+            return format_error(e), False
+
+    def get_submitted_rows(self, query_id: str) -> tuple[str | None, Schema, List[Row]]:
+        """A finished submitted query's rows, like `get_rows`"""
+        try:
+            with span("fetch"):
+                cursor = get_snowflake_results_cursor(self.conn, query_id)
+                try:
+                    rows = cursor.fetchall()
+                    schema = Schema.from_description(cursor.description)
+                finally:
+                    cursor.close()
+        except ProgrammingError as e:
+            return format_error(e), Schema(()), []
+        self.last_query_id = query_id
+        return None, schema, rows
+
+    def prepare(self, query: str) -> "PreparedQuery":
+        """`query`, with `:name` parameters, ready to run with many parameter
+        sets (see `prepared`); use it as a context manager to free it after"""
+        try:
+            if self.is_postgres:
+                bound = bind_query(query, NUMERIC)
+                statement = PostgresPreparedStatement(
+                    get_postgres_cursor(self.conn), bound.text, len(bound.names)
+                )
+            elif self.is_duckdb:
+                bound = bind_query(query, NUMERIC)
+                statement = CursorStatement(get_duckdb_cursor(self.conn), bound.text)
+            elif self.is_mysql:
+                bound = bind_query(query, QMARK)
+                statement = CursorStatement(
+                    get_mysql_prepared_cursor(self.conn), bound.text
+                )
+            else:
+                bound = bind_query(query, PYFORMAT)
+                statement = CursorStatement(self.get_cursor(), bound.text)
+        except Exception:
+            self.rollback()
+            raise
+        return PreparedQuery(self, bound, statement)
+
+    def commit(self):
+        if self.is_postgres or self.is_mysql:
+            self.conn.commit()
+
+    def rollback(self):
+        """End a transaction a failed query left open, so the connection can
+        be reused (Postgres refuses further queries until then)"""
+        if self.is_postgres or self.is_mysql:
+            self.conn.rollback()
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Commit what runs in this block at its end, or roll it back if it
+        raises, so a connection that's reused isn't left in a transaction"""
+        try:
+            yield
+        except BaseException:
+            self.rollback()
+            raise
+        self.commit()
+
+    def close(self):
+        self.conn.close()
 
     @property
     def is_postgres(self) -> bool:
@@ -99,3 +419,66 @@ class Connector:
     @property
     def is_clickhouse(self) -> bool:
         return self.connection_type == "clickhouse"
+
+
+class PreparedQuery:
+    """A query prepared by `Connector.prepare`, run once per parameter set"""
+
+    def __init__(self, connector: Connector, bound: BoundQuery, statement):
+        self.connector = connector
+        self.bound = bound
+        self.statement = statement
+
+    def get_rows(self, params: Params) -> tuple[str | None, Schema, List[Row]]:
+        """Like `Connector.get_rows`, with `params` bound to the query"""
+        try:
+            values = self.bound.get_values(params)
+        except ParameterException as e:
+            return str(e), Schema(()), []
+        err = self.connector.check_cost(self.statement.text, values)
+        if err is not None:
+            return err, Schema(()), []
+        cursor = self.statement.cursor
+        try:
+            with span("execute"):
+                self.statement.execute(values)
+            self.connector.last_query_id = get_backend_query_id(cursor)
+            with span("fetch"):
+                rows = cursor.fetchall()
+            return None, Schema.from_description(cursor.description), rows
+        except ProgrammingError as e:
+            return format_error(e), Schema(()), []
+
+    def execute_many(
+        self, param_sets: List[Params]
+    ) -> tuple[str | None, Optional[int]]:
+        """Run a statement that returns no rows (an INSERT, say) for every
+        parameter set in one batch, and commit them together, returning the
+        rows affected if the driver reports them"""
+        try:
+            value_sets = [self.bound.get_values(params) for params in param_sets]
+        except ParameterException as e:
+            return str(e), None
+        if value_sets:
+            err = self.connector.check_cost(self.statement.text, value_sets[0])
+            if err is not None:
+                return err, None
+        try:
+            with span("execute"):
+                row_count = self.statement.execute_many(value_sets)
+        except ProgrammingError as e:
+            return format_error(e), None
+        self.connector.commit()
+        return None, row_count
+
+    def close(self):
+        self.statement.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            # Postgres won't DEALLOCATE in a failed transaction
+            self.connector.rollback()
+        self.close()
@@ -0,0 +1,92 @@
+"""Refuse (or ask before running) queries whose plan looks too expensive
+
+Set any of these on a connection to check queries with EXPLAIN first:
+
+    max_estimated_rows = 10_000_000   # Postgres, DuckDB, ClickHouse
+    max_estimated_cost = 1_000_000    # Postgres planner cost units
+    max_scanned_gb = 50               # Snowflake bytes assigned to the scan
+    max_scanned_partitions = 10_000   # Snowflake micro-partitions
+    over_limit = "refuse"             # or "prompt"
+
+Each backend reports what its EXPLAIN estimates; limits it can't estimate are
+ignored.  Estimates are cached per query fingerprint, so queries differing only
+in their literals are only explained once per connection.
+"""
+
+from typing import List, NamedTuple, Optional
+
+from query_stash.config import ConfigException
+from query_stash.types import ConfigDict
+
+OVER_LIMIT_ACTIONS = ("refuse", "prompt")
+BYTES_PER_GB = 2**30
+
+
+class PlanEstimate(NamedTuple):
+    rows: Optional[float] = None
+    cost: Optional[float] = None
+    bytes: Optional[int] = None
+    partitions: Optional[int] = None
+
+
+class CostGuardSettings(NamedTuple):
+    max_rows: Optional[float] = None
+    max_cost: Optional[float] = None
+    max_bytes: Optional[float] = None
+    max_partitions: Optional[float] = None
+    over_limit: str = "refuse"
+
+    @property
+    def enabled(self) -> bool:
+        limits = (self.max_rows, self.max_cost, self.max_bytes, self.max_partitions)
+        return any(limit is not None for limit in limits)
+
+
+def get_limit(connection_config: ConfigDict, key: str) -> Optional[float]:
+    value = connection_config.get(key)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+        raise ConfigException(f"{key} must be a non-negative number")
+    return value
+
+
+def get_cost_guard_settings(connection_config: ConfigDict) -> CostGuardSettings:
+    max_scanned_gb = get_limit(connection_config, "max_scanned_gb")
+    over_limit = connection_config.get("over_limit", "refuse")
+    if over_limit not in OVER_LIMIT_ACTIONS:
+        raise ConfigException(
+            f"over_limit must be one of {', '.join(OVER_LIMIT_ACTIONS)}"
+        )
+    return CostGuardSettings(
+        max_rows=get_limit(connection_config, "max_estimated_rows"),
+        max_cost=get_limit(connection_config, "max_estimated_cost"),
+        max_bytes=None if max_scanned_gb is None else max_scanned_gb * BYTES_PER_GB,
+        max_partitions=get_limit(connection_config, "max_scanned_partitions"),
+        over_limit=over_limit,
+    )
+
+
+def get_exceeded_limits(
+    estimate: PlanEstimate, settings: CostGuardSettings
+) -> List[str]:
+    """A description of each limit the estimate goes over"""
+    exceeded = []
+    if settings.max_rows is not None and (estimate.rows or 0) > settings.max_rows:
+        exceeded.append(f"~{estimate.rows:,.0f} rows (limit {settings.max_rows:,.0f})")
+    if settings.max_cost is not None and (estimate.cost or 0) > settings.max_cost:
+        exceeded.append(f"cost {estimate.cost:,.0f} (limit {settings.max_cost:,.0f})")
+    if settings.max_bytes is not None and (estimate.bytes or 0) > settings.max_bytes:
+        exceeded.append(
+            f"{estimate.bytes / BYTES_PER_GB:,.1f} GB scanned "
+            f"(limit {settings.max_bytes / BYTES_PER_GB:,.1f} GB)"
+        )
+    if (
+        settings.max_partitions is not None
+        and (estimate.partitions or 0) > settings.max_partitions
+    ):
+        exceeded.append(
+            f"{estimate.partitions:,} partitions scanned "
+            f"(limit {settings.max_partitions:,.0f})"
+        )
+    return exceeded
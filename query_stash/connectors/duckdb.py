@@ -1,10 +1,17 @@
-from typing import Any, MutableMapping
+import re
+from typing import Any, MutableMapping, Optional
 
 import duckdb
 import pandas as pd
 from duckdb import DuckDBPyConnection
 
-from query_stash.types import RowDict
+from query_stash.timing import span
+from query_stash.types import RowDict, Values
+
+from .cost import PlanEstimate
+
+# each plan node's estimated cardinality: "EC: 20000" (0.x) or "~20,000 rows"
+DUCKDB_ROW_ESTIMATE_PATTERN = re.compile(r"(?:EC:\s*|~)([\d,]+)")
 
 
 def get_duckdb_connection(config: MutableMapping[str, Any]) -> DuckDBPyConnection:
@@ -48,16 +55,37 @@ class DuckDBDictCursor:
     def __init__(self, conn: DuckDBPyConnection):
         self.conn = conn
 
-    def execute(self, query: str):
-        self.conn.execute(query)
+    def execute(self, query: str, parameters=None):
+        self.conn.execute(query, parameters)
+
+    def executemany(self, query: str, parameters):
+        self.conn.executemany(query, parameters)
+
+    @property
+    def description(self):
+        return self.conn.description
+
+    @property
+    def rowcount(self) -> int:
+        return self.conn.rowcount
+
+    def close(self):
+        self.conn.close()
+
+    def fetch_dataframe(self) -> pd.DataFrame:
+        with span("duckdb.to_pandas"):
+            result_df = self.conn.df()
+        with span("duckdb.clean_dataframe"):
+            result_df = force_ints_to_be_ints_in_dataframe(result_df)
+            result_df = force_dates_to_be_dates_in_dataframe(result_df)
+            # get rid of NaNs which messes up guessing column datatypes
+            result_df = result_df.where(result_df.notnull(), None)
+        return result_df
 
     def fetchall(self) -> list[RowDict]:
-        result_df = self.conn.df()
-        result_df = force_ints_to_be_ints_in_dataframe(result_df)
-        result_df = force_dates_to_be_dates_in_dataframe(result_df)
-        # get rid of NaNs which messes up guessing column datatypes
-        result_df = result_df.where(result_df.notnull(), None)
-        records = result_df.to_dict("records")
+        result_df = self.fetch_dataframe()
+        with span("duckdb.to_records"):
+            records = result_df.to_dict("records")
         return records
 
     def __enter__(self):
@@ -67,8 +95,46 @@ class DuckDBDictCursor:
         self.conn.close()
 
 
-def get_duckdb_dict_cursor(conn: DuckDBPyConnection):
-    return DuckDBDictCursor(conn)
+class DuckDBCursor(DuckDBDictCursor):
+    """DuckDBDictCursor's cleaned-up values, as lists instead of dicts"""
+
+    def fetchall(self) -> list[list]:
+        result_df = self.fetch_dataframe()
+        with span("duckdb.to_records"):
+            records = result_df.to_dict("split")["data"]
+        return records
+
+
+def get_duckdb_cursor(conn: DuckDBPyConnection):
+    # a duplicate cursor, so closing it leaves the connection open for reuse
+    return DuckDBCursor(conn.cursor())
+
+
+def get_duckdb_streaming_cursor(conn: DuckDBPyConnection, batch_size: int):
+    """A duplicate cursor on the connection, which fetches tuples in batches"""
+    return conn.cursor()
+
+
+def iter_duckdb_arrow_batches(cursor: DuckDBPyConnection, batch_size: int):
+    """Arrow record batches straight from DuckDB's columnar result (needs pyarrow)"""
+    yield from cursor.fetch_record_batch(batch_size)
+
+
+def get_duckdb_plan_estimate(
+    conn: DuckDBPyConnection, query: str, values: Optional[Values] = None
+) -> PlanEstimate:
+    """The largest row count estimated for any node of the plan"""
+    cursor = conn.cursor()
+    try:
+        plans = cursor.execute(f"EXPLAIN {query}", values).fetchall()
+    finally:
+        cursor.close()
+    estimates = [
+        int(estimate.replace(",", ""))
+        for _, plan in plans
+        for estimate in DUCKDB_ROW_ESTIMATE_PATTERN.findall(plan)
+    ]
+    return PlanEstimate(rows=max(estimates, default=None))
 
 
 if __name__ == "__main__":
@@ -1,18 +1,36 @@
 from typing import Any, MutableMapping
 
-from mysql.connector import MySQLConnection, connect
+from mysql.connector import HAVE_CEXT, MySQLConnection, connect
 
 
 def get_mysql_connection(config: MutableMapping[str, Any]) -> MySQLConnection:
+    """Connect with the C extension when it's installed (`use_pure = true` on
+    the connection forces the pure-Python protocol)"""
     conn = connect(
         database=config["dbname"],
         user=config["user"],
         password=config["password"],
         host=config["host"],
         port=config["port"],
+        use_pure=config.get("use_pure", not HAVE_CEXT),
+        # an abandoned unbuffered result is read off the wire when its cursor
+        # closes, instead of failing the next query with "Unread result found"
+        consume_results=True,
     )
     return conn
 
 
-def get_mysql_dict_cursor(conn: MySQLConnection):
-    return conn.cursor(dictionary=True)
+def get_mysql_cursor(conn: MySQLConnection):
+    return conn.cursor()
+
+
+def get_mysql_prepared_cursor(conn: MySQLConnection):
+    """A cursor that prepares its statement on the server, and reuses it while
+    it's executed with the same query"""
+    return conn.cursor(prepared=True)
+
+
+def get_mysql_streaming_cursor(conn: MySQLConnection, batch_size: int):
+    """An unbuffered tuple cursor: the server streams the result
+    (mysql_use_result) and rows are decoded only as `fetchmany` asks for them"""
+    return conn.cursor(buffered=False)
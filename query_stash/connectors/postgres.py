@@ -1,8 +1,16 @@
-from typing import Any, MutableMapping
+import itertools
+from typing import IO, Any, Iterator, List, MutableMapping, Optional, Sequence
 
 import psycopg2
 from psycopg2.extensions import connection as PostgresConnection
-from psycopg2.extras import DictCursor as PostgresDictCursor
+from psycopg2.extras import execute_batch
+
+from query_stash.types import Values
+
+from .cost import PlanEstimate
+
+STATEMENT_NUMBERS = itertools.count(1)
+EXPLAIN_SAVEPOINT = "query_stash_explain"
 
 
 def get_postgres_connection(config: MutableMapping[str, Any]) -> PostgresConnection:
@@ -15,5 +23,88 @@ def get_postgres_connection(config: MutableMapping[str, Any]) -> PostgresConnect
     )
 
 
-def get_postgres_dict_cursor(conn: PostgresConnection):
-    return conn.cursor(cursor_factory=PostgresDictCursor)
+def get_postgres_cursor(conn: PostgresConnection):
+    return conn.cursor()
+
+
+def get_postgres_streaming_cursor(conn: PostgresConnection, batch_size: int):
+    """A named (server-side) cursor, so rows arrive `batch_size` at a time"""
+    cursor = conn.cursor(name="query_stash_stream")
+    cursor.itersize = batch_size
+    return cursor
+
+
+def get_copy_csv_query(query: str) -> str:
+    # the closing paren on its own line, so a trailing -- comment can't hide it
+    return (
+        f"COPY (\n{query.strip().rstrip(';')}\n) "
+        "TO STDOUT WITH (FORMAT csv, HEADER true)"
+    )
+
+
+def copy_postgres_csv(conn: PostgresConnection, query: str, output_file: IO) -> int:
+    """Write a query's results straight into `output_file` as CSV with COPY,
+    returning the row count
+
+    Postgres formats the CSV itself, so no row is ever decoded in Python.
+    """
+    with conn.cursor() as cursor:
+        cursor.copy_expert(get_copy_csv_query(query), output_file)
+        return cursor.rowcount
+
+
+def iter_postgres_plan_nodes(plan: dict) -> Iterator[dict]:
+    """A plan node and every node under it"""
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from iter_postgres_plan_nodes(child)
+
+
+def get_postgres_plan_estimate(
+    conn: PostgresConnection, query: str, values: Optional[Values] = None
+) -> PlanEstimate:
+    """The largest row count the planner estimates for any node of the plan (a
+    scan feeding an aggregate, say), and its total cost
+
+    EXPLAIN runs in a savepoint, so a statement it can't take doesn't abort
+    the transaction the connection is in.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(f"SAVEPOINT {EXPLAIN_SAVEPOINT}")
+        try:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {query}", values)
+            plan = cursor.fetchone()[0][0]["Plan"]
+        except psycopg2.Error:
+            cursor.execute(f"ROLLBACK TO SAVEPOINT {EXPLAIN_SAVEPOINT}")
+            raise
+        finally:
+            cursor.execute(f"RELEASE SAVEPOINT {EXPLAIN_SAVEPOINT}")
+    rows = max(node["Plan Rows"] for node in iter_postgres_plan_nodes(plan))
+    return PlanEstimate(rows=rows, cost=plan["Total Cost"])
+
+
+class PostgresPreparedStatement:
+    """A statement PREPAREd once on the server, then EXECUTEd per parameter set
+    so it's parsed and planned just once"""
+
+    def __init__(self, cursor, text: str, parameter_count: int):
+        self.cursor = cursor
+        self.name = f"query_stash_{next(STATEMENT_NUMBERS)}"
+        # what runs (and is explained) per set, with the values as parameters
+        self.text = f"EXECUTE {self.name}"
+        if parameter_count:
+            self.text += f" ({', '.join(['%s'] * parameter_count)})"
+        cursor.execute(f"PREPARE {self.name} AS {text}")
+
+    def execute(self, values: Sequence[Any]):
+        self.cursor.execute(self.text, values)
+
+    def execute_many(self, value_sets: List[Sequence[Any]]) -> Optional[int]:
+        """Run every set, sending many EXECUTEs per round trip (psycopg2 only
+        reports the rows affected by the last of them, so none are returned)"""
+        execute_batch(self.cursor, self.text, value_sets)
+        return None
+
+    def close(self):
+        self.cursor.execute(f"DEALLOCATE {self.name}")
+        self.cursor.close()
@@ -0,0 +1,87 @@
+"""Queries with `:name` parameters, prepared once and run per parameter set
+
+Values are always bound by the driver or the server, never pasted into the SQL.
+Each backend gets the placeholders it binds best:
+
+- Postgres: `$1`, in a statement PREPAREd on the server and EXECUTEd per set
+- DuckDB: `$1`; a batch (`execute_many`) is prepared once for every set
+- MySQL: `?`, in a server-side prepared statement its prepared cursor reuses
+- Snowflake and ClickHouse: `%(name)s`, bound by the driver
+"""
+
+import re
+from typing import Any, List, NamedTuple, Optional, Sequence
+
+from query_stash.params import ParameterException
+from query_stash.types import Params
+
+NUMERIC = "numeric"
+QMARK = "qmark"
+PYFORMAT = "pyformat"
+
+# strings, quoted names, comments, casts and % are copied as they are (bar
+# escaping % for pyformat drivers); `:name` elsewhere is a parameter
+PLACEHOLDER_PATTERN = re.compile(
+    r"""(?P<skip>'(?:[^']|'')*'|"(?:[^"]|"")*"|--[^\n]*|/\*.*?\*/|::|%)"""
+    r"""|(?<![\w:]):(?P<name>[A-Za-z_]\w*)""",
+    re.DOTALL,
+)
+
+
+class BoundQuery(NamedTuple):
+    text: str
+    # the parameter each value is for, in the order the driver takes them
+    names: List[str]
+    style: str
+
+    def get_values(self, params: Params) -> Sequence[Any] | Params:
+        missing = [name for name in dict.fromkeys(self.names) if name not in params]
+        if missing:
+            raise ParameterException(
+                f"No value given for {', '.join(f':{name}' for name in missing)}"
+            )
+        if self.style == PYFORMAT:
+            return {name: params[name] for name in self.names}
+        return [params[name] for name in self.names]
+
+
+def bind_query(query: str, style: str) -> BoundQuery:
+    """`query` with its `:name` parameters turned into `style` placeholders"""
+    names: List[str] = []
+
+    def replace(match: re.Match) -> str:
+        skipped = match.group("skip")
+        if skipped is not None:
+            # pyformat drivers read every % as the start of a placeholder
+            return skipped.replace("%", "%%") if style == PYFORMAT else skipped
+        name = match.group("name")
+        if style == QMARK:
+            names.append(name)
+            return "?"
+        if name not in names:
+            names.append(name)
+        if style == NUMERIC:
+            return f"${names.index(name) + 1}"
+        return f"%({name})s"
+
+    return BoundQuery(PLACEHOLDER_PATTERN.sub(replace, query), names, style)
+
+
+class CursorStatement:
+    """A query run on one cursor with values bound by the driver"""
+
+    def __init__(self, cursor, text: str):
+        self.cursor = cursor
+        self.text = text
+
+    def execute(self, values: Sequence[Any] | Params):
+        self.cursor.execute(self.text, values)
+
+    def execute_many(self, value_sets: List[Sequence[Any] | Params]) -> Optional[int]:
+        """Run every set in one batch, returning the rows affected (if known)"""
+        self.cursor.executemany(self.text, value_sets)
+        rowcount = self.cursor.rowcount
+        return rowcount if rowcount >= 0 else None
+
+    def close(self):
+        self.cursor.close()
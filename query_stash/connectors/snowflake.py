@@ -1,10 +1,19 @@
-from typing import Any, MutableMapping
+import json
+import re
+from typing import Any, MutableMapping, Optional
 
 import snowflake.connector
-from snowflake.connector import DictCursor
 from snowflake.connector.connection import SnowflakeConnection
 
-SnowflakeDictCursor = DictCursor
+from query_stash.types import Values
+
+from .cost import PlanEstimate
+
+# result chunks downloaded in parallel (the connector's default is 4)
+DEFAULT_PREFETCH_THREADS = 8
+SNOWFLAKE_QUERY_ID_PATTERN = re.compile(
+    r"^[0-9a-fA-F]{8}(-[0-9a-fA-F]{4}){3}-[0-9a-fA-F]{12}$"
+)
 
 
 def get_snowflake_connection(config: MutableMapping[str, Any]) -> SnowflakeConnection:
@@ -16,11 +25,80 @@ def get_snowflake_connection(config: MutableMapping[str, Any]) -> SnowflakeConne
         warehouse=config["warehouse"],
         role=config["role"],
         schema="INFORMATION_SCHEMA",
+        client_prefetch_threads=config.get(
+            "prefetch_threads", DEFAULT_PREFETCH_THREADS
+        ),
+    )
+
+
+def get_snowflake_cursor(conn: SnowflakeConnection):
+    return conn.cursor()
+
+
+def get_snowflake_streaming_cursor(conn: SnowflakeConnection, batch_size: int):
+    """A tuple cursor; Snowflake downloads result chunks as they're fetched"""
+    cursor = conn.cursor()
+    cursor.arraysize = batch_size
+    return cursor
+
+
+def iter_snowflake_arrow_batches(cursor, batch_size: int):
+    """Arrow record batches made from the result chunks as they download
+
+    Needs pyarrow (`pip install "snowflake-connector-python[pandas]"`).
+    """
+    for table in cursor.fetch_arrow_batches():
+        yield from table.to_batches(max_chunksize=batch_size)
+
+
+def submit_snowflake_query(conn: SnowflakeConnection, query: str) -> str:
+    """Start a query without waiting for it, returning its Snowflake query id"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute_async(query)
+        return cursor.sfqid
+    finally:
+        cursor.close()
+
+
+def snowflake_query_is_running(conn: SnowflakeConnection, query_id: str) -> bool:
+    """Whether a submitted query is still queued or running (raises
+    ProgrammingError if it failed)"""
+    status = conn.get_query_status_throw_if_error(query_id)
+    return conn.is_still_running(status)
+
+
+def get_snowflake_results_cursor(conn: SnowflakeConnection, query_id: str):
+    """A tuple cursor over a finished query's result, from its query id
+
+    Works from any session of the same user, e.g. after a restart.
+    """
+    cursor = conn.cursor()
+    cursor.get_results_from_sfqid(query_id)
+    return cursor
+
+
+def get_snowflake_plan_estimate(
+    conn: SnowflakeConnection, query: str, values: Optional[Values] = None
+) -> PlanEstimate:
+    """The bytes and micro-partitions the compiled plan assigns to its scans"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"EXPLAIN USING JSON {query}", values)
+        plan = json.loads(cursor.fetchone()[0])
+    finally:
+        cursor.close()
+    stats = plan.get("GlobalStats", {})
+    return PlanEstimate(
+        bytes=stats.get("bytesAssigned"), partitions=stats.get("partitionsAssigned")
     )
 
 
-def get_snowflake_dict_cursor(conn: SnowflakeConnection):
-    return conn.cursor(DictCursor)
+def get_result_scan_query(backend_query_id: str) -> str:
+    """A query re-reading an earlier query's result (kept by Snowflake for 24h)"""
+    if not SNOWFLAKE_QUERY_ID_PATTERN.match(backend_query_id):
+        raise ValueError(f"Not a Snowflake query id: {backend_query_id!r}")
+    return f"SELECT * FROM TABLE(RESULT_SCAN('{backend_query_id}'))"
 
 
 # conn = x
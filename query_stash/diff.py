@@ -0,0 +1,231 @@
+"""Compare two results of a query row by row, by hash
+
+Every row is reduced to 128-bit BLAKE2b digests of its stashed JSON and of its
+key columns' JSON, so diffing holds a couple of short byte strings per row
+rather than the rows themselves.  Each result is read once, in batches: the old one into a digest
+table, then the new one checked against it.  Only the rows shown in the report
+are read back in full.
+"""
+
+import hashlib
+import json
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Sequence, Tuple
+
+from query_stash.render import get_rendered_table
+from query_stash.schema import Schema
+from query_stash.sqlite import encode_row
+
+RowJsonBatches = Callable[[], Iterable[List[str]]]
+
+
+class DiffException(Exception):
+    pass
+
+
+class DiffSide(NamedTuple):
+    """One result being compared: its columns, a way to read its rows as
+    stashed JSON (see `sqlite.encode_row`), and a way to fetch rows by number
+    (given in ascending order)"""
+
+    label: str
+    column_names: Tuple[str, ...]
+    iter_row_json: RowJsonBatches
+    get_rows: Callable[[Sequence[int]], List[Sequence[Any]]]
+
+
+class ResultDiff(NamedTuple):
+    """Row numbers added to the new result, removed from the old one, and
+    (old, new) pairs of rows whose key matches but values differ"""
+
+    key_columns: Tuple[str, ...]
+    added: List[int]
+    removed: List[int]
+    changed: List[Tuple[int, int]]
+    unchanged: int
+
+
+def iter_row_json_batches(
+    rows: Sequence[Sequence[Any]], batch_size: int = 10_000
+) -> Iterable[List[str]]:
+    """Rows encoded as the stash stores them, so they hash the same"""
+    for start in range(0, len(rows), batch_size):
+        yield [encode_row(row) for row in rows[start : start + batch_size]]
+
+
+_scan_json_value = json.JSONDecoder().scan_once
+
+
+def get_key(row_json: str, key_positions: Sequence[int]) -> str:
+    """The key columns' JSON, scanning the row only as far as the last of them"""
+    values = []
+    index = 1
+    for _ in range(max(key_positions) + 1):
+        start = index
+        _, index = _scan_json_value(row_json, index)
+        values.append(row_json[start:index])
+        index += 2  # past encode_row's ", " separator
+    return ", ".join(values[position] for position in key_positions)
+
+
+def get_digest(text: str) -> bytes:
+    return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+
+def detect_key_columns(column_names: Sequence[str]) -> Tuple[str, ...]:
+    """An `id` column, or else a leading `..._id` column (none if neither)"""
+    for name in column_names:
+        if name.lower() == "id":
+            return (name,)
+    if column_names and column_names[0].lower().endswith("_id"):
+        return (column_names[0],)
+    return ()
+
+
+def iter_digests(
+    side: DiffSide, key_positions: Sequence[int]
+) -> Iterable[Tuple[int, bytes, bytes]]:
+    """(row number, key digest, row digest) of every row
+
+    The digests are wide enough that rows with different JSON never collide,
+    unlike Python's own hashes (e.g. `hash(-1) == hash(-2)`).
+    """
+    row_number = 0
+    for batch in side.iter_row_json():
+        for row_json in batch:
+            row_digest = get_digest(row_json)
+            if key_positions:
+                key = get_key(row_json, key_positions)
+                yield row_number, get_digest(key), row_digest
+            else:
+                yield row_number, row_digest, row_digest
+            row_number += 1
+
+
+def diff_by_key(
+    old: DiffSide, new: DiffSide, key_columns: Tuple[str, ...]
+) -> ResultDiff:
+    """Match rows on their key columns, which must be unique in both results"""
+    key_positions = [old.column_names.index(name) for name in key_columns]
+    old_rows: Dict[bytes, Tuple[int, bytes] | None] = {}
+    for row_number, key, row_digest in iter_digests(old, key_positions):
+        if key in old_rows:
+            raise DiffException(f"{', '.join(key_columns)} isn't unique in {old.label}")
+        old_rows[key] = (row_number, row_digest)
+    added, changed, unchanged = [], [], 0
+    for row_number, key, row_digest in iter_digests(new, key_positions):
+        if key not in old_rows:
+            added.append(row_number)
+            continue
+        old_row = old_rows[key]
+        if old_row is None:
+            raise DiffException(f"{', '.join(key_columns)} isn't unique in {new.label}")
+        # matched rows stay in the table, as None, to catch duplicate keys
+        old_rows[key] = None
+        if old_row[1] == row_digest:
+            unchanged += 1
+        else:
+            changed.append((old_row[0], row_number))
+    removed = sorted(row[0] for row in old_rows.values() if row is not None)
+    return ResultDiff(key_columns, added, removed, changed, unchanged)
+
+
+def diff_whole_rows(old: DiffSide, new: DiffSide) -> ResultDiff:
+    """Match identical rows (as a multiset); rows can only be added or removed"""
+    old_rows: Dict[bytes, int | List[int]] = {}
+    for row_number, _, row_digest in iter_digests(old, ()):
+        if row_digest not in old_rows:
+            old_rows[row_digest] = row_number
+        else:
+            numbers = old_rows[row_digest]
+            if isinstance(numbers, int):
+                old_rows[row_digest] = numbers = [numbers]
+            numbers.append(row_number)
+    added, unchanged = [], 0
+    for row_number, _, row_digest in iter_digests(new, ()):
+        numbers = old_rows.get(row_digest)
+        if numbers is None or numbers == []:
+            added.append(row_number)
+            continue
+        unchanged += 1
+        if isinstance(numbers, int):
+            del old_rows[row_digest]
+        else:
+            numbers.pop(0)
+    removed = sorted(
+        number
+        for numbers in old_rows.values()
+        for number in ([numbers] if isinstance(numbers, int) else numbers)
+    )
+    return ResultDiff((), added, removed, [], unchanged)
+
+
+def diff_results(
+    old: DiffSide, new: DiffSide, key_columns: Sequence[str] | None = None
+) -> ResultDiff:
+    """Diff two results on `key_columns`, or on a detected key
+
+    A detected key that turns out not to be unique falls back to comparing
+    whole rows, as does having no key at all.
+    """
+    if old.column_names != new.column_names:
+        raise DiffException(
+            f"Can't diff results with different columns: "
+            f"{', '.join(old.column_names)} vs {', '.join(new.column_names)}"
+        )
+    if key_columns:
+        missing = [name for name in key_columns if name not in old.column_names]
+        if missing:
+            raise DiffException(f"No key column {', '.join(missing)} in the results")
+        return diff_by_key(old, new, tuple(key_columns))
+    detected = detect_key_columns(old.column_names)
+    if detected:
+        try:
+            return diff_by_key(old, new, detected)
+        except DiffException:
+            pass
+    return diff_whole_rows(old, new)
+
+
+def get_diff_summary(diff: ResultDiff, old: DiffSide, new: DiffSide) -> str:
+    if diff.key_columns:
+        matched_on = f"on {', '.join(diff.key_columns)}"
+    else:
+        matched_on = "comparing whole rows"
+    return (
+        f"{old.label} -> {new.label} ({matched_on}): {len(diff.added):,} added, "
+        f"{len(diff.removed):,} removed, {len(diff.changed):,} changed, "
+        f"{diff.unchanged:,} unchanged"
+    )
+
+
+def format_rows(title: str, rows: List[Sequence[Any]], total: int, schema: Schema):
+    table = get_rendered_table(rows, schema=schema)
+    return f"{title} ({len(rows):,} of {total:,}):\n{table}"
+
+
+def format_diff(diff: ResultDiff, old: DiffSide, new: DiffSide, limit: int = 10) -> str:
+    """A summary line, then up to `limit` rows of each kind of difference"""
+    sections = [get_diff_summary(diff, old, new)]
+    schema = Schema(old.column_names)
+    if diff.added:
+        rows = new.get_rows(diff.added[:limit])
+        sections.append(format_rows("Added", rows, len(diff.added), schema))
+    if diff.removed:
+        rows = old.get_rows(diff.removed[:limit])
+        sections.append(format_rows("Removed", rows, len(diff.removed), schema))
+    if diff.changed:
+        pairs = diff.changed[:limit]
+        old_numbers = sorted(old_number for old_number, _ in pairs)
+        new_numbers = sorted(new_number for _, new_number in pairs)
+        old_rows = dict(zip(old_numbers, old.get_rows(old_numbers)))
+        new_rows = dict(zip(new_numbers, new.get_rows(new_numbers)))
+        rows = []
+        for old_number, new_number in pairs:
+            rows.append(("-", *old_rows[old_number]))
+            rows.append(("+", *new_rows[new_number]))
+        changed_schema = Schema(("change",) + schema.names)
+        sections.append(
+            f"Changed ({len(pairs):,} of {len(diff.changed):,}):\n"
+            f"{get_rendered_table(rows, schema=changed_schema)}"
+        )
+    return "\n\n".join(sections)
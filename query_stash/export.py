@@ -0,0 +1,235 @@
+"""Write query results to CSV, JSON Lines, Parquet or Arrow files batch by batch
+
+Writers take batches straight from `Connector.stream_results` (lists of row
+tuples, or pyarrow RecordBatches) so an export never holds more than one batch
+in memory.  Parquet and Arrow need the optional `pyarrow` package.
+"""
+
+import csv
+import json
+import sys
+from abc import ABC, abstractmethod
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import IO, Any, Iterable, List, Optional
+
+from query_stash.timing import span
+
+EXPORT_FORMATS = ("csv", "jsonl", "parquet", "arrow")
+ARROW_FORMATS = ("parquet", "arrow")
+STDOUT_PATH = "-"
+
+
+class ExportException(Exception):
+    pass
+
+
+def import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ExportException(
+            "Exporting to parquet or arrow requires pyarrow: pip install pyarrow"
+        )
+    return pyarrow
+
+
+def json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, bytes):
+        return value.hex()
+    return str(value)
+
+
+def open_text_output(output_path: str) -> IO[str]:
+    if output_path == STDOUT_PATH:
+        return sys.stdout
+    return open(output_path, "w", newline="")
+
+
+def close_text_output(output_file: IO[str]):
+    if output_file is not sys.stdout:
+        output_file.close()
+
+
+class BatchWriter(ABC):
+    """Writes batches of rows with the given column names to `output_path`"""
+
+    def __init__(self, output_path: str, column_names: List[str]):
+        self.output_path = output_path
+        self.column_names = column_names
+        self.row_count = 0
+
+    def write_batch(self, batch: Any):
+        if hasattr(batch, "num_rows"):
+            self.row_count += batch.num_rows
+            self.write_rows([tuple(row.values()) for row in batch.to_pylist()])
+        else:
+            self.row_count += len(batch)
+            self.write_rows(batch)
+
+    @abstractmethod
+    def write_rows(self, rows: List[tuple]):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class CsvWriter(BatchWriter):
+    def __init__(self, output_path: str, column_names: List[str]):
+        super().__init__(output_path, column_names)
+        self.file = open_text_output(output_path)
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(column_names)
+
+    def write_rows(self, rows: List[tuple]):
+        self.writer.writerows(rows)
+
+    def close(self):
+        close_text_output(self.file)
+
+
+class JsonlWriter(BatchWriter):
+    def __init__(self, output_path: str, column_names: List[str]):
+        super().__init__(output_path, column_names)
+        self.file = open_text_output(output_path)
+
+    def write_rows(self, rows: List[tuple]):
+        self.file.writelines(
+            json.dumps(dict(zip(self.column_names, row)), default=json_default) + "\n"
+            for row in rows
+        )
+
+    def close(self):
+        close_text_output(self.file)
+
+
+class ArrowBatchWriter(BatchWriter):
+    """Base for pyarrow-backed formats; the schema is fixed by the first batch
+
+    Columns that are entirely NULL in the first batch are written as strings.
+    """
+
+    def __init__(self, output_path: str, column_names: List[str]):
+        super().__init__(output_path, column_names)
+        if output_path == STDOUT_PATH:
+            raise ExportException("Parquet and arrow exports need an --output path")
+        self.pa = import_pyarrow()
+        self.schema = None
+        self.writer = None
+
+    def write_rows(self, rows: List[tuple]):
+        self.write_batch(self.rows_to_record_batch(rows))
+
+    def write_batch(self, batch: Any):
+        if not hasattr(batch, "num_rows"):
+            batch = self.rows_to_record_batch(batch)
+        if self.writer is None:
+            self.schema = self.get_schema(batch.schema)
+            self.writer = self.open_writer(self.schema)
+        if batch.schema != self.schema:
+            batch = self.cast_record_batch(batch)
+        self.row_count += batch.num_rows
+        self.writer.write_batch(batch)
+
+    def rows_to_record_batch(self, rows: List[tuple]):
+        columns = list(zip(*rows)) or [[] for _ in self.column_names]
+        if self.schema is None:
+            arrays = [self.pa.array(column) for column in columns]
+        else:
+            arrays = [
+                self.to_array(column, field.type)
+                for column, field in zip(columns, self.schema)
+            ]
+        return self.pa.RecordBatch.from_arrays(arrays, names=self.column_names)
+
+    def to_array(self, column: Iterable[Any], arrow_type):
+        try:
+            return self.pa.array(column, type=arrow_type)
+        except (self.pa.ArrowInvalid, self.pa.ArrowTypeError, TypeError):
+            if arrow_type != self.pa.string():
+                raise
+            return self.pa.array(
+                [None if v is None else json_default(v) for v in column],
+                type=arrow_type,
+            )
+
+    def get_schema(self, schema):
+        fields = [
+            (
+                field.with_type(self.pa.string())
+                if self.pa.types.is_null(field.type)
+                else field
+            )
+            for field in schema
+        ]
+        return self.pa.schema(fields)
+
+    def cast_record_batch(self, batch):
+        arrays = [
+            self.to_array(column.to_pylist(), field.type)
+            for column, field in zip(batch.columns, self.schema)
+        ]
+        return self.pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+    @abstractmethod
+    def open_writer(self, schema):
+        pass
+
+    def close(self):
+        if self.writer is None:
+            # no batches at all: still write a valid, empty file
+            self.schema = self.pa.schema(
+                [(name, self.pa.string()) for name in self.column_names]
+            )
+            self.writer = self.open_writer(self.schema)
+        self.writer.close()
+
+
+class ParquetWriter(ArrowBatchWriter):
+    def open_writer(self, schema):
+        return self.pa.parquet.ParquetWriter(self.output_path, schema)
+
+
+class ArrowWriter(ArrowBatchWriter):
+    """Arrow IPC file format (a.k.a. Feather v2)"""
+
+    def open_writer(self, schema):
+        return self.pa.ipc.new_file(self.output_path, schema)
+
+
+WRITERS = {
+    "csv": CsvWriter,
+    "jsonl": JsonlWriter,
+    "parquet": ParquetWriter,
+    "arrow": ArrowWriter,
+}
+
+
+def get_batch_writer(
+    export_format: str, output_path: Optional[str], column_names: List[str]
+) -> BatchWriter:
+    if export_format not in WRITERS:
+        raise ExportException(f"Unknown export format: {export_format}")
+    return WRITERS[export_format](output_path or STDOUT_PATH, column_names)
+
+
+def write_batches(writer: BatchWriter, batches: Iterable[Any]) -> int:
+    """Write every batch, returning the number of rows written"""
+    with writer:
+        for batch in batches:
+            with span("write"):
+                writer.write_batch(batch)
+    return writer.row_count
@@ -0,0 +1,109 @@
+"""Rules deciding how each column is formatted, from its name and value type
+
+Rules are tried in order and the first whose name pattern and type both match
+picks the column's formatter.  The name patterns are compiled into a single
+regex, so classifying a column is one regex call (bar patterns with groups or
+global flags, which can't share it and are searched on their own), and
+decisions are memoized per (column name, type) for as long as the rules object
+lives.
+"""
+
+import re
+from typing import Dict, Iterable, NamedTuple, Optional, Sequence, Tuple
+
+TYPE_ALIASES = {
+    "number": ("int", "float", "decimal"),
+    "integer": ("int",),
+    # pandas (DuckDB results) gives Timestamps rather than datetimes
+    "timestamp": ("datetime", "timestamp"),
+    "string": ("str",),
+    "text": ("str",),
+}
+
+
+def normalize_type_names(type_names: Iterable[str]) -> Tuple[str, ...]:
+    normalized = []
+    for type_name in type_names:
+        normalized.extend(TYPE_ALIASES.get(type_name.lower(), (type_name.lower(),)))
+    return tuple(normalized)
+
+
+class FormattingRule(NamedTuple):
+    """Use `formatter` for columns whose name matches `pattern` (a regex searched
+    anywhere in the name) and whose values are one of `types` (python type
+    names like "int" or "decimal", or "number"; empty means any type)"""
+
+    formatter: str
+    pattern: Optional[str] = None
+    types: Tuple[str, ...] = ()
+
+
+def can_be_combined(pattern: str) -> bool:
+    """Whether a pattern can share the combined regex: its groups would be
+    renumbered (breaking backreferences) or clash by name, and global flags
+    like `(?i)` are only allowed at the start of a regex"""
+    compiled = re.compile(pattern)
+    return compiled.groups == 0 and compiled.flags == re.UNICODE
+
+
+def compile_name_matcher(rules: Sequence[FormattingRule]) -> re.Pattern:
+    """One regex reporting every rule whose pattern matches a column name (of
+    the rules whose patterns `can_be_combined`)
+
+    Each pattern becomes an optional lookahead anchored at the start of the
+    name with its own named group, so a single `match` tries them all.
+    """
+    lookaheads = [
+        f"(?=(?P<rule{i}>.*?(?:{rule.pattern})))?"
+        for i, rule in enumerate(rules)
+        if rule.pattern is not None and can_be_combined(rule.pattern)
+    ]
+    return re.compile("".join(lookaheads), re.DOTALL)
+
+
+class FormattingRules:
+    """An ordered, compiled set of FormattingRules"""
+
+    def __init__(self, rules: Sequence[FormattingRule], default: str = "plain"):
+        self.rules = tuple(
+            rule._replace(types=normalize_type_names(rule.types)) for rule in rules
+        )
+        self.default = default
+        self._matcher = compile_name_matcher(self.rules)
+        self._separate_patterns = [
+            (i, re.compile(rule.pattern))
+            for i, rule in enumerate(self.rules)
+            if rule.pattern is not None and not can_be_combined(rule.pattern)
+        ]
+        self._decisions: Dict[Tuple[str, str], str] = {}
+
+    def matching_patterns(self, column_name: str) -> set:
+        """Indexes of the rules whose name pattern matches `column_name`"""
+        groups = self._matcher.match(column_name).groupdict()
+        matched = {int(name[4:]) for name, value in groups.items() if value is not None}
+        matched.update(
+            i for i, pattern in self._separate_patterns if pattern.search(column_name)
+        )
+        return matched
+
+    def get_formatter_name(self, column_name: str, column_type: type) -> str:
+        type_name = column_type.__name__.lower()
+        key = (column_name, type_name)
+        if key not in self._decisions:
+            self._decisions[key] = self._decide(column_name, type_name)
+        return self._decisions[key]
+
+    def _decide(self, column_name: str, type_name: str) -> str:
+        matched = self.matching_patterns(column_name)
+        for i, rule in enumerate(self.rules):
+            if rule.types and type_name not in rule.types:
+                continue
+            if rule.pattern is not None and i not in matched:
+                continue
+            return rule.formatter
+        return self.default
+
+    def matches(self, column_name: str, formatter: str) -> bool:
+        """Whether a rule using `formatter` has a pattern matching `column_name`"""
+        matched = self.matching_patterns(column_name)
+        return any(self.rules[i].formatter == formatter for i in matched)
@@ -0,0 +1,175 @@
+"""Run SQL over stashed results with DuckDB
+
+Queries name stashed results as `stash.q_<stash id>`.  The first time a result
+is named it's copied out of the SQLite stash into a DuckDB table of that name,
+typed from the column types recorded when it was stashed; after that, queries
+over it read DuckDB's own columnar storage and never touch the stash.
+"""
+
+import re
+from decimal import Decimal
+from os.path import expanduser
+from typing import Any, List, Sequence
+
+import duckdb
+import pandas as pd
+
+from query_stash.config import CONFIG_DIRECTORY
+from query_stash.connectors.connector import format_error
+from query_stash.schema import Schema
+from query_stash.sqlite import QueryStasher
+from query_stash.timing import span
+from query_stash.types import Row
+
+LOCAL_DB_PATH = expanduser(f"{CONFIG_DIRECTORY}/results.duckdb")
+STASH_SCHEMA = "stash"
+STASH_REFERENCE_PATTERN = re.compile(r'\bstash\s*\.\s*"?q_(\d+)\b', re.IGNORECASE)
+
+MAX_DECIMAL_PRECISION = 38
+NULLABLE_DTYPES = {"int": "Int64", "float": "Float64", "bool": "boolean"}
+# stored values of these types decode back to datetime, date, time and bytes
+INFERRED_TYPE_NAMES = ("datetime", "Timestamp", "date", "time", "bytes")
+
+
+class LocalQueryException(Exception):
+    pass
+
+
+def find_stash_references(query: str) -> List[int]:
+    """The stash ids of every `stash.q_<id>` named in a query, in order"""
+    query_ids: List[int] = []
+    for match in STASH_REFERENCE_PATTERN.finditer(query):
+        query_id = int(match.group(1))
+        if query_id not in query_ids:
+            query_ids.append(query_id)
+    return query_ids
+
+
+def quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def get_result_table_name(query_id: int) -> str:
+    return f"{STASH_SCHEMA}.q_{query_id}"
+
+
+def get_decimal_type(values: Sequence[Any]) -> str:
+    """The narrowest DECIMAL holding every value (DOUBLE if none does)"""
+    scale = integer_digits = 0
+    for value in values:
+        if value is None or not value.is_finite():
+            continue
+        _, digits, exponent = value.as_tuple()
+        scale = max(scale, -exponent)
+        integer_digits = max(integer_digits, len(digits) + exponent)
+    precision = max(integer_digits + scale, 1)
+    if precision > MAX_DECIMAL_PRECISION:
+        return "DOUBLE"
+    return f"DECIMAL({precision}, {scale})"
+
+
+def as_text(values: List[Any]) -> List[str | None]:
+    return [None if value is None else str(value) for value in values]
+
+
+def get_column(type_name: str, values: List[Any]) -> tuple[Any, str | None]:
+    """A stashed column as a pandas column, and the type to cast it to (if any)
+
+    Ints, floats and bools get nullable dtypes so NULLs stay NULL rather than
+    NaN; decimals go through strings to keep their exact value; dates, times
+    and bytes are left for DuckDB to infer; anything else becomes text.
+    """
+    if type_name in NULLABLE_DTYPES:
+        try:
+            return pd.array(values, dtype=NULLABLE_DTYPES[type_name]), None
+        except (OverflowError, TypeError, ValueError):
+            if all(isinstance(value, int) for value in values if value is not None):
+                return as_text(values), "HUGEINT"
+            return as_text(values), "VARCHAR"
+    if type_name == "Decimal":
+        if all(isinstance(v, Decimal) for v in values if v is not None):
+            return as_text(values), get_decimal_type(values)
+        return as_text(values), "VARCHAR"
+    if type_name in INFERRED_TYPE_NAMES:
+        return pd.Series(values, dtype=object), None
+    return as_text(values), "VARCHAR"
+
+
+def get_result_frame(
+    stasher: QueryStasher, query_id: int
+) -> tuple[pd.DataFrame, List[str]]:
+    """A stashed result as a DataFrame, plus the select list giving its columns
+    their types"""
+    columns = stasher.get_result_columns(query_id)
+    if not columns:
+        raise LocalQueryException(f"Stash {query_id} has no stored result rows")
+    rows = stasher.get_result_rows(query_id)
+    frame_columns = {}
+    select_list = []
+    for position, (name, type_name) in enumerate(columns):
+        key = f"c{position}"
+        values = [row[position] for row in rows]
+        frame_columns[key], cast_type = get_column(type_name, values)
+        expression = key if cast_type is None else f"CAST({key} AS {cast_type})"
+        select_list.append(f"{expression} AS {quote_identifier(name)}")
+    return pd.DataFrame(frame_columns), select_list
+
+
+def load_stashed_result(
+    conn: duckdb.DuckDBPyConnection, stasher: QueryStasher, query_id: int
+):
+    frame, select_list = get_result_frame(stasher, query_id)
+    conn.register("stashed_result", frame)
+    try:
+        conn.execute(
+            f"CREATE TABLE {get_result_table_name(query_id)} AS "
+            f"SELECT {', '.join(select_list)} FROM stashed_result"
+        )
+    finally:
+        conn.unregister("stashed_result")
+
+
+def get_loaded_query_ids(conn: duckdb.DuckDBPyConnection) -> set:
+    tables = conn.execute(
+        "SELECT table_name FROM information_schema.tables WHERE table_schema = ?",
+        [STASH_SCHEMA],
+    ).fetchall()
+    return {int(name[2:]) for (name,) in tables if re.fullmatch(r"q_\d+", name)}
+
+
+def get_local_connection(
+    stasher: QueryStasher, query_ids: Sequence[int], local_db_path: str
+) -> duckdb.DuckDBPyConnection:
+    """A connection to the local database with the given results loaded"""
+    conn = duckdb.connect(local_db_path)
+    conn.execute(f"CREATE SCHEMA IF NOT EXISTS {STASH_SCHEMA}")
+    loaded = get_loaded_query_ids(conn)
+    for query_id in query_ids:
+        if query_id not in loaded:
+            load_stashed_result(conn, stasher, query_id)
+    return conn
+
+
+def run_local_query(
+    query: str,
+    stasher: QueryStasher | None = None,
+    local_db_path: str = LOCAL_DB_PATH,
+) -> tuple[str | None, Schema, List[Row]]:
+    """Run a query over stashed results: (error, schema, rows) like
+    `Connector.get_rows`"""
+    stasher = stasher or QueryStasher()
+    try:
+        with span("connect"):
+            conn = get_local_connection(
+                stasher, find_stash_references(query), local_db_path
+            )
+        try:
+            with span("execute"):
+                cursor = conn.execute(query)
+            with span("fetch"):
+                rows = cursor.fetchall()
+            return None, Schema.from_description(cursor.description), rows
+        finally:
+            conn.close()
+    except (duckdb.Error, LocalQueryException) as e:
+        return format_error(e), Schema(()), []
@@ -0,0 +1,244 @@
+"""A curses pager over stashed results that only formats what's on screen
+
+Rows are read from the stash a page at a time, so opening a million-row result
+is as quick as opening a ten-row one:
+
+    j/k or ↓/↑     scroll a row          space/b or PgDn/PgUp   scroll a page
+    h/l or ←/→     scroll a column       g/G                    first/last row
+    :              jump to row number    /  n                   search, next match
+    q              quit
+"""
+
+import curses
+import random
+from collections import OrderedDict
+from typing import Any, List, Optional
+
+from query_stash.render import ColumnSpec, get_column_specs
+from query_stash.schema import Schema
+from query_stash.sqlite import QueryStasher
+
+PAGE_SIZE = 500
+CACHED_PAGES = 8
+WIDTH_SAMPLE_SIZE = 1_000
+MAX_COLUMN_WIDTH = 60
+
+
+class StashedResult:
+    """Random access to a stashed result's rows, caching a few pages at a time"""
+
+    def __init__(self, stasher: QueryStasher, query_id: int):
+        self.stasher = stasher
+        self.query_id = query_id
+        self.column_names = [name for name, _ in stasher.get_result_columns(query_id)]
+        self.row_count = stasher.get_result_row_count(query_id)
+        self._pages: "OrderedDict[int, List[List[Any]]]" = OrderedDict()
+
+    def _get_page(self, page_number: int) -> List[List[Any]]:
+        if page_number in self._pages:
+            self._pages.move_to_end(page_number)
+        else:
+            self._pages[page_number] = self.stasher.get_result_rows(
+                self.query_id, page_number * PAGE_SIZE, PAGE_SIZE
+            )
+            if len(self._pages) > CACHED_PAGES:
+                self._pages.popitem(last=False)
+        return self._pages[page_number]
+
+    def get_rows(self, offset: int, limit: int) -> List[List[Any]]:
+        rows: List[List[Any]] = []
+        stop = min(offset + limit, self.row_count)
+        while offset < stop:
+            page_number, start = divmod(offset, PAGE_SIZE)
+            page = self._get_page(page_number)[start : start + stop - offset]
+            if not page:
+                break
+            rows.extend(page)
+            offset += len(page)
+        return rows
+
+    def find(self, text: str, start: int = 0) -> Optional[int]:
+        return self.stasher.find_result_row(self.query_id, text, start)
+
+    def get_column_specs(self) -> List[ColumnSpec]:
+        """ColumnSpecs sized from a random sample of rows"""
+        if self.row_count <= WIDTH_SAMPLE_SIZE:
+            rows = self.get_rows(0, self.row_count)
+        else:
+            row_numbers = sorted(
+                random.Random(0).sample(range(self.row_count), WIDTH_SAMPLE_SIZE)
+            )
+            # keep the first and last rows, which get_column_specs types from
+            row_numbers[0], row_numbers[-1] = 0, self.row_count - 1
+            rows = self.stasher.get_result_rows_by_number(self.query_id, row_numbers)
+        if not rows:
+            return [ColumnSpec(name, width=len(name)) for name in self.column_names]
+        # by position, so columns sharing a name keep their own values
+        specs = get_column_specs(rows, schema=Schema(tuple(self.column_names)))
+        return [s._replace(width=min(s.width, MAX_COLUMN_WIDTH)) for s in specs]
+
+
+class PagerView:
+    """Which rows and columns are on screen, and the lines that draw them"""
+
+    def __init__(self, result: StashedResult, height: int, width: int):
+        self.result = result
+        self.column_specs = result.get_column_specs()
+        self.height = height
+        self.width = width
+        self.top_row = 0
+        self.left_column = 0
+        self.message = ""
+        self.last_search: Optional[str] = None
+        self.last_match: Optional[int] = None
+
+    def resize(self, height: int, width: int):
+        self.height = height
+        self.width = width
+        self.scroll_rows(0)
+
+    @property
+    def page_height(self) -> int:
+        """Rows of data that fit under the header and break line, above the status"""
+        return max(self.height - 3, 1)
+
+    @property
+    def visible_columns(self) -> List[int]:
+        columns = []
+        used = 1
+        for index in range(self.left_column, len(self.column_specs)):
+            used += self.column_specs[index].width + 3
+            if columns and used > self.width:
+                break
+            columns.append(index)
+        return columns
+
+    def scroll_rows(self, delta: int):
+        last_top_row = max(self.result.row_count - self.page_height, 0)
+        self.top_row = min(max(self.top_row + delta, 0), last_top_row)
+
+    def scroll_columns(self, delta: int):
+        last_column = max(len(self.column_specs) - 1, 0)
+        self.left_column = min(max(self.left_column + delta, 0), last_column)
+
+    def jump_to_row(self, row_number: int):
+        """Put `row_number` (counting from 1) at the top of the screen"""
+        self.top_row = 0
+        self.scroll_rows(row_number - 1)
+        self.message = f"row {row_number:,}"
+
+    def search(self, text: str, start: Optional[int] = None):
+        self.last_search = text
+        if start is None:
+            start = self.top_row
+        match = self.result.find(text, start)
+        if match is None:
+            self.message = f"{text!r} not found"
+        else:
+            self.last_match = match
+            self.top_row = 0
+            self.scroll_rows(match)
+            self.message = f"{text!r} found in row {match + 1:,}"
+
+    def search_next(self):
+        if self.last_search is not None:
+            start = self.top_row if self.last_match is None else self.last_match + 1
+            self.search(self.last_search, start=start)
+
+    def _join(self, items: List[str]) -> str:
+        return "| " + " | ".join(items) + " |"
+
+    def render(self) -> List[str]:
+        columns = self.visible_columns
+        specs = [self.column_specs[i] for i in columns]
+        header = self._join(
+            [ColumnSpec(s.name, width=s.width).transform(s.name) for s in specs]
+        )
+        break_line = self._join(["-" * s.width for s in specs])
+        rows = self.result.get_rows(self.top_row, self.page_height)
+        lines = [header.lower(), break_line]
+        for row in rows:
+            items = [s.transform(row[i]) for s, i in zip(specs, columns)]
+            lines.append(self._join(items))
+        lines.extend("" for _ in range(self.page_height - len(rows)))
+        lines.append(self.status_line(len(rows), columns))
+        return [line[: self.width] for line in lines]
+
+    def status_line(self, shown_rows: int, columns: List[int]) -> str:
+        first_row = self.top_row + 1 if shown_rows else 0
+        last_row = self.top_row + shown_rows
+        first_column = columns[0] + 1 if columns else 0
+        status = (
+            f"rows {first_row:,}-{last_row:,} of {self.result.row_count:,}"
+            f" · columns {first_column}-{first_column + len(columns) - 1}"
+            f" of {len(self.column_specs)}"
+        )
+        if self.message:
+            status += f" · {self.message}"
+        return status
+
+
+def prompt(screen, label: str) -> str:
+    height, width = screen.getmaxyx()
+    screen.move(height - 1, 0)
+    screen.clrtoeol()
+    screen.addnstr(height - 1, 0, label, width - 1)
+    curses.echo()
+    curses.curs_set(1)
+    try:
+        return screen.getstr(height - 1, len(label), width - len(label) - 1).decode()
+    finally:
+        curses.noecho()
+        curses.curs_set(0)
+
+
+def handle_key(view: PagerView, screen, key: int) -> bool:
+    """Apply one keypress to the view, returning False to quit"""
+    if key in (ord("q"), 27):
+        return False
+    elif key in (ord("j"), curses.KEY_DOWN):
+        view.scroll_rows(1)
+    elif key in (ord("k"), curses.KEY_UP):
+        view.scroll_rows(-1)
+    elif key in (ord(" "), curses.KEY_NPAGE):
+        view.scroll_rows(view.page_height)
+    elif key in (ord("b"), curses.KEY_PPAGE):
+        view.scroll_rows(-view.page_height)
+    elif key in (ord("l"), curses.KEY_RIGHT):
+        view.scroll_columns(1)
+    elif key in (ord("h"), curses.KEY_LEFT):
+        view.scroll_columns(-1)
+    elif key == ord("g"):
+        view.jump_to_row(1)
+    elif key == ord("G"):
+        view.jump_to_row(view.result.row_count)
+    elif key == ord(":"):
+        answer = prompt(screen, ":").strip().replace(",", "")
+        if answer.isdigit():
+            view.jump_to_row(int(answer))
+    elif key == ord("/"):
+        text = prompt(screen, "/")
+        if text:
+            view.search(text)
+    elif key == ord("n"):
+        view.search_next()
+    elif key == curses.KEY_RESIZE:
+        view.resize(*screen.getmaxyx())
+    return True
+
+
+def run_pager(stasher: QueryStasher, query_id: int):
+    result = StashedResult(stasher, query_id)
+
+    def main(screen):
+        curses.curs_set(0)
+        view = PagerView(result, *screen.getmaxyx())
+        while True:
+            screen.erase()
+            for y, line in enumerate(view.render()):
+                screen.addnstr(y, 0, line, max(view.width - 1, 1))
+            screen.refresh()
+            if not handle_key(view, screen, screen.getch()):
+                return
+
+    curses.wrapper(main)
@@ -0,0 +1,81 @@
+"""Values for the `:name` parameters in a query
+
+    query-stash query "select * from orders where id = :id" --param id=42
+    query-stash query "insert into seen values (:id, :at)" --param-file seen.csv --many
+
+A `--param` value binds as the JSON scalar it spells, if it spells one (`42`
+binds a number, `true` a boolean, `null` NULL), and as text otherwise; quote
+it (`--param id='"42"'`) to bind text.  A parameter file is JSON (an object, or
+a list of objects) or CSV with a header row, and holds one parameter set per
+object or row; `--param` values are added to every set.
+"""
+
+import csv
+import json
+import os
+import re
+from typing import Any, List, Optional, Sequence, Tuple
+
+from query_stash.types import Params
+
+PARAMETER_NAME_PATTERN = re.compile(r"^[A-Za-z_]\w*$")
+
+
+class ParameterException(Exception):
+    pass
+
+
+def parse_value(text: str) -> Any:
+    try:
+        value = json.loads(text)
+    except ValueError:
+        return text
+    if isinstance(value, (list, dict)):
+        return text
+    return value
+
+
+def parse_param(text: str) -> Tuple[str, Any]:
+    """A `name=value` pair from `--param`"""
+    name, equals, value = text.partition("=")
+    name = name.strip().lstrip(":")
+    if not equals or not PARAMETER_NAME_PATTERN.match(name):
+        raise ParameterException(f"--param takes name=value, not {text!r}")
+    return name, parse_value(value)
+
+
+def read_param_file(path: str) -> List[Params]:
+    try:
+        with open(path, newline="", encoding="utf-8") as param_file:
+            if os.path.splitext(path)[1].lower() == ".csv":
+                return [
+                    {name: parse_value(value) for name, value in row.items()}
+                    for row in csv.DictReader(param_file)
+                ]
+            loaded = json.load(param_file)
+    except (OSError, ValueError) as e:
+        raise ParameterException(f"Can't read parameters from {path}: {e}")
+    if isinstance(loaded, dict):
+        return [loaded]
+    if not isinstance(loaded, list) or not all(isinstance(p, dict) for p in loaded):
+        raise ParameterException(f"{path} should hold an object or a list of them")
+    return loaded
+
+
+def get_param_sets(
+    params: Sequence[str] = (), param_file: Optional[str] = None
+) -> List[Params]:
+    """The parameter sets to run a query with, from `--param`s and a file"""
+    fixed = dict(parse_param(param) for param in params)
+    param_sets = [{}] if param_file is None else read_param_file(param_file)
+    if not param_sets:
+        raise ParameterException(f"No parameter sets in {param_file}")
+    return [{**param_set, **fixed} for param_set in param_sets]
+
+
+def describe_params(params: Params) -> str:
+    """A SQL comment recording a run's parameters, e.g. `-- :id = 42`"""
+    values = ", ".join(
+        f":{name} = {json.dumps(value, default=str)}" for name, value in params.items()
+    )
+    return f"-- {values}"
@@ -2,32 +2,283 @@
 
 """Main module."""
 
-from typing import Optional
+from typing import Callable, Iterator, List, Optional, Sequence
 
-from query_stash.config import get_config, get_connection_from_config
+from query_stash.config import ConfigException, get_config
 from query_stash.connectors import Connector
-from query_stash.render import RenderedTable, get_rendered_table
-from query_stash.sqlite import QueryStasher
+from query_stash.connectors.snowflake import get_result_scan_query
+from query_stash.diff import (
+    DiffException,
+    DiffSide,
+    diff_results,
+    format_diff,
+    iter_row_json_batches,
+)
+from query_stash.local import run_local_query
+from query_stash.render import get_formatting_rules, get_rendered_table
+from query_stash.schema import Schema
+from query_stash.session import Session, StashedTable, render_and_stash
+from query_stash.sqlite import (
+    QueryStasher,
+    get_result_row_settings,
+    get_search_index_settings,
+)
+from query_stash.stats import get_run_history, summarize_runs
+from query_stash.timing import Timings, record_timings, span
+from query_stash.types import Params
+
+LOCAL_CONNECTION_NAME = "local"
 
 
 def connect_and_query_db(
-    config_path: Optional[str], connection_name: Optional[str], query: str
+    config_path: Optional[str],
+    connection_name: Optional[str],
+    query: str,
+    timings: Optional[Timings] = None,
+    width_sample_size: Optional[int] = None,
+    max_width: Optional[int] = None,
+    overflow: str = "truncate",
+    columns: Optional[Sequence[str]] = None,
+    max_table_width: Optional[int] = None,
+    processes: int = 1,
+    confirm_over_limit: Optional[Callable[[str], bool]] = None,
+    param_sets: Optional[List[Params]] = None,
+    many: bool = False,
+    pager: bool = False,
+) -> StashedTable:
+    """Run a query and return its rendered table (or error) and its stash id;
+    with `param_sets`, run it once per set (or, with `many`, as one
+    executemany batch)
+
+    With `pager`, a single query's table is only formatted as far as the
+    excerpt stashed with it (see `render_and_stash`).
+    """
+    with record_timings(timings) as timings:
+        with Session(config_path, confirm_over_limit=confirm_over_limit) as session:
+            if param_sets is not None and many:
+                summary = session.execute_many(
+                    query, param_sets, connection_name, timings=timings
+                )
+                return StashedTable(summary)
+            if param_sets is not None:
+                text = session.query_each(
+                    query,
+                    param_sets,
+                    connection_name,
+                    timings=timings,
+                    width_sample_size=width_sample_size,
+                    max_width=max_width,
+                    overflow=overflow,
+                    columns=columns,
+                    max_table_width=max_table_width,
+                    processes=processes,
+                )
+            else:
+                text = session.query(
+                    query,
+                    connection_name,
+                    timings=timings,
+                    width_sample_size=width_sample_size,
+                    max_width=max_width,
+                    overflow=overflow,
+                    columns=columns,
+                    max_table_width=max_table_width,
+                    processes=processes,
+                    pager=pager,
+                )
+            return StashedTable(text, session.last_stash_id)
+
+
+def query_stash_locally(
+    config_path: Optional[str],
+    query: str,
+    timings: Optional[Timings] = None,
+    width_sample_size: Optional[int] = None,
+    max_width: Optional[int] = None,
+    overflow: str = "truncate",
+    columns: Optional[Sequence[str]] = None,
+    max_table_width: Optional[int] = None,
+    processes: int = 1,
 ) -> str:
-    connector = Connector(config_path, connection_name)
-    err, results = connector.get_results(query)
-    if len(results) == 0 and err is None:
-        return "Query returned no results!"
-    if err is None:
-        rendered_table = get_rendered_table(results)
-        stasher = QueryStasher()
-        tags = ""
-        stasher.stash(
-            query,
-            rendered_table,
-            tags,
-            connector.connection_name,
-            connector.connection_name,
+    """Run a query over stashed results (`stash.q_<stash id>`) with DuckDB
+
+    The query and its result are stashed like any other, so local results
+    can be queried in turn.
+    """
+    with record_timings(timings) as timings:
+        with span("config"):
+            config = get_config(config_path)
+        stasher = QueryStasher(
+            search_index_settings=get_search_index_settings(config),
+            result_row_settings=get_result_row_settings(config),
         )
-        return str(rendered_table)
+        err, schema, results = run_local_query(query, stasher)
+        if err is not None:
+            return err
+        return render_and_stash(
+            query,
+            schema,
+            results,
+            LOCAL_CONNECTION_NAME,
+            "duckdb",
+            timings,
+            get_formatting_rules(config),
+            stasher=stasher,
+            width_sample_size=width_sample_size,
+            max_width=max_width,
+            overflow=overflow,
+            columns=columns,
+            max_table_width=max_table_width,
+            processes=processes,
+        ).text
+
+
+def connect_and_export_query(
+    config_path: Optional[str],
+    connection_name: Optional[str],
+    query: str,
+    export_format: str,
+    output_path: Optional[str],
+    batch_size: Optional[int] = None,
+    timings: Optional[Timings] = None,
+    confirm_over_limit: Optional[Callable[[str], bool]] = None,
+) -> str:
+    """Stream a query's results into a file without rendering them (see
+    `Session.export`)"""
+    with record_timings(timings) as timings:
+        with Session(config_path, confirm_over_limit=confirm_over_limit) as session:
+            return session.export(
+                query,
+                export_format,
+                output_path,
+                connection_name,
+                batch_size=batch_size,
+                timings=timings,
+            )
+
+
+def submit_queries(
+    config_path: Optional[str], connection_name: Optional[str], queries: Sequence[str]
+) -> List[str]:
+    """Start queries on Snowflake without waiting for them; their query ids
+    (or errors)"""
+    with Session(config_path) as session:
+        return [session.submit(query, connection_name) for query in queries]
+
+
+def collect_submitted_queries(
+    config_path: Optional[str],
+    wait: bool = True,
+    max_width: Optional[int] = None,
+) -> Iterator[str]:
+    """Each submitted query's result (stashed like any other) as it finishes"""
+    with Session(config_path) as session:
+        collected = 0
+        for submitted, table_text in session.collect(wait, max_width=max_width):
+            collected += 1
+            query_text = " ".join(submitted.query_text.split())
+            yield f"-- {submitted.backend_query_id}: {query_text}\n{table_text}"
+        pending = len(session.stasher.get_pending_submitted_queries())
+        if pending:
+            yield f"{pending} submitted queries still running"
+        elif collected == 0:
+            yield "No submitted queries to collect"
+
+
+def get_result_scan(query_id: int) -> Optional[tuple[str, str]]:
+    """A query re-reading a stashed Snowflake query's result, and its connection
+
+    None if the stash has no Snowflake query id for `query_id`.
+    """
+    found = QueryStasher().get_backend_query_id(query_id)
+    if found is None:
+        return None
+    backend_query_id, connection_name = found
+    return get_result_scan_query(backend_query_id), connection_name
+
+
+def get_stashed_diff_side(stasher: QueryStasher, query_id: int) -> DiffSide:
+    columns = stasher.get_result_columns(query_id)
+    if not columns:
+        raise DiffException(f"Stash {query_id} has no stored result rows")
+    return DiffSide(
+        f"#{query_id}",
+        tuple(name for name, _ in columns),
+        lambda: stasher.iter_result_row_json(query_id),
+        lambda row_numbers: stasher.get_result_rows_by_number(query_id, row_numbers),
+    )
+
+
+def get_live_diff_side(
+    config_path: Optional[str], stasher: QueryStasher, query_id: int
+) -> DiffSide:
+    """A fresh run of a stashed query, on the connection it was run on"""
+    found = stasher.get_query_text(query_id)
+    if found is None:
+        raise DiffException(f"No stashed query {query_id}")
+    query, connection_name, _ = found
+    if connection_name == LOCAL_CONNECTION_NAME:
+        err, schema, rows = run_local_query(query, stasher)
     else:
-        return err
+        err, schema, rows = Connector(config_path, connection_name).get_rows(query)
+    if err is not None:
+        raise DiffException(err)
+    return DiffSide(
+        "live",
+        schema.names,
+        lambda: iter_row_json_batches(rows),
+        lambda row_numbers: [rows[row_number] for row_number in row_numbers],
+    )
+
+
+def diff_query_results(
+    old_query_id: int,
+    new_query_id: Optional[int] = None,
+    key_columns: Optional[Sequence[str]] = None,
+    limit: int = 10,
+    config_path: Optional[str] = None,
+) -> str:
+    """Rows added, removed and changed between two stashed results, or between
+    a stashed result and a fresh run of its query if `new_query_id` is None"""
+    stasher = QueryStasher()
+    try:
+        old = get_stashed_diff_side(stasher, old_query_id)
+        if new_query_id is None:
+            new = get_live_diff_side(config_path, stasher, old_query_id)
+        else:
+            new = get_stashed_diff_side(stasher, new_query_id)
+        diff = diff_results(old, new, key_columns)
+    except (DiffException, ConfigException) as e:
+        return str(e)
+    return format_diff(diff, old, new, limit)
+
+
+def search_stash(
+    text: str, limit: int = 20, stasher: Optional[QueryStasher] = None
+) -> str:
+    """The latest stashed queries mentioning `text`, in their text, tags or
+    indexed results"""
+    found = (stasher or QueryStasher()).search_queries(text, limit)
+    if len(found) == 0:
+        return f"No stashed queries found matching {text!r}"
+    rows = [
+        (query_id, queried_at, connection_name, " ".join(query_text.split()))
+        for query_id, queried_at, connection_name, query_text in found
+    ]
+    schema = Schema(("id", "queried_at", "connection", "query"))
+    return str(get_rendered_table(rows, max_width=100, schema=schema))
+
+
+def get_query_stats(
+    connection_name: Optional[str] = None,
+    fingerprint: Optional[str] = None,
+    since: Optional[str] = None,
+) -> str:
+    """Latency summary per query fingerprint, or every run of one fingerprint"""
+    stasher = QueryStasher()
+    runs = stasher.get_query_runs(connection_name, fingerprint, since)
+    if len(runs) == 0:
+        return "No stashed query stats found!"
+    if fingerprint is not None:
+        return str(get_rendered_table(get_run_history(runs)))
+    return str(get_rendered_table(summarize_runs(runs)))
@@ -1,10 +1,28 @@
 import math
+import os
+import random
 import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from decimal import Decimal
-from typing import Callable, List, NamedTuple, Optional, Sequence
+from functools import lru_cache, partial
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+)
 
-from query_stash.types import RowDict
+from query_stash.config import ConfigException
+from query_stash.formatting import FormattingRule, FormattingRules
+from query_stash.schema import Schema, get_clean_headers
+from query_stash.timing import span
+from query_stash.types import ConfigDict, Row, RowDict
 
 NULL_CHAR = "∅"
 COMMA_SUBSTRINGS = (
@@ -22,6 +40,24 @@ COMMA_SUBSTRINGS = (
 
 NON_COMMA_SUBSTRINGS = ("tkn", "TKN", "id", "ID")
 
+COMMA_PATTERN = "^(?:{keywords})|_(?:{keywords})$|s$".format(
+    keywords="|".join(COMMA_SUBSTRINGS)
+)
+NON_COMMA_PATTERN = "_(?:{keywords})$".format(keywords="|".join(NON_COMMA_SUBSTRINGS))
+COMMA_REGEX = re.compile(COMMA_PATTERN)
+NON_COMMA_REGEX = re.compile(NON_COMMA_PATTERN)
+
+OVERFLOW_POLICIES = ("truncate", "middle", "hash")
+HIDDEN_COLUMNS_NAMED = 10
+
+# tables smaller than this are formatted in-process even if asked for processes
+PARALLEL_RENDER_MIN_ROWS = 50_000
+PARALLEL_RENDER_CHUNK_ROWS = 20_000
+
+
+class RenderException(Exception):
+    pass
+
 
 def pretty_datetime(d: Optional[datetime]) -> str:
     if d == NULL_CHAR or d is None:
@@ -65,6 +101,143 @@ def pretty_int(amount) -> str:
     return int_str
 
 
+def pretty_percent(fraction) -> str:
+    if fraction == NULL_CHAR:
+        return NULL_CHAR
+    return "{0:,.2f}%".format(fraction * 100)
+
+
+BYTE_UNITS = ("B", "KiB", "MiB", "GiB", "TiB", "PiB")
+
+
+def pretty_bytes(size) -> str:
+    if size == NULL_CHAR:
+        return NULL_CHAR
+    size = float(size)
+    for unit in BYTE_UNITS:
+        if abs(size) < 1024 or unit == BYTE_UNITS[-1]:
+            break
+        size /= 1024
+    if unit == "B":
+        return f"{size:,.0f} B"
+    return f"{size:,.1f} {unit}"
+
+
+def call_null_safe(func: Callable, item):
+    return NULL_CHAR if item == NULL_CHAR else func(item)
+
+
+def null_safe(func: Callable) -> Callable:
+    # a partial of module-level functions pickles, so specs can go to workers
+    return partial(call_null_safe, func)
+
+
+def call_number_safe(func: Callable, item):
+    if type(item) == str:
+        return item if item == NULL_CHAR else "¿?"
+    return func(item)
+
+
+def number_safe(func: Callable) -> Callable:
+    """`func` for number columns that may hold text (which shows as "¿?"); the
+    measure stays `func`, which raises on text so its width comes from str"""
+    return partial(call_number_safe, func)
+
+
+def identity(item):
+    return item
+
+
+class Formatter(NamedTuple):
+    """How a column's values are formatted, and how to measure its width
+
+    `measure` turns a value into the string whose length sizes the column;
+    `width` fixes the width instead.
+    """
+
+    func: Callable
+    measure: Callable = str
+    width: Optional[int] = None
+
+
+FORMATTERS = {
+    "plain": Formatter(identity),
+    "datetime": Formatter(pretty_datetime, width=19),
+    "decimal": Formatter(pretty_generic_decimal),
+    "decimal_no_commas": Formatter(pretty_generic_decimal_no_commas),
+    "int_commas": Formatter(pretty_int, measure=pretty_int),
+    "money": Formatter(null_safe(pretty_money), measure=pretty_money),
+    "percent": Formatter(number_safe(pretty_percent), measure=pretty_percent),
+    "bytes": Formatter(number_safe(pretty_bytes), measure=pretty_bytes),
+}
+
+DEFAULT_FORMATTING_RULES = (
+    FormattingRule("datetime", types=("datetime",)),
+    FormattingRule("decimal_no_commas", NON_COMMA_PATTERN, ("decimal", "float", "int")),
+    FormattingRule("decimal", types=("decimal", "float")),
+    FormattingRule("int_commas", COMMA_PATTERN, ("int",)),
+)
+
+
+@lru_cache(maxsize=None)
+def compile_formatting_rules(rules: tuple) -> FormattingRules:
+    """Compiled once per distinct rule set, so memoized decisions are shared"""
+    return FormattingRules(rules)
+
+
+def get_formatting_rules(config: Optional[ConfigDict] = None) -> FormattingRules:
+    """The config's [[formatting.rules]] followed by the default rules
+
+    [[formatting.rules]]
+    pattern = "_usd$"
+    types = ["number"]
+    formatter = "money"
+    """
+    rules = []
+    config_rules = (config or {}).get("formatting", {}).get("rules", [])
+    for config_rule in config_rules:
+        formatter = config_rule.get("formatter")
+        if formatter not in FORMATTERS:
+            raise ConfigException(
+                f"Unknown formatter {formatter!r} in [[formatting.rules]]; "
+                f"use one of {', '.join(FORMATTERS)}"
+            )
+        pattern = config_rule.get("pattern")
+        if pattern is not None:
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                raise ConfigException(f"Bad formatting rule pattern {pattern!r}: {e}")
+        types = config_rule.get("types", ())
+        if isinstance(types, str):
+            types = [types]
+        if not all(isinstance(type_name, str) for type_name in types):
+            raise ConfigException(
+                f"Formatting rule types should be type names, not {types!r}"
+            )
+        rules.append(FormattingRule(formatter, pattern, tuple(types)))
+    return compile_formatting_rules(tuple(rules) + DEFAULT_FORMATTING_RULES)
+
+
+def fit_to_width(text: str, width: int, overflow: str = "truncate") -> str:
+    """Pad `text` to `width`, shortening it per the overflow policy if too long
+
+    - truncate: keep the start, "Jack Gabriel" -> "Jack Ga…"
+    - middle: keep both ends, "Jack Gabriel" -> "Jack…iel"
+    - hash: spreadsheet-style "########", so a number is never shown cut off
+    """
+    if len(text) <= width:
+        return text.ljust(width)
+    if overflow == "hash":
+        return "#" * width
+    if overflow == "middle" and width >= 3:
+        head = (width - 1) // 2 + (width - 1) % 2
+        tail = width - 1 - head
+        return text[:head] + "…" + text[len(text) - tail :]
+    truncated = text[: width - 1] + "…"
+    return truncated.ljust(width)
+
+
 def is_nan(item):
     try:
         return math.isnan(item)
@@ -76,8 +249,11 @@ class ColumnSpec(NamedTuple):
     """An object that renders all the values for a particular column in a table"""
 
     name: str
-    func: Callable = lambda x: x
+    func: Callable = identity
     width: int = 10
+    overflow: str = "truncate"
+    # where the column's values are in tuple rows (names can repeat)
+    position: Optional[int] = None
 
     def transform(self, item, width: Optional[int] = None) -> str:
         if width is None:
@@ -88,27 +264,15 @@ class ColumnSpec(NamedTuple):
         if type(transformed) != str:
             transformed = str(transformed)
         transformed = transformed.replace("\n", "")  # for arrays, variants/json
-        if len(transformed) <= width:
-            return transformed.ljust(width)
-        else:
-            truncated = transformed[: width - 1] + "…"
-            return truncated.ljust(width)
-
-
-def get_clean_headers(original_headers: List[str]) -> List[str]:
-    cleaned_headers = []
-    for header in original_headers:
-        cleaned_header = header.replace("(*)", "")
-        cleaned_header = re.sub(r"\W", "_", header)
-        cleaned_header = cleaned_header.strip("_")
-        cleaned_headers.append(cleaned_header)
-    return cleaned_headers
+        return fit_to_width(transformed, width, self.overflow)
 
 
 def clean_column_headers_for_rows(old_rows: List[RowDict]) -> List[RowDict]:
     rows = old_rows.copy()
     headers = list(old_rows[0].keys())
     cleaned_headers = get_clean_headers(headers)
+    if cleaned_headers == headers:
+        return rows
     for row in rows:
         for old_header, new_header in zip(headers, cleaned_headers):
             if old_header != new_header:
@@ -117,27 +281,17 @@ def clean_column_headers_for_rows(old_rows: List[RowDict]) -> List[RowDict]:
 
 
 def should_be_formatted_with_commas(column_name: str) -> bool:
-    comma_keywords = "|".join(COMMA_SUBSTRINGS)
-    starts_with_comma_word = bool(re.search("^(" + comma_keywords + ")_?", column_name))
-    ends_with_comma_word = bool(re.search("_(" + comma_keywords + ")$", column_name))
-    ends_with_s = bool(re.search(r"s$", column_name))
-    return starts_with_comma_word or ends_with_comma_word or ends_with_s
+    return COMMA_REGEX.search(column_name) is not None
 
 
 def should_not_be_formatted_with_commas(column_name: str) -> bool:
-    non_comma_keywords = "|".join(NON_COMMA_SUBSTRINGS)
-    ends_with_comma_word = bool(
-        re.search("_(" + non_comma_keywords + ")$", column_name)
-    )
-    return ends_with_comma_word
+    return NON_COMMA_REGEX.search(column_name) is not None
 
 
-def get_max_width_of_items(items, with_commas=False) -> int:
+def get_max_width_of_items(items, with_commas=False, string_function=None) -> int:
     max_width = 0
-    if with_commas:
-        string_function = pretty_int
-    else:
-        string_function = str
+    if string_function is None:
+        string_function = pretty_int if with_commas else str
     for item in items:
         try:
             item_length = len(string_function(item))
@@ -166,14 +320,19 @@ class RenderedTable(NamedTuple):
         | 2    | Layla    |
         | 3    | Jack Ga… |
         | ---- | -------- |
+
+    With a `schema`, rows are tuples of values in the schema's column order.
     """
 
     column_specs: Sequence[ColumnSpec]
-    rows: List[RowDict]
+    rows: List[RowDict] | List[Row]
+    hidden_columns: Sequence[str] = ()
+    schema: Optional[Schema] = None
+    processes: int = 1
 
     @property
     def headers(self):
-        return self.rows[0].keys()
+        return [col_spec.name for col_spec in self.column_specs]
 
     def _join_items_to_pipes(self, items: List[str]) -> str:
         inner_cols = " | ".join(i for i in items)
@@ -199,22 +358,58 @@ class RenderedTable(NamedTuple):
             break_line_items.append(col_break_line)
         return self._join_items_to_pipes(break_line_items)
 
-    def make_printable_row(self, row: RowDict) -> str:
+    @property
+    def cell_keys(self) -> list:
+        """Where each column's value is in a row: its name, or position with a schema"""
+        return get_cell_keys(self.column_specs, self.schema)
+
+    def make_printable_row(self, row: RowDict | Row, cell_keys=None) -> str:
+        if cell_keys is None:
+            cell_keys = self.cell_keys
         row_items = []
-        for col_spec, item in zip(self.column_specs, row.values()):
-            row_items.append(col_spec.transform(item))
+        for col_spec, key in zip(self.column_specs, cell_keys):
+            row_items.append(col_spec.transform(row[key]))
         return self._join_items_to_pipes(row_items)
 
+    def iter_printable_rows(self) -> Iterator[str]:
+        """Printable rows as they're formatted (in chunks of several lines when
+        formatted in parallel)"""
+        cell_keys = self.cell_keys
+        if self.processes > 1 and len(self.rows) >= PARALLEL_RENDER_MIN_ROWS:
+            yield from iter_printable_chunks_in_parallel(
+                self.column_specs, cell_keys, self.rows, self.processes
+            )
+        else:
+            for row in self.rows:
+                yield self.make_printable_row(row, cell_keys)
+
     @property
     def printable_rows(self) -> str:
-        return "\n".join(self.make_printable_row(row) for row in self.rows)
+        return "\n".join(self.iter_printable_rows())
+
+    @property
+    def hidden_columns_note(self) -> str:
+        """A line naming the columns that didn't fit (empty if they all did)"""
+        if not self.hidden_columns:
+            return ""
+        names = ", ".join(self.hidden_columns[:HIDDEN_COLUMNS_NAMED])
+        if len(self.hidden_columns) > HIDDEN_COLUMNS_NAMED:
+            names += ", …"
+        count = len(self.hidden_columns)
+        return f"… {count} more columns (see them with query-stash view): {names}"
+
+    def iter_lines(self) -> Iterator[str]:
+        """The table's text a line (or chunk of lines) at a time, so it can be
+        written out while the rest is still being formatted"""
+        yield self.header_row
+        yield self.break_line
+        yield from self.iter_printable_rows()
+        yield self.break_line
+        if self.hidden_columns:
+            yield self.hidden_columns_note
 
     def __str__(self):
-        return f"""\
-{self.header_row}
-{self.break_line}
-{self.printable_rows}
-{self.break_line}"""
+        return "\n".join(self.iter_lines())
 
     def __getitem__(self, position):
         return self.rows[position]
@@ -240,10 +435,13 @@ class RenderedPivotedTable(NamedTuple):
     """
 
     column_specs: Sequence[ColumnSpec]
-    rows: List[RowDict]
+    rows: List[RowDict] | List[Row]
+    schema: Optional[Schema] = None
 
     @property
     def keys(self):
+        if self.schema is not None:
+            return list(self.schema.names)
         return list(self.rows[0].keys())
 
     @property
@@ -252,6 +450,8 @@ class RenderedPivotedTable(NamedTuple):
 
     @property
     def values(self):
+        if self.schema is not None:
+            return list(self.rows[0])
         return list(self.rows[0].values())
 
     @property
@@ -271,7 +471,8 @@ class RenderedPivotedTable(NamedTuple):
     def make_printable_row(self, col_spec: ColumnSpec) -> str:
         row = self.rows[0]
         key = col_spec.name.ljust(self.key_column_width).lower()
-        value = col_spec.transform(row[col_spec.name], width=self.values_column_width)
+        (cell_key,) = get_cell_keys([col_spec], self.schema)
+        value = col_spec.transform(row[cell_key], width=self.values_column_width)
         return self._join_items_to_pipes([key, value])
 
     @property
@@ -280,6 +481,9 @@ class RenderedPivotedTable(NamedTuple):
             self.make_printable_row(col_spec) for col_spec in self.column_specs
         )
 
+    def iter_lines(self) -> Iterator[str]:
+        yield str(self)
+
     def __str__(self):
         return f"""\
 {self.break_line}
@@ -293,8 +497,81 @@ class RenderedPivotedTable(NamedTuple):
         return len(self.rows)
 
 
-def guess_column_type(rows: List[RowDict], column_name: str):
-    """Hack because pandas (for duckdb connector) mixes float and str types"""
+_worker_column_specs: Sequence[ColumnSpec] = ()
+
+
+def init_render_worker(column_specs: Sequence[ColumnSpec]):
+    global _worker_column_specs
+    _worker_column_specs = column_specs
+
+
+def format_column_chunk(columns: List[List]) -> str:
+    """Printable rows from a chunk of column values (in a render worker)"""
+    formatted = [
+        [spec.transform(item) for item in column]
+        for spec, column in zip(_worker_column_specs, columns)
+    ]
+    return "\n".join(f"| {' | '.join(items)} |" for items in zip(*formatted))
+
+
+def iter_column_chunks(
+    rows: List[RowDict] | List[Row], cell_keys: list, chunk_size: int
+) -> Iterator[List[List]]:
+    """Rows as chunks of column value lists, holding only the shown columns"""
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start : start + chunk_size]
+        yield [[row[key] for row in chunk] for key in cell_keys]
+
+
+def iter_printable_chunks_in_parallel(
+    column_specs: Sequence[ColumnSpec],
+    cell_keys: list,
+    rows: List[RowDict] | List[Row],
+    processes: int,
+    chunk_size: int = PARALLEL_RENDER_CHUNK_ROWS,
+) -> Iterator[str]:
+    """Printable rows, a chunk at a time and in order, formatted by a pool of
+    `processes` workers
+
+    Workers get the column specs once, when they start, then chunks of column
+    values.  Only a couple of chunks per worker are in flight at a time.
+    """
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        initializer=init_render_worker,
+        initargs=(list(column_specs),),
+    ) as pool:
+        pending: deque = deque()
+        for columns in iter_column_chunks(rows, cell_keys, chunk_size):
+            pending.append(pool.submit(format_column_chunk, columns))
+            if len(pending) >= 2 * processes:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def get_render_processes(processes: Optional[int]) -> int:
+    """Processes to format rows with: 0 (or None) means one per CPU"""
+    if not processes:
+        return os.cpu_count() or 1
+    return processes
+
+
+def get_cell_keys(column_specs: Iterable[ColumnSpec], schema: Optional[Schema]) -> list:
+    """Index rows by column name (dict rows), or by position (tuple rows)"""
+    if schema is None:
+        return [spec.name for spec in column_specs]
+    return [
+        schema.position(spec.name) if spec.position is None else spec.position
+        for spec in column_specs
+    ]
+
+
+def guess_column_type(rows: List[RowDict] | List[Row], column_name: str | int):
+    """Hack because pandas (for duckdb connector) mixes float and str types
+
+    `column_name` is a position for tuple rows.
+    """
     first_row_type = type(rows[0][column_name])
     last_row_type = type(rows[-1][column_name])
     if str in (first_row_type, last_row_type):
@@ -303,52 +580,190 @@ def guess_column_type(rows: List[RowDict], column_name: str):
         return first_row_type
 
 
-def get_rendered_table(rows: List[RowDict]) -> RenderedTable:
+def sample_rows(rows: List[RowDict], sample_size: int, seed: int = 0) -> List[RowDict]:
+    """A fixed-size random sample of rows (always keeping the first and last)"""
+    if len(rows) <= sample_size:
+        return rows
+    rng = random.Random(seed)
+    middle_indexes = rng.sample(range(1, len(rows) - 1), max(sample_size - 2, 0))
+    return [rows[0]] + [rows[i] for i in sorted(middle_indexes)] + [rows[-1]]
+
+
+def select_columns(
+    column_names: List[str], columns: Optional[Sequence[str]] = None
+) -> List[int]:
+    """The positions of the result columns to show, in order: all of them, or
+    the `columns` asked for
+
+    Requested columns match result columns case-insensitively, before or after
+    header cleaning (so `count(*)` and `count` both work); a repeated name
+    picks its first column.
+    """
+    if columns is None:
+        return list(range(len(column_names)))
+    by_name: Dict[str, int] = {}
+    for position, name in enumerate(column_names):
+        by_name.setdefault(name.lower(), position)
+    selected = []
+    for column in columns:
+        for candidate in (column, *get_clean_headers([column])):
+            if candidate.lower() in by_name:
+                selected.append(by_name[candidate.lower()])
+                break
+        else:
+            raise RenderException(
+                f"Unknown column {column!r}; columns are: {', '.join(column_names)}"
+            )
+    return selected
+
+
+def fit_column_specs(
+    specs: Iterable[ColumnSpec], column_names: List[str], max_table_width: int
+) -> tuple[List[ColumnSpec], List[str]]:
+    """The leading column specs that fit in `max_table_width`, and the hidden names
+
+    `specs` is consumed lazily, so columns past the edge are never sized.
+    """
+    fitted: List[ColumnSpec] = []
+    used = 1  # the leading "|"
+    for spec in specs:
+        if not fitted and spec.width + 4 > max_table_width:
+            spec = spec._replace(width=max(max_table_width - 4, 1))
+        if fitted and used + spec.width + 3 > max_table_width:
+            break
+        fitted.append(spec)
+        used += spec.width + 3
+    return fitted, column_names[len(fitted) :]
+
+
+def get_rendered_table(
+    rows: List[RowDict] | List[Row],
+    width_sample_size: Optional[int] = None,
+    max_width: Optional[int] = None,
+    overflow: str = "truncate",
+    columns: Optional[Sequence[str]] = None,
+    max_table_width: Optional[int] = None,
+    formatting_rules: Optional[FormattingRules] = None,
+    schema: Optional[Schema] = None,
+    processes: int = 1,
+) -> RenderedTable:
     """Get a RenderedTable with standard ColumnSpecs
     - comma-formatted integer columns
     - cleanly-formatted datetimes
+
+    Column widths fit every value, unless `width_sample_size` is given, in which
+    case they're estimated from a random sample of that many rows so setup cost
+    doesn't grow with the row count.  Widths are capped at `max_width`, and
+    values that don't fit are shortened per the `overflow` policy (see
+    `fit_to_width`).
+
+    Only `columns` are shown if given.  With `max_table_width` (e.g. the
+    terminal width) columns are taken in order until the table is full; the
+    rest are never sized or formatted, just named under the table.
+
+    Rows are dicts, or tuples in the order of `schema`'s (already clean)
+    column names, which skips cleaning the headers of every row.
+
+    With `processes` > 1, big tables are formatted by a pool of that many
+    processes (0 means one per CPU).
     """
-    rows = clean_column_headers_for_rows(rows)
-    col_specs = []
-    column_names = rows[0].keys()
-    for column_name in column_names:
-        column_type = guess_column_type(rows, column_name)
-        values = [r[column_name] for r in rows if r[column_name] is not None]
-        if column_type == datetime:
-            spec = ColumnSpec(column_name, width=19, func=pretty_datetime)
-        elif column_type in (
-            Decimal,
-            float,
-            int,
-        ) and should_not_be_formatted_with_commas(column_name):
-            spec = ColumnSpec(
-                column_name,
-                width=get_max_width_of_items([column_name] + values),
-                func=pretty_generic_decimal_no_commas,
+    if schema is None:
+        with span("render.clean_headers"):
+            rows = clean_column_headers_for_rows(rows)
+        result_column_names = list(rows[0].keys())
+    else:
+        result_column_names = list(schema.names)
+    with span("render.column_specs"):
+        positions = select_columns(result_column_names, columns)
+        column_names = [result_column_names[position] for position in positions]
+        sized_rows = rows
+        if width_sample_size is not None:
+            sized_rows = sample_rows(rows, width_sample_size)
+        specs = (
+            spec._replace(
+                width=spec.width if max_width is None else min(spec.width, max_width),
+                overflow=overflow,
             )
-        elif column_type in (Decimal, float):
-            spec = ColumnSpec(
-                column_name,
-                width=get_max_width_of_items([column_name] + values),
-                func=pretty_generic_decimal,
+            for spec in iter_column_specs(
+                sized_rows,
+                column_names,
+                formatting_rules,
+                schema,
+                positions,
             )
-        elif column_type == int and should_be_formatted_with_commas(column_name):
-            spec = ColumnSpec(
-                column_name,
-                width=get_max_width_of_items([column_name] + values, with_commas=True),
-                func=pretty_int,
+        )
+        hidden_columns: List[str] = []
+        if max_table_width is None or len(rows) == 1:
+            col_specs = list(specs)
+        else:
+            col_specs, hidden_columns = fit_column_specs(
+                specs, column_names, max_table_width
             )
+    if len(rows) == 1:
+        return RenderedPivotedTable(column_specs=col_specs, rows=rows, schema=schema)
+    else:
+        return RenderedTable(
+            column_specs=col_specs,
+            rows=rows,
+            hidden_columns=hidden_columns,
+            schema=schema,
+            processes=get_render_processes(processes),
+        )
+
+
+def get_column_specs(
+    rows: List[RowDict] | List[Row],
+    column_names: Optional[List[str]] = None,
+    formatting_rules: Optional[FormattingRules] = None,
+    schema: Optional[Schema] = None,
+    positions: Optional[Sequence[int]] = None,
+) -> List[ColumnSpec]:
+    return list(
+        iter_column_specs(rows, column_names, formatting_rules, schema, positions)
+    )
 
-        elif column_type == int:
-            spec = ColumnSpec(
-                column_name, width=get_max_width_of_items([column_name] + values)
+
+def iter_column_specs(
+    rows: List[RowDict] | List[Row],
+    column_names: Optional[List[str]] = None,
+    formatting_rules: Optional[FormattingRules] = None,
+    schema: Optional[Schema] = None,
+    positions: Optional[Sequence[int]] = None,
+) -> Iterator[ColumnSpec]:
+    """A ColumnSpec for each column, sized and typed from `rows`, one at a time
+
+    The formatter comes from `formatting_rules` (by default: datetimes, comma
+    ints for count/sum/total-ish names, plain `_id` numbers, 8-place decimals).
+    Tuple rows (with a `schema`) are read at `positions`, one per column name,
+    so columns sharing a name keep their own values; by default every column.
+    """
+    if column_names is None:
+        column_names = list(rows[0].keys()) if schema is None else list(schema.names)
+    if formatting_rules is None:
+        formatting_rules = get_formatting_rules()
+    keys: Sequence[Any] = column_names
+    if schema is not None:
+        if positions is None:
+            positions = (
+                range(len(schema.names))
+                if column_names == list(schema.names)
+                else [schema.position(name) for name in column_names]
             )
+        keys = positions
+    for column_name, key in zip(column_names, keys):
+        column_type = guess_column_type(rows, key)
+        formatter_name = formatting_rules.get_formatter_name(column_name, column_type)
+        formatter = FORMATTERS[formatter_name]
+        if formatter.width is not None:
+            width = formatter.width
         else:
-            spec = ColumnSpec(
-                column_name, width=get_max_width_of_items([column_name] + values)
+            values = [r[key] for r in rows if r[key] is not None]
+            width = get_max_width_of_items(
+                [column_name] + values, string_function=formatter.measure
             )
-        col_specs.append(spec)
-    if len(rows) == 1:
-        return RenderedPivotedTable(column_specs=col_specs, rows=rows)
-    else:
-        return RenderedTable(column_specs=col_specs, rows=rows)
+        yield ColumnSpec(
+            column_name,
+            width=width,
+            func=formatter.func,
+            position=None if schema is None else key,
+        )
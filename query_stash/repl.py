@@ -0,0 +1,226 @@
+"""An interactive prompt that keeps one connection and the stash open
+
+    query-stash repl --connection-name dbt-postgres
+
+Config, connection and stash are set up once, so each query only pays for
+running and rendering it; tables are printed as they're formatted.  Statements
+end with `;` (or a blank line).  The latest queries run on the connection are
+in the line history (↑/↓, Ctrl-R), and Tab completes names from stashed queries
+and result columns.  Commands:
+
+    \\search TEXT    stashed queries mentioning TEXT
+    \\recall ID      put stashed query ID on the prompt to edit and re-run
+    \\view [ID]      page through a stashed result (the latest by default)
+    \\q              quit (or Ctrl-D)
+"""
+
+import re
+import sys
+from typing import Callable, List, Optional, TextIO
+
+from query_stash.connectors.connector import format_error
+from query_stash.pager import run_pager
+from query_stash.query_stash import search_stash
+from query_stash.session import Session
+from query_stash.timing import record_timings
+
+HISTORY_SIZE = 500
+COMPLETION_LIMIT = 50
+CONTINUATION_PROMPT = "...> "
+WORD_PATTERN = re.compile(r"[A-Za-z_][\w$]*(?:\.[A-Za-z_][\w$]*)*")
+# readline splits words on these, so `schema.table` completes as one word
+COMPLETER_DELIMITERS = " \t\n\"'`()[],;=<>+-*/|"
+
+
+def get_statement(lines: List[str]) -> Optional[str]:
+    """The statement typed so far, once it's finished (None until then)"""
+    if not lines:
+        return None
+    if lines[-1].strip() and not lines[-1].rstrip().endswith(";"):
+        return None
+    statement = "\n".join(lines).strip()
+    return statement.rstrip(";").rstrip() if statement else None
+
+
+class StashCompleter:
+    """Completes words from the stashed queries and result columns that
+    contain them, looked up in the stash's search index"""
+
+    def __init__(self, session: Session):
+        self.session = session
+        self.text: Optional[str] = None
+        self.candidates: List[str] = []
+
+    def get_candidates(self, text: str) -> List[str]:
+        prefix = text.lower()
+        words = set(
+            self.session.stasher.get_result_column_names(text, COMPLETION_LIMIT)
+        )
+        for found in self.session.stasher.search_queries(text, COMPLETION_LIMIT):
+            words.update(
+                word
+                for word in WORD_PATTERN.findall(found[3])
+                if word.lower().startswith(prefix)
+            )
+        return sorted(words, key=str.lower)
+
+    def complete(self, text: str, state: int) -> Optional[str]:
+        """readline's completer: the `state`th candidate for `text`"""
+        if not text:
+            return None
+        if text != self.text:
+            self.text = text
+            try:
+                self.candidates = self.get_candidates(text)
+            except Exception:
+                self.candidates = []
+        if state < len(self.candidates):
+            return self.candidates[state]
+        return None
+
+
+class Repl:
+    def __init__(
+        self,
+        session: Session,
+        connection_name: Optional[str] = None,
+        read_line: Callable[[str], str] = input,
+        output: TextIO = sys.stdout,
+        **render_options,
+    ):
+        self.session = session
+        self.connector = session.get_connector(connection_name)
+        self.read_line = read_line
+        self.output = output
+        self.render_options = render_options
+        self.readline = None
+
+    @property
+    def prompt(self) -> str:
+        return f"{self.connector.connection_name}> "
+
+    def write(self, text: str):
+        self.output.write(text + "\n")
+
+    def setup_readline(self):
+        """History from the stash, and completion, if readline is available"""
+        try:
+            import readline
+        except ImportError:
+            return
+        self.readline = readline
+        readline.clear_history()
+        recent = self.session.stasher.get_recent_queries(
+            self.connector.connection_name, HISTORY_SIZE
+        )
+        for query_text in reversed(recent):
+            readline.add_history(" ".join(query_text.split()))
+        readline.set_completer(StashCompleter(self.session).complete)
+        readline.set_completer_delims(COMPLETER_DELIMITERS)
+        readline.parse_and_bind("tab: complete")
+
+    def read_statement(self) -> Optional[str]:
+        """The next statement or command (None at end of input)"""
+        lines: List[str] = []
+        while True:
+            try:
+                line = self.read_line(CONTINUATION_PROMPT if lines else self.prompt)
+            except EOFError:
+                return None
+            except KeyboardInterrupt:
+                self.write("")
+                lines = []
+                continue
+            if not lines and line.strip().startswith("\\"):
+                return line.strip()
+            lines.append(line)
+            statement = get_statement(lines)
+            if statement is not None:
+                return statement
+            if not line.strip():
+                lines = []
+
+    def run(self):
+        self.setup_readline()
+        while True:
+            statement = self.read_statement()
+            if statement is None or statement in ("\\q", "\\quit"):
+                return
+            if statement.startswith("\\"):
+                self.run_command(statement)
+            else:
+                self.run_query(statement)
+
+    def run_query(self, query: str):
+        try:
+            with record_timings() as timings:
+                self.session.query(
+                    query,
+                    self.connector.connection_name,
+                    timings=timings,
+                    output=self.output,
+                    **self.render_options,
+                )
+        except KeyboardInterrupt:
+            self.write("Cancelled")
+            self.connector.rollback()
+            return
+        except Exception as e:
+            self.write(format_error(e))
+            self.connector.rollback()
+            return
+        self.write(f"({timings.total_seconds:.3f}s)")
+
+    def run_command(self, line: str):
+        command, _, argument = line.partition(" ")
+        argument = argument.strip()
+        if command == "\\search" and argument:
+            self.search(argument)
+        elif command == "\\recall" and argument.isdigit():
+            self.recall(int(argument))
+        elif command == "\\view" and (argument.isdigit() or not argument):
+            self.view(int(argument) if argument else None)
+        else:
+            self.write(__doc__.split("Commands:\n\n")[1].rstrip())
+
+    def search(self, text: str):
+        self.write(search_stash(text, stasher=self.session.stasher))
+
+    def recall(self, query_id: int):
+        found = self.session.stasher.get_query_text(query_id)
+        if found is None:
+            self.write(f"No stashed query {query_id}")
+            return
+        query_text = " ".join(found[0].split())
+        if self.readline is None:
+            self.write(query_text)
+            return
+        # pre-fill the next prompt with the query, to edit before running it
+        self.readline.set_startup_hook(
+            lambda: self.readline.insert_text(query_text + ";")
+        )
+        try:
+            statement = self.read_statement()
+        finally:
+            self.readline.set_startup_hook(None)
+        if statement is not None and not statement.startswith("\\"):
+            self.run_query(statement)
+
+    def view(self, query_id: Optional[int] = None):
+        stasher = self.session.stasher
+        if query_id is None:
+            query_id = stasher.get_latest_result_query_id()
+        if query_id is None or not stasher.get_result_columns(query_id):
+            self.write("No stashed results to view")
+            return
+        run_pager(stasher, query_id)
+
+
+def run_repl(
+    config_path: Optional[str] = None,
+    connection_name: Optional[str] = None,
+    confirm_over_limit: Optional[Callable[[str], bool]] = None,
+    **render_options,
+):
+    with Session(config_path, confirm_over_limit=confirm_over_limit) as session:
+        Repl(session, connection_name, **render_options).run()
@@ -0,0 +1,43 @@
+"""A result's column names and types, kept once instead of in every row"""
+
+import re
+from typing import Any, List, NamedTuple, Optional, Sequence, Tuple
+
+from query_stash.types import RowDict
+
+
+def get_clean_headers(original_headers: List[str]) -> List[str]:
+    cleaned_headers = []
+    for header in original_headers:
+        cleaned_header = header.replace("(*)", "")
+        cleaned_header = re.sub(r"\W", "_", header)
+        cleaned_header = cleaned_header.strip("_")
+        cleaned_headers.append(cleaned_header)
+    return cleaned_headers
+
+
+class Schema(NamedTuple):
+    """Column names (already cleaned) and the cursor's type codes
+
+    Goes with rows that are plain tuples (or lists) of values in column order.
+    """
+
+    names: Tuple[str, ...]
+    type_codes: Tuple[Any, ...] = ()
+
+    @classmethod
+    def from_description(cls, description: Optional[Sequence[Sequence[Any]]]):
+        """From a DB-API `cursor.description`, cleaning the names just once"""
+        description = description or ()
+        names = get_clean_headers([column[0] for column in description])
+        return cls(tuple(names), tuple(column[1] for column in description))
+
+    @classmethod
+    def from_rows(cls, rows: List[RowDict]):
+        return cls(tuple(rows[0].keys()))
+
+    def position(self, name: str) -> int:
+        return self.names.index(name)
+
+    def to_dicts(self, rows: Sequence[Sequence[Any]]) -> List[RowDict]:
+        return [dict(zip(self.names, row)) for row in rows]
@@ -0,0 +1,447 @@
+"""A long-lived query-stash session for notebooks, services and scripts
+
+    with Session() as session:
+        print(session.query("select * from orders", "dbt-postgres"))
+        err, schema, rows = session.get_rows("select 1", "dbt-postgres")
+
+The config is parsed once, each connection is opened the first time it's used
+and then reused, and the stash keeps one SQLite connection open, so issuing
+many queries doesn't pay setup costs each time.
+"""
+
+import time
+from itertools import islice
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, TextIO
+
+from query_stash.config import choose_connection_name, load_config
+from query_stash.connectors import Connector
+from query_stash.connectors.connector import format_error
+from query_stash.export import (
+    ARROW_FORMATS,
+    STDOUT_PATH,
+    close_text_output,
+    get_batch_writer,
+    open_text_output,
+    write_batches,
+)
+from query_stash.formatting import FormattingRules
+from query_stash.params import describe_params
+from query_stash.render import RenderException, get_formatting_rules, get_rendered_table
+from query_stash.schema import Schema
+from query_stash.sqlite import (
+    SQLITE_DB_PATH,
+    QueryStasher,
+    SubmittedQuery,
+    get_result_row_settings,
+    get_search_index_settings,
+)
+from query_stash.timing import Timings, record_timings, span
+from query_stash.types import Params, Row
+
+# polling submitted queries starts quick and backs off for long-running ones
+FIRST_POLL_SECONDS = 0.25
+MAX_POLL_SECONDS = 5.0
+# a paged result's stashed text is just its first lines; the pager reads rows
+PAGED_EXCERPT_LINES = 50
+
+
+class StashedTable(NamedTuple):
+    """A rendered table (or message), and its stash id if it was stashed"""
+
+    text: str
+    query_id: Optional[int] = None
+
+
+def write_message(message: str, output: Optional[TextIO] = None) -> str:
+    if output is not None:
+        output.write(message + "\n")
+    return message
+
+
+def render_and_stash(
+    query: str,
+    schema: Schema,
+    results: List[Row],
+    connection_name: str,
+    connection_type: str,
+    timings: Timings,
+    formatting_rules: FormattingRules,
+    backend_query_id: Optional[str] = None,
+    stasher: Optional[QueryStasher] = None,
+    output: Optional[TextIO] = None,
+    pager: bool = False,
+    **render_options,
+) -> StashedTable:
+    """Render a query's rows as a table and stash them (see `get_rendered_table`
+    for the render options)
+
+    With `output`, the table (or message) is also written to it, line by line
+    as it's formatted, so the first rows show before the last are done.  With
+    `pager`, only the table's first lines are formatted and stashed as its
+    text, and every row is stashed whatever the stash's limits, for the pager
+    to read.
+    """
+    if len(results) == 0:
+        return StashedTable(write_message("Query returned no results!", output))
+    try:
+        with span("render"):
+            rendered_table = get_rendered_table(
+                results,
+                formatting_rules=formatting_rules,
+                schema=schema,
+                **render_options,
+            )
+    except RenderException as e:
+        return StashedTable(write_message(str(e), output))
+    with span("format"):
+        if pager:
+            table_text = "\n".join(
+                islice(rendered_table.iter_lines(), PAGED_EXCERPT_LINES)
+            )
+        elif output is None:
+            table_text = str(rendered_table)
+        else:
+            lines = []
+            for line in rendered_table.iter_lines():
+                output.write(line + "\n")
+                lines.append(line)
+            output.flush()
+            table_text = "\n".join(lines)
+    stasher = stasher or QueryStasher()
+    tags = ""
+    query_id = stasher.stash(
+        query,
+        table_text,
+        tags,
+        connection_name,
+        connection_type,
+        timings=timings,
+        row_count=len(results),
+        backend_query_id=backend_query_id,
+        rows=rendered_table.rows,
+        schema=rendered_table.schema,
+        keep_all_rows=pager,
+    )
+    return StashedTable(table_text, query_id)
+
+
+class Session:
+    def __init__(
+        self,
+        config_path: Optional[str] = None,
+        sqlite_db_path: str = SQLITE_DB_PATH,
+        confirm_over_limit: Optional[Callable[[str], bool]] = None,
+    ):
+        with span("config"):
+            self.loaded_config = load_config(config_path)
+            self.formatting_rules = get_formatting_rules(self.loaded_config.config)
+        self.config_path = config_path
+        self.stasher = QueryStasher(
+            sqlite_db_path,
+            get_search_index_settings(self.loaded_config.config),
+            keep_connection=True,
+            result_row_settings=get_result_row_settings(self.loaded_config.config),
+        )
+        self.confirm_over_limit = confirm_over_limit
+        self.connectors: Dict[str, Connector] = {}
+        # the stash id of the last table `query` or `query_each` stashed
+        self.last_stash_id: Optional[int] = None
+
+    @property
+    def config(self):
+        return self.loaded_config.config
+
+    def get_connector(self, connection_name: Optional[str] = None) -> Connector:
+        """The connector for a connection, connecting the first time it's used"""
+        connection_name = choose_connection_name(
+            list(self.loaded_config.connections), connection_name
+        )
+        if connection_name not in self.connectors:
+            self.connectors[connection_name] = Connector(
+                self.config_path,
+                connection_name,
+                self.loaded_config,
+                self.confirm_over_limit,
+            )
+        return self.connectors[connection_name]
+
+    def get_rows(
+        self, query: str, connection_name: Optional[str] = None
+    ) -> tuple[str | None, Schema, List[Row]]:
+        """Run a query without rendering or stashing it (see `Connector.get_rows`)"""
+        connector = self.get_connector(connection_name)
+        with connector.transaction():
+            return connector.get_rows(query)
+
+    def query(
+        self,
+        query: str,
+        connection_name: Optional[str] = None,
+        timings: Optional[Timings] = None,
+        output: Optional[TextIO] = None,
+        pager: bool = False,
+        **render_options,
+    ) -> str:
+        """Run a query, stash it and return its rendered table (or the error)
+
+        `render_options` are passed on to `get_rendered_table`; with `output`
+        the table (or error) is also written to it as it's formatted, and with
+        `pager` only its first lines are (see `render_and_stash`).  The table's stash id is kept in `last_stash_id`
+        (None if nothing was stashed).
+        """
+        self.last_stash_id = None
+        with record_timings(timings) as timings:
+            connector = self.get_connector(connection_name)
+            with connector.transaction():
+                err, schema, results = connector.get_rows(query)
+            if err is not None:
+                return write_message(err, output)
+            stashed = render_and_stash(
+                query,
+                schema,
+                results,
+                connector.connection_name,
+                connector.connection_type,
+                timings,
+                self.formatting_rules,
+                backend_query_id=connector.last_query_id,
+                stasher=self.stasher,
+                output=output,
+                pager=pager,
+                **render_options,
+            )
+            self.last_stash_id = stashed.query_id
+            return stashed.text
+
+    def query_each(
+        self,
+        query: str,
+        param_sets: List[Params],
+        connection_name: Optional[str] = None,
+        timings: Optional[Timings] = None,
+        output: Optional[TextIO] = None,
+        **render_options,
+    ) -> str:
+        """Run a query with `:name` parameters once per parameter set, on one
+        prepared statement, and return each run's table (or error)
+
+        Each run is stashed with its parameters in a comment above the query,
+        and they're all stashed in one transaction.  An error (the driver's
+        too) ends the batch, but the runs before it stay stashed.
+        `last_stash_id` is left at the last run stashed.
+        """
+        self.last_stash_id = None
+        with record_timings(timings) as timings:
+            connector = self.get_connector(connection_name)
+            with span("prepare"):
+                prepared = connector.prepare(query)
+            texts = []
+            with connector.transaction(), prepared, self.stasher.transaction():
+                for params in param_sets:
+                    header = write_message(describe_params(params), output)
+                    with record_timings() as run_timings:
+                        try:
+                            err, schema, results = prepared.get_rows(params)
+                        except Exception as e:
+                            # report it like any other error, keeping the
+                            # runs already stashed
+                            connector.rollback()
+                            err = format_error(e)
+                        if err is None:
+                            stashed = render_and_stash(
+                                f"{header}\n{query}",
+                                schema,
+                                results,
+                                connector.connection_name,
+                                connector.connection_type,
+                                run_timings,
+                                self.formatting_rules,
+                                backend_query_id=connector.last_query_id,
+                                stasher=self.stasher,
+                                output=output,
+                                **render_options,
+                            )
+                    timings.spans.extend(run_timings.spans)
+                    if err is not None:
+                        texts.append(f"{header}\n{write_message(err, output)}")
+                        break
+                    if stashed.query_id is not None:
+                        self.last_stash_id = stashed.query_id
+                    texts.append(f"{header}\n{stashed.text}")
+            return "\n\n".join(texts)
+
+    def execute_many(
+        self,
+        query: str,
+        param_sets: List[Params],
+        connection_name: Optional[str] = None,
+        timings: Optional[Timings] = None,
+    ) -> str:
+        """Run a statement that returns no rows (an INSERT, say) with every
+        parameter set in one batch on one prepared statement, committed
+        together (see `PreparedQuery.execute_many`)"""
+        with record_timings(timings) as timings:
+            connector = self.get_connector(connection_name)
+            with span("prepare"):
+                prepared = connector.prepare(query)
+            with prepared:
+                err, row_count = prepared.execute_many(param_sets)
+            if err is not None:
+                return err
+            summary = f"Ran for {len(param_sets):,} parameter sets"
+            if row_count is not None:
+                summary += f" ({row_count:,} rows affected)"
+            self.stasher.stash(
+                f"-- {len(param_sets):,} parameter sets\n{query}",
+                summary,
+                "",
+                connector.connection_name,
+                connector.connection_type,
+                timings=timings,
+                row_count=row_count,
+            )
+            return summary
+
+    def export(
+        self,
+        query: str,
+        export_format: str,
+        output_path: Optional[str] = None,
+        connection_name: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        timings: Optional[Timings] = None,
+    ) -> str:
+        """Stream a query's results into a file without rendering them
+
+        The stash records the query and a one-line summary of the export rather
+        than the (possibly huge) results.  CSV exports from Postgres are written
+        by the server itself, with COPY.
+        """
+        with record_timings(timings) as timings:
+            connector = self.get_connector(connection_name)
+            output_path = output_path or STDOUT_PATH
+            with connector.transaction():
+                err, row_count = self._export(
+                    connector, query, export_format, output_path, batch_size
+                )
+            if err is not None:
+                return err
+            summary = f"Exported {row_count:,} rows to {output_path} ({export_format})"
+            self.stasher.stash(
+                query,
+                summary,
+                "",
+                connector.connection_name,
+                connector.connection_type,
+                timings=timings,
+                row_count=row_count,
+                backend_query_id=connector.last_query_id,
+            )
+            return summary
+
+    def _export(
+        self,
+        connector: Connector,
+        query: str,
+        export_format: str,
+        output_path: str,
+        batch_size: Optional[int],
+    ) -> tuple[str | None, int]:
+        if export_format == "csv" and connector.uses_postgres_copy:
+            output_file = open_text_output(output_path)
+            try:
+                return connector.copy_results_to_csv(query, output_file)
+            finally:
+                close_text_output(output_file)
+        arrow = export_format in ARROW_FORMATS and connector.supports_arrow_batches
+        err, column_names, batches = connector.stream_results(
+            query, batch_size=batch_size, arrow=arrow
+        )
+        if err is not None:
+            return err, 0
+        writer = get_batch_writer(export_format, output_path, column_names)
+        return None, write_batches(writer, batches)
+
+    def submit(self, query: str, connection_name: Optional[str] = None) -> str:
+        """Start a query on Snowflake without waiting for it, returning its
+        query id (or the error)
+
+        The query is recorded in the stash until `collect` fetches its results,
+        so they can be collected by a later session.
+        """
+        connector = self.get_connector(connection_name)
+        err, backend_query_id = connector.submit_query(query)
+        if err is not None:
+            return err
+        self.stasher.add_submitted_query(
+            backend_query_id, query, connector.connection_name
+        )
+        return backend_query_id
+
+    def collect(
+        self, wait: bool = True, **render_options
+    ) -> Iterator[tuple[SubmittedQuery, str]]:
+        """Each submitted query's rendered table (or error) as it finishes
+
+        Queries still running are polled, less often the longer they run;
+        without `wait` only those already finished are collected.
+        """
+        pending = self.stasher.get_pending_submitted_queries()
+        poll_seconds = FIRST_POLL_SECONDS
+        while pending:
+            running = []
+            for submitted in pending:
+                connector = self.get_connector(submitted.connection_name)
+                err, still_running = connector.poll_submitted_query(
+                    submitted.backend_query_id
+                )
+                if still_running:
+                    running.append(submitted)
+                    continue
+                if err is None:
+                    text = self._collect(connector, submitted, **render_options)
+                else:
+                    text = err
+                self.stasher.mark_submitted_query_collected(submitted.backend_query_id)
+                yield submitted, text
+            pending = running
+            if not wait:
+                break
+            if pending:
+                time.sleep(poll_seconds)
+                poll_seconds = min(poll_seconds * 2, MAX_POLL_SECONDS)
+
+    def _collect(
+        self, connector: Connector, submitted: SubmittedQuery, **render_options
+    ) -> str:
+        with record_timings() as timings:
+            err, schema, results = connector.get_submitted_rows(
+                submitted.backend_query_id
+            )
+            if err is not None:
+                return err
+            return render_and_stash(
+                submitted.query_text,
+                schema,
+                results,
+                connector.connection_name,
+                connector.connection_type,
+                timings,
+                self.formatting_rules,
+                backend_query_id=submitted.backend_query_id,
+                stasher=self.stasher,
+                **render_options,
+            ).text
+
+    def close(self):
+        """Close every connection the session opened, and the stash"""
+        for connector in self.connectors.values():
+            connector.close()
+        self.connectors.clear()
+        self.stasher.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,21 +1,120 @@
+import json
 import os
+import re
 import sqlite3
+import sys
+from contextlib import contextmanager, nullcontext
+from datetime import date, datetime, time
+from decimal import Decimal
 from os.path import expanduser
-from typing import List
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence
 
-from query_stash.config import CONFIG_DIRECTORY
+from query_stash.config import CONFIG_DIRECTORY, ConfigException
+from query_stash.schema import Schema
+from query_stash.stats import QueryRun, fingerprint_query
+from query_stash.timing import Timings, span
+from query_stash.types import ConfigDict, Row, RowDict
 
 SQLITE_DB_PATH = expanduser(f"{CONFIG_DIRECTORY}/query-stash.db")
 
 CREATE_TABLE_QUERY = """\
-CREATE VIRTUAL TABLE queries USING fts5(
+CREATE TABLE IF NOT EXISTS queries (
+    query_id INTEGER PRIMARY KEY
+    , query_text TEXT NOT NULL
+    , results_as_table_text TEXT
+    , tags TEXT
+    , queried_at TEXT
+    , db_connection_type TEXT
+    , db_connection_name TEXT
+);"""
+
+# contentless: the text lives in `queries`, the index only holds its tokens
+CREATE_SEARCH_INDEX_QUERY = """\
+CREATE VIRTUAL TABLE IF NOT EXISTS queries_fts USING fts5(
     query_text
+    , results_excerpt
+    , tags
+    , content = ''
+    , tokenize = '{tokenizer}'
+);"""
+
+INSERT_SEARCH_INDEX_ROW_QUERY = """\
+INSERT INTO queries_fts (rowid, query_text, results_excerpt, tags) VALUES (?, ?, ?, ?);
+"""
+
+DROP_SEARCH_INDEX_QUERY = """\
+DROP TABLE IF EXISTS queries_fts;
+"""
+
+SELECT_SEARCH_INDEX_SQL_QUERY = """\
+SELECT sql FROM sqlite_master WHERE name = 'queries_fts';
+"""
+
+SELECT_QUERIES_TABLE_SQL_QUERY = """\
+SELECT sql FROM sqlite_master WHERE name = 'queries';
+"""
+
+# stashes made before the search index kept everything in one FTS5 table
+RENAME_FTS_QUERIES_TABLE_QUERY = """\
+ALTER TABLE queries RENAME TO queries_unicode61;
+"""
+
+COPY_FTS_QUERIES_QUERY = """\
+INSERT INTO queries (
+    query_id
+    , query_text
     , results_as_table_text
     , tags
     , queried_at
     , db_connection_type
     , db_connection_name
-);"""
+)
+SELECT
+    rowid
+    , query_text
+    , results_as_table_text
+    , tags
+    , queried_at
+    , db_connection_type
+    , db_connection_name
+FROM queries_unicode61;
+"""
+
+DROP_FTS_QUERIES_TABLE_QUERY = """\
+DROP TABLE queries_unicode61;
+"""
+
+SELECT_QUERIES_TO_INDEX_QUERY = """\
+SELECT query_id, query_text, results_as_table_text, tags FROM queries;
+"""
+
+SEARCH_QUERIES_QUERY = """\
+SELECT query_id, queried_at, db_connection_name, query_text FROM queries
+WHERE query_id IN (SELECT rowid FROM queries_fts WHERE queries_fts MATCH ?)
+ORDER BY query_id DESC
+LIMIT ?;
+"""
+
+SELECT_RECENT_QUERIES_QUERY = """\
+SELECT query_text FROM queries
+WHERE db_connection_name = ?
+ORDER BY query_id DESC
+LIMIT ?;
+"""
+
+SELECT_RESULT_COLUMN_NAMES_QUERY = """\
+SELECT DISTINCT name FROM query_result_columns
+WHERE name LIKE ? ESCAPE '\\'
+LIMIT ?;
+"""
+
+# the trigram tokenizer can't match fewer than three characters
+SCAN_QUERIES_QUERY = """\
+SELECT query_id, queried_at, db_connection_name, query_text FROM queries
+WHERE instr(lower(query_text), lower(?)) > 0
+ORDER BY query_id DESC
+LIMIT ?;
+"""
 
 INSERT_ROW_QUERY = """\
 INSERT INTO queries (
@@ -36,24 +135,521 @@ INSERT INTO queries (
     );
 """
 
+CREATE_TIMINGS_TABLE_QUERY = """\
+CREATE TABLE IF NOT EXISTS query_timings (
+    query_id INTEGER NOT NULL
+    , phase TEXT NOT NULL
+    , seconds REAL NOT NULL
+);"""
+
+INSERT_TIMING_QUERY = """\
+INSERT INTO query_timings (query_id, phase, seconds) VALUES (?, ?, ?);
+"""
+
+SELECT_TIMINGS_QUERY = """\
+SELECT phase, seconds FROM query_timings WHERE query_id = ? ORDER BY rowid;
+"""
+
+CREATE_STATS_TABLE_QUERY = """\
+CREATE TABLE IF NOT EXISTS query_stats (
+    query_id INTEGER PRIMARY KEY
+    , fingerprint TEXT NOT NULL
+    , db_connection_name TEXT
+    , execute_seconds REAL
+    , fetch_seconds REAL
+    , row_count INTEGER
+    , byte_size INTEGER
+    , backend_query_id TEXT
+    , queried_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);"""
+
+CREATE_STATS_INDEX_QUERY = """\
+CREATE INDEX IF NOT EXISTS query_stats_fingerprint
+    ON query_stats (fingerprint, db_connection_name);"""
+
+INSERT_STATS_QUERY = """\
+INSERT INTO query_stats (
+    query_id
+    , fingerprint
+    , db_connection_name
+    , execute_seconds
+    , fetch_seconds
+    , row_count
+    , byte_size
+    , backend_query_id
+)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?);
+"""
+
+SELECT_QUERY_RUNS_QUERY = """\
+SELECT
+    query_stats.query_id
+    , query_stats.fingerprint
+    , query_stats.db_connection_name
+    , queries.query_text
+    , query_stats.queried_at
+    , query_stats.execute_seconds
+    , query_stats.fetch_seconds
+    , query_stats.row_count
+    , query_stats.byte_size
+    , query_stats.backend_query_id
+FROM query_stats
+JOIN queries ON queries.rowid = query_stats.query_id
+WHERE (:connection_name IS NULL OR query_stats.db_connection_name = :connection_name)
+    AND (:fingerprint IS NULL OR query_stats.fingerprint = :fingerprint)
+    AND (:since IS NULL OR query_stats.queried_at >= :since)
+ORDER BY query_stats.queried_at, query_stats.query_id;
+"""
+
+
+CREATE_RESULT_COLUMNS_TABLE_QUERY = """\
+CREATE TABLE IF NOT EXISTS query_result_columns (
+    query_id INTEGER NOT NULL
+    , position INTEGER NOT NULL
+    , name TEXT NOT NULL
+    , type_name TEXT NOT NULL
+    , PRIMARY KEY (query_id, position)
+) WITHOUT ROWID;"""
+
+CREATE_RESULT_ROWS_TABLE_QUERY = """\
+CREATE TABLE IF NOT EXISTS query_result_rows (
+    query_id INTEGER NOT NULL
+    , row_number INTEGER NOT NULL
+    , row_json TEXT NOT NULL
+    , PRIMARY KEY (query_id, row_number)
+) WITHOUT ROWID;"""
+
+INSERT_RESULT_COLUMN_QUERY = """\
+INSERT INTO query_result_columns (query_id, position, name, type_name)
+    VALUES (?, ?, ?, ?);
+"""
+
+INSERT_RESULT_ROW_QUERY = """\
+INSERT INTO query_result_rows (query_id, row_number, row_json) VALUES (?, ?, ?);
+"""
+
+SELECT_RESULT_COLUMNS_QUERY = """\
+SELECT name, type_name FROM query_result_columns WHERE query_id = ? ORDER BY position;
+"""
+
+SELECT_RESULT_ROW_COUNT_QUERY = """\
+SELECT COALESCE(MAX(row_number) + 1, 0) FROM query_result_rows WHERE query_id = ?;
+"""
+
+SELECT_RESULT_ROWS_QUERY = """\
+SELECT row_json FROM query_result_rows
+WHERE query_id = ? AND row_number >= ? AND row_number < ?
+ORDER BY row_number;
+"""
+
+SELECT_RESULT_ROWS_BY_NUMBER_QUERY = """\
+SELECT row_json FROM query_result_rows
+WHERE query_id = ? AND row_number IN ({placeholders})
+ORDER BY row_number;
+"""
+
+SELECT_RESULT_ROW_MATCH_QUERY = """\
+SELECT row_number FROM query_result_rows
+WHERE query_id = ? AND row_number >= ? AND instr(lower(row_json), lower(?)) > 0
+ORDER BY row_number
+LIMIT 1;
+"""
+
+SELECT_LATEST_RESULT_QUERY_ID_QUERY = """\
+SELECT MAX(query_id) FROM query_result_columns;
+"""
+
+SELECT_QUERY_TEXT_QUERY = """\
+SELECT query_text, db_connection_name, queried_at FROM queries WHERE rowid = ?;
+"""
+
+SELECT_BACKEND_QUERY_ID_QUERY = """\
+SELECT backend_query_id, db_connection_name FROM query_stats WHERE query_id = ?;
+"""
+
+# bundles match stash entries across machines on when, where and what was run
+CREATE_QUERIES_QUERIED_AT_INDEX_QUERY = """\
+CREATE INDEX IF NOT EXISTS queries_queried_at ON queries (queried_at);
+"""
+
+SELECT_ENTRIES_QUERY = """\
+SELECT
+    query_id
+    , query_text
+    , results_as_table_text
+    , tags
+    , queried_at
+    , db_connection_type
+    , db_connection_name
+FROM queries
+WHERE query_id > ? AND queried_at > ?
+ORDER BY query_id;
+"""
+
+SELECT_ENTRY_STATS_QUERY = """\
+SELECT
+    fingerprint
+    , execute_seconds
+    , fetch_seconds
+    , row_count
+    , byte_size
+    , backend_query_id
+FROM query_stats
+WHERE query_id = ?;
+"""
+
+SELECT_ENTRY_COLUMNS_QUERY = """\
+SELECT position, name, type_name FROM query_result_columns
+WHERE query_id = ?
+ORDER BY position;
+"""
+
+SELECT_MATCHING_ENTRY_QUERY = """\
+SELECT 1 FROM queries
+WHERE queried_at = ? AND db_connection_name IS ? AND query_text = ?
+LIMIT 1;
+"""
+
+INSERT_ENTRY_QUERY = """\
+INSERT INTO queries (
+    query_text
+    , results_as_table_text
+    , tags
+    , queried_at
+    , db_connection_type
+    , db_connection_name
+)
+    VALUES (?, ?, ?, ?, ?, ?);
+"""
+
+INSERT_ENTRY_STATS_QUERY = """\
+INSERT INTO query_stats (
+    query_id
+    , fingerprint
+    , db_connection_name
+    , execute_seconds
+    , fetch_seconds
+    , row_count
+    , byte_size
+    , backend_query_id
+    , queried_at
+)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);
+"""
+
+# queries started without waiting (Snowflake's execute_async), until collected
+CREATE_SUBMITTED_QUERIES_TABLE_QUERY = """\
+CREATE TABLE IF NOT EXISTS submitted_queries (
+    backend_query_id TEXT PRIMARY KEY
+    , query_text TEXT NOT NULL
+    , db_connection_name TEXT NOT NULL
+    , submitted_at TEXT
+    , collected_at TEXT
+);"""
+
+INSERT_SUBMITTED_QUERY_QUERY = """\
+INSERT INTO submitted_queries (
+    backend_query_id, query_text, db_connection_name, submitted_at
+) VALUES (?, ?, ?, CURRENT_TIMESTAMP);
+"""
+
+SELECT_PENDING_SUBMITTED_QUERIES_QUERY = """\
+SELECT backend_query_id, query_text, db_connection_name, submitted_at
+FROM submitted_queries
+WHERE collected_at IS NULL
+ORDER BY submitted_at, rowid;
+"""
+
+COLLECT_SUBMITTED_QUERY_QUERY = """\
+UPDATE submitted_queries SET collected_at = CURRENT_TIMESTAMP
+WHERE backend_query_id = ?;
+"""
+
+TYPE_TAG = "$t"
+
+TOKENIZERS = ("trigram", "unicode61")
+TOKENIZER_REGEX = re.compile(r"tokenize = '(\w+)'")
+# SQLite only has the trigram tokenizer from 3.34
+TRIGRAM_SQLITE_VERSION = (3, 34, 0)
+RESULT_EXCERPTS = ("prefix", "header", "none")
+BYTES_PER_MB = 2**20
+TRIGRAM_MIN_CHARS = 3
+
+
+class SubmittedQuery(NamedTuple):
+    backend_query_id: str
+    query_text: str
+    connection_name: str
+    submitted_at: str
+
+
+class StashEntry(NamedTuple):
+    """A stashed query with its stats, timings and result columns (but not its
+    result rows), as moved between stashes"""
+
+    query_id: int
+    query_text: str
+    results_as_table_text: Optional[str]
+    tags: Optional[str]
+    queried_at: str
+    db_connection_type: Optional[str]
+    db_connection_name: Optional[str]
+    stats: Optional[tuple]
+    timings: List[tuple]
+    columns: List[tuple]
+
+
+class SearchIndexSettings(NamedTuple):
+    """How stashed queries are indexed for `search`
+
+    The tokenizer applies to the whole index (changing it in the config
+    rebuilds the index); of each result's text only an excerpt is indexed: its first
+    `result_excerpt_kb` KB ("prefix"), its header row ("header"), or nothing.
+    """
+
+    tokenizer: str = "trigram"
+    result_excerpt: str = "prefix"
+    result_excerpt_kb: int = 4
+
+
+def get_default_search_index_settings() -> SearchIndexSettings:
+    if sqlite3.sqlite_version_info < TRIGRAM_SQLITE_VERSION:
+        return SearchIndexSettings(tokenizer="unicode61")
+    return SearchIndexSettings()
+
+
+def get_search_index_settings(
+    config: Optional[ConfigDict] = None,
+) -> SearchIndexSettings:
+    """The config's [stash] settings
+
+    [stash]
+    tokenizer = "trigram"
+    index_results = "prefix"
+    index_result_kb = 4
+    """
+    stash_config = (config or {}).get("stash", {})
+    default = get_default_search_index_settings()
+    settings = SearchIndexSettings(
+        stash_config.get("tokenizer", default.tokenizer),
+        stash_config.get("index_results", default.result_excerpt),
+        stash_config.get("index_result_kb", default.result_excerpt_kb),
+    )
+    if settings.tokenizer not in TOKENIZERS:
+        raise ConfigException(
+            f"Unknown [stash] tokenizer {settings.tokenizer!r}; "
+            f"use one of {', '.join(TOKENIZERS)}"
+        )
+    if settings.result_excerpt not in RESULT_EXCERPTS:
+        raise ConfigException(
+            f"Unknown [stash] index_results {settings.result_excerpt!r}; "
+            f"use one of {', '.join(RESULT_EXCERPTS)}"
+        )
+    return settings
+
+
+class ResultRowSettings(NamedTuple):
+    """How big a result can be and still have its rows stored (for paging,
+    diffing and local queries); None is no limit, 0 stores no rows"""
+
+    max_rows: Optional[int] = 100_000
+    max_mb: Optional[float] = 64
+
+    @property
+    def max_bytes(self) -> Optional[float]:
+        return None if self.max_mb is None else self.max_mb * BYTES_PER_MB
+
+
+def get_result_row_settings(config: Optional[ConfigDict] = None) -> ResultRowSettings:
+    """The config's [stash] limits on storing result rows
+
+    [stash]
+    max_result_rows = 100_000
+    max_result_mb = 64
+    """
+    stash_config = (config or {}).get("stash", {})
+    default = ResultRowSettings()
+    settings = ResultRowSettings(
+        stash_config.get("max_result_rows", default.max_rows),
+        stash_config.get("max_result_mb", default.max_mb),
+    )
+    for key, value in zip(("max_result_rows", "max_result_mb"), settings):
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+            raise ConfigException(f"[stash] {key} must be a non-negative number")
+    return settings
+
+
+def is_break_line(line: str) -> bool:
+    return set(line) <= {"|", "-", " "}
+
+
+def get_results_excerpt(results_text: str, settings: SearchIndexSettings) -> str:
+    """The part of a result's text that goes in the search index"""
+    if settings.result_excerpt == "none":
+        return ""
+    if settings.result_excerpt == "header":
+        for line in results_text.split("\n", 2)[:2]:
+            if not is_break_line(line):
+                return line
+        return ""
+    limit = settings.result_excerpt_kb * 1024
+    # a character is at least a byte, so slicing first avoids encoding it all
+    return results_text[:limit].encode()[:limit].decode(errors="ignore")
+
+
+def get_match_phrase(text: str) -> str:
+    """FTS5 query matching `text` as one phrase (no operators or column filters)"""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def encode_value(value: Any) -> Any:
+    """JSON for the types drivers return that json can't represent natively"""
+    if isinstance(value, datetime):
+        return {TYPE_TAG: "datetime", "v": value.isoformat()}
+    if isinstance(value, date):
+        return {TYPE_TAG: "date", "v": value.isoformat()}
+    if isinstance(value, time):
+        return {TYPE_TAG: "time", "v": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {TYPE_TAG: "decimal", "v": str(value)}
+    if isinstance(value, bytes):
+        return {TYPE_TAG: "bytes", "v": value.hex()}
+    return str(value)
+
+
+DECODERS = {
+    "datetime": datetime.fromisoformat,
+    "date": date.fromisoformat,
+    "time": time.fromisoformat,
+    "decimal": Decimal,
+    "bytes": bytes.fromhex,
+}
+
+
+def decode_value(obj: Dict[str, Any]) -> Any:
+    if TYPE_TAG in obj:
+        return DECODERS[obj[TYPE_TAG]](obj["v"])
+    return obj
+
+
+def encode_row(values: Sequence[Any]) -> str:
+    return json.dumps(list(values), default=encode_value, ensure_ascii=False)
+
+
+def decode_row(row_json: str) -> List[Any]:
+    return json.loads(row_json, object_hook=decode_value)
+
+
+def get_type_name(rows: List[RowDict] | List[Row], column_name: str | int) -> str:
+    for row in rows:
+        if row[column_name] is not None:
+            return type(row[column_name]).__name__
+    return "NoneType"
+
 
 class QueryStasher:
-    def __init__(self, sqlite_db_path: str = SQLITE_DB_PATH):
+    def __init__(
+        self,
+        sqlite_db_path: str = SQLITE_DB_PATH,
+        search_index_settings: Optional[SearchIndexSettings] = None,
+        keep_connection: bool = False,
+        result_row_settings: ResultRowSettings = ResultRowSettings(),
+    ):
+        """With `keep_connection`, one SQLite connection is opened now and used
+        until `close`, instead of one per operation"""
         self.sqlite_db_path = sqlite_db_path
+        self._search_index_settings = search_index_settings
+        self.result_row_settings = result_row_settings
+        self._conn: Optional[sqlite3.Connection] = None
+        self._transaction_conn: Optional[sqlite3.Connection] = None
         if not self.db_exists():
-            self.create_db_and_table()
+            # stderr, so it can't end up in results exported to stdout
+            print(f"Creating SQLite database at {self.sqlite_db_path}", file=sys.stderr)
+        if keep_connection:
+            self._conn = sqlite3.connect(self.sqlite_db_path)
+        self.create_tables()
 
     def db_exists(self) -> bool:
         return os.path.isfile(self.sqlite_db_path)
 
     def get_sqlite_conn(self) -> sqlite3.Connection:
+        if self._conn is not None:
+            return self._conn
         return sqlite3.connect(self.sqlite_db_path)
 
-    def create_db_and_table(self):
-        print(f"Creating SQLite database at {self.sqlite_db_path}")
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Commit every query stashed in this block together, at its end"""
+        conn = self.get_sqlite_conn()
+        with conn:
+            self._transaction_conn = conn
+            try:
+                yield
+            finally:
+                self._transaction_conn = None
+
+    def _get_stash_conn(self):
+        if self._transaction_conn is not None:
+            # committed when the transaction ends
+            return nullcontext(self._transaction_conn)
+        return self.get_sqlite_conn()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def create_tables(self):
+        """Create any tables missing from the stash (older stashes lack timings),
+        and move stashes from before the search index onto it"""
         with self.get_sqlite_conn() as conn:
             cursor = conn.cursor()
+            queries_sql = cursor.execute(SELECT_QUERIES_TABLE_SQL_QUERY).fetchone()
+            migrating = queries_sql is not None and "VIRTUAL" in queries_sql[0]
+            if migrating:
+                cursor.execute(RENAME_FTS_QUERIES_TABLE_QUERY)
             cursor.execute(CREATE_TABLE_QUERY)
+            if migrating:
+                cursor.execute(COPY_FTS_QUERIES_QUERY)
+                cursor.execute(DROP_FTS_QUERIES_TABLE_QUERY)
+            self._create_search_index(cursor)
+            cursor.execute(CREATE_TIMINGS_TABLE_QUERY)
+            cursor.execute(CREATE_STATS_TABLE_QUERY)
+            cursor.execute(CREATE_STATS_INDEX_QUERY)
+            cursor.execute(CREATE_RESULT_COLUMNS_TABLE_QUERY)
+            cursor.execute(CREATE_RESULT_ROWS_TABLE_QUERY)
+            cursor.execute(CREATE_SUBMITTED_QUERIES_TABLE_QUERY)
+            cursor.execute(CREATE_QUERIES_QUERIED_AT_INDEX_QUERY)
+
+    def _create_search_index(self, cursor: sqlite3.Cursor):
+        """Build the search index if it's missing, or if settings given to this
+        stasher ask for a different tokenizer than it was built with"""
+        index_sql = cursor.execute(SELECT_SEARCH_INDEX_SQL_QUERY).fetchone()
+        if index_sql is not None:
+            self.tokenizer = TOKENIZER_REGEX.search(index_sql[0]).group(1)
+            if self._search_index_settings is None:
+                return
+            if self.tokenizer == self.search_index_settings.tokenizer:
+                return
+        self.tokenizer = self.search_index_settings.tokenizer
+        cursor.execute(DROP_SEARCH_INDEX_QUERY)
+        cursor.execute(CREATE_SEARCH_INDEX_QUERY.format(tokenizer=self.tokenizer))
+        cursor.executemany(
+            INSERT_SEARCH_INDEX_ROW_QUERY,
+            (
+                (query_id, query_text, self._get_excerpt(results_text), tags)
+                for query_id, query_text, results_text, tags in cursor.connection.execute(
+                    SELECT_QUERIES_TO_INDEX_QUERY
+                )
+            ),
+        )
+
+    @property
+    def search_index_settings(self) -> SearchIndexSettings:
+        return self._search_index_settings or get_default_search_index_settings()
+
+    def _get_excerpt(self, results_text: Optional[str]) -> str:
+        return get_results_excerpt(results_text or "", self.search_index_settings)
 
     def stash(
         self,
@@ -62,14 +658,343 @@ class QueryStasher:
         tags: str,
         db_connection_name: str,
         db_connection_type: str,
-    ):
-        with self.get_sqlite_conn() as conn:
+        timings: Optional[Timings] = None,
+        row_count: Optional[int] = None,
+        backend_query_id: Optional[str] = None,
+        rows: Optional[List[RowDict] | List[Row]] = None,
+        schema: Optional[Schema] = None,
+        keep_all_rows: bool = False,
+    ) -> int:
+        """Stash a query and its results, returning the new stash id
+
+        Phase timings recorded so far are saved alongside the query; the
+        stash phase itself is still running and so isn't among them.  If
+        `rows` are given they're stored too, so the result can be paged
+        through later without re-running the query; they're tuples in the
+        order of `schema`'s columns if it's given, or else dicts.  Rows of
+        results over the `result_row_settings` limits aren't stored, unless
+        `keep_all_rows` is set.
+        """
+        with span("stash"), self._get_stash_conn() as conn:
             cursor = conn.cursor()
+            results_text = str(results)
             params = (
                 query,
-                str(results),
+                results_text,
                 tags,
-                db_connection_name,
                 db_connection_type,
+                db_connection_name,
             )
             cursor.execute(INSERT_ROW_QUERY, params)
+            query_id = cursor.lastrowid
+            cursor.execute(
+                INSERT_SEARCH_INDEX_ROW_QUERY,
+                (query_id, query, self._get_excerpt(results_text), tags),
+            )
+            phases = timings.by_phase() if timings is not None else {}
+            cursor.executemany(
+                INSERT_TIMING_QUERY,
+                [(query_id, phase, seconds) for phase, seconds in phases.items()],
+            )
+            stats_params = (
+                query_id,
+                fingerprint_query(query),
+                db_connection_name,
+                phases.get("execute"),
+                phases.get("fetch"),
+                row_count,
+                len(results_text.encode()),
+                backend_query_id,
+            )
+            cursor.execute(INSERT_STATS_QUERY, stats_params)
+            if rows:
+                self._stash_rows(cursor, query_id, rows, schema, keep_all_rows)
+        return query_id
+
+    def _stash_rows(
+        self,
+        cursor: sqlite3.Cursor,
+        query_id: int,
+        rows: List[RowDict] | List[Row],
+        schema: Optional[Schema] = None,
+        keep_all_rows: bool = False,
+    ):
+        limits = self.result_row_settings
+        if keep_all_rows:
+            limits = ResultRowSettings(None, None)
+        if limits.max_rows is not None and len(rows) > limits.max_rows:
+            return
+        if schema is None:
+            schema = Schema.from_rows(rows)
+            cell_keys: list = list(schema.names)
+            value_rows: Iterable[Any] = (row.values() for row in rows)
+        else:
+            cell_keys = list(range(len(schema.names)))
+            value_rows = rows
+        # encoded up front, so a result over the size limit stores nothing
+        row_jsons = []
+        size = 0
+        for values in value_rows:
+            row_json = encode_row(values)
+            # characters, which is close enough to the UTF-8 bytes stored
+            size += len(row_json)
+            if limits.max_bytes is not None and size > limits.max_bytes:
+                return
+            row_jsons.append(row_json)
+        cursor.executemany(
+            INSERT_RESULT_COLUMN_QUERY,
+            [
+                (query_id, position, name, get_type_name(rows, key))
+                for position, (name, key) in enumerate(zip(schema.names, cell_keys))
+            ],
+        )
+        cursor.executemany(
+            INSERT_RESULT_ROW_QUERY,
+            (
+                (query_id, row_number, row_json)
+                for row_number, row_json in enumerate(row_jsons)
+            ),
+        )
+
+    def get_latest_result_query_id(self) -> Optional[int]:
+        with self.get_sqlite_conn() as conn:
+            return conn.execute(SELECT_LATEST_RESULT_QUERY_ID_QUERY).fetchone()[0]
+
+    def get_query_text(self, query_id: int) -> Optional[tuple[str, str, str]]:
+        """The query text, connection name and time of a stashed query"""
+        with self.get_sqlite_conn() as conn:
+            return conn.execute(SELECT_QUERY_TEXT_QUERY, (query_id,)).fetchone()
+
+    def get_backend_query_id(self, query_id: int) -> Optional[tuple[str, str]]:
+        """The warehouse's id for a stashed query, and its connection name"""
+        with self.get_sqlite_conn() as conn:
+            row = conn.execute(SELECT_BACKEND_QUERY_ID_QUERY, (query_id,)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return row
+
+    def iter_entries(
+        self, since_query_id: int = 0, since: str = ""
+    ) -> Iterable[StashEntry]:
+        """Stashed queries after a stash id and time (both exclusive), in order
+
+        Entries are read as they're consumed; each one's stats, timings and
+        columns are looked up on a second cursor, so the entries cursor isn't
+        reset under the loop.
+        """
+        with self.get_sqlite_conn() as conn:
+            entries = conn.execute(SELECT_ENTRIES_QUERY, (since_query_id, since))
+            lookups = conn.cursor()
+            for row in entries:
+                query_id = row[0]
+                stats = lookups.execute(
+                    SELECT_ENTRY_STATS_QUERY, (query_id,)
+                ).fetchone()
+                timings = lookups.execute(SELECT_TIMINGS_QUERY, (query_id,)).fetchall()
+                columns = lookups.execute(
+                    SELECT_ENTRY_COLUMNS_QUERY, (query_id,)
+                ).fetchall()
+                yield StashEntry(*row, stats=stats, timings=timings, columns=columns)
+
+    def merge_entry(
+        self, entry: StashEntry, row_json_batches: Iterable[List[str]] = ()
+    ) -> Optional[int]:
+        """Add an entry from another stash unless it's already here (the same
+        query run at the same time on the same connection); its new stash id,
+        or None if it was a duplicate
+
+        Only the new entry is added to the search index.
+        """
+        with self.get_sqlite_conn() as conn:
+            cursor = conn.cursor()
+            duplicate = cursor.execute(
+                SELECT_MATCHING_ENTRY_QUERY,
+                (entry.queried_at, entry.db_connection_name, entry.query_text),
+            ).fetchone()
+            if duplicate is not None:
+                return None
+            cursor.execute(
+                INSERT_ENTRY_QUERY,
+                (
+                    entry.query_text,
+                    entry.results_as_table_text,
+                    entry.tags,
+                    entry.queried_at,
+                    entry.db_connection_type,
+                    entry.db_connection_name,
+                ),
+            )
+            query_id = cursor.lastrowid
+            cursor.execute(
+                INSERT_SEARCH_INDEX_ROW_QUERY,
+                (
+                    query_id,
+                    entry.query_text,
+                    self._get_excerpt(entry.results_as_table_text),
+                    entry.tags or "",
+                ),
+            )
+            if entry.stats is not None:
+                cursor.execute(
+                    INSERT_ENTRY_STATS_QUERY,
+                    (query_id, entry.stats[0], entry.db_connection_name)
+                    + tuple(entry.stats[1:])
+                    + (entry.queried_at,),
+                )
+            cursor.executemany(
+                INSERT_TIMING_QUERY,
+                [(query_id, phase, seconds) for phase, seconds in entry.timings],
+            )
+            cursor.executemany(
+                INSERT_RESULT_COLUMN_QUERY,
+                [(query_id, *column) for column in entry.columns],
+            )
+            row_number = 0
+            for batch in row_json_batches:
+                cursor.executemany(
+                    INSERT_RESULT_ROW_QUERY,
+                    (
+                        (query_id, row_number + offset, row_json)
+                        for offset, row_json in enumerate(batch)
+                    ),
+                )
+                row_number += len(batch)
+        return query_id
+
+    def add_submitted_query(
+        self, backend_query_id: str, query: str, db_connection_name: str
+    ):
+        with self.get_sqlite_conn() as conn:
+            conn.execute(
+                INSERT_SUBMITTED_QUERY_QUERY,
+                (backend_query_id, query, db_connection_name),
+            )
+
+    def get_pending_submitted_queries(self) -> List[SubmittedQuery]:
+        """Submitted queries whose results haven't been collected, oldest first"""
+        with self.get_sqlite_conn() as conn:
+            rows = conn.execute(SELECT_PENDING_SUBMITTED_QUERIES_QUERY).fetchall()
+        return [SubmittedQuery(*row) for row in rows]
+
+    def mark_submitted_query_collected(self, backend_query_id: str):
+        with self.get_sqlite_conn() as conn:
+            conn.execute(COLLECT_SUBMITTED_QUERY_QUERY, (backend_query_id,))
+
+    def get_result_columns(self, query_id: int) -> List[tuple[str, str]]:
+        """(name, python type name) of each column of a stashed result"""
+        with self.get_sqlite_conn() as conn:
+            return conn.execute(SELECT_RESULT_COLUMNS_QUERY, (query_id,)).fetchall()
+
+    def get_result_row_count(self, query_id: int) -> int:
+        with self.get_sqlite_conn() as conn:
+            return conn.execute(SELECT_RESULT_ROW_COUNT_QUERY, (query_id,)).fetchone()[
+                0
+            ]
+
+    def get_result_rows(
+        self, query_id: int, offset: int = 0, limit: int = -1
+    ) -> List[List[Any]]:
+        """Rows `offset` up to `offset + limit` of a stashed result (all if -1)"""
+        stop = offset + limit if limit >= 0 else 2**63 - 1
+        with self.get_sqlite_conn() as conn:
+            rows = conn.execute(SELECT_RESULT_ROWS_QUERY, (query_id, offset, stop))
+            return [decode_row(row_json) for (row_json,) in rows]
+
+    def get_result_rows_by_number(
+        self, query_id: int, row_numbers: Sequence[int]
+    ) -> List[List[Any]]:
+        """The given rows of a stashed result, in row number order"""
+        query = SELECT_RESULT_ROWS_BY_NUMBER_QUERY.format(
+            placeholders=", ".join("?" * len(row_numbers))
+        )
+        with self.get_sqlite_conn() as conn:
+            rows = conn.execute(query, (query_id, *row_numbers))
+            return [decode_row(row_json) for (row_json,) in rows]
+
+    def iter_result_rows(
+        self, query_id: int, batch_size: int = 10_000
+    ) -> Iterable[List[List[Any]]]:
+        """Every row of a stashed result, in batches, oldest row first"""
+        offset = 0
+        while True:
+            batch = self.get_result_rows(query_id, offset, batch_size)
+            if not batch:
+                return
+            yield batch
+            offset += len(batch)
+
+    def iter_result_row_json(
+        self, query_id: int, batch_size: int = 10_000
+    ) -> Iterable[List[str]]:
+        """Every row of a stashed result as its stored JSON, in batches"""
+        offset = 0
+        while True:
+            with self.get_sqlite_conn() as conn:
+                batch = [
+                    row_json
+                    for (row_json,) in conn.execute(
+                        SELECT_RESULT_ROWS_QUERY,
+                        (query_id, offset, offset + batch_size),
+                    )
+                ]
+            if not batch:
+                return
+            yield batch
+            offset += len(batch)
+
+    def find_result_row(
+        self, query_id: int, text: str, start: int = 0
+    ) -> Optional[int]:
+        """The first row number at or after `start` containing `text` (any case)"""
+        with self.get_sqlite_conn() as conn:
+            match = conn.execute(
+                SELECT_RESULT_ROW_MATCH_QUERY, (query_id, start, text)
+            ).fetchone()
+        return None if match is None else match[0]
+
+    def search_queries(self, text: str, limit: int = 20) -> List[tuple]:
+        """(stash id, time, connection, query) of the latest stashed queries
+        whose text, tags or indexed results contain `text` (any case)"""
+        with self.get_sqlite_conn() as conn:
+            if self.tokenizer == "trigram" and len(text) < TRIGRAM_MIN_CHARS:
+                return conn.execute(SCAN_QUERIES_QUERY, (text, limit)).fetchall()
+            return conn.execute(
+                SEARCH_QUERIES_QUERY, (get_match_phrase(text), limit)
+            ).fetchall()
+
+    def get_recent_queries(self, db_connection_name: str, limit: int) -> List[str]:
+        """The text of the latest queries run on a connection, latest first"""
+        with self.get_sqlite_conn() as conn:
+            rows = conn.execute(
+                SELECT_RECENT_QUERIES_QUERY, (db_connection_name, limit)
+            ).fetchall()
+        return [query_text for (query_text,) in rows]
+
+    def get_result_column_names(self, prefix: str, limit: int) -> List[str]:
+        """Names of stashed result columns starting with `prefix` (any case)"""
+        pattern = re.sub(r"([\\%_])", r"\\\1", prefix) + "%"
+        with self.get_sqlite_conn() as conn:
+            rows = conn.execute(
+                SELECT_RESULT_COLUMN_NAMES_QUERY, (pattern, limit)
+            ).fetchall()
+        return [name for (name,) in rows]
+
+    def get_timings(self, query_id: int) -> List[tuple[str, float]]:
+        with self.get_sqlite_conn() as conn:
+            return conn.execute(SELECT_TIMINGS_QUERY, (query_id,)).fetchall()
+
+    def get_query_runs(
+        self,
+        connection_name: Optional[str] = None,
+        fingerprint: Optional[str] = None,
+        since: Optional[str] = None,
+    ) -> List[QueryRun]:
+        """Stashed runs with performance stats, oldest first"""
+        params = {
+            "connection_name": connection_name,
+            "fingerprint": fingerprint,
+            "since": since,
+        }
+        with self.get_sqlite_conn() as conn:
+            rows = conn.execute(SELECT_QUERY_RUNS_QUERY, params).fetchall()
+        return [QueryRun(*row) for row in rows]
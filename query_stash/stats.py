@@ -0,0 +1,137 @@
+"""Performance history of stashed queries, grouped by query fingerprint"""
+
+import hashlib
+import re
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from query_stash.types import RowDict
+
+COMMENT_PATTERN = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+STRING_LITERAL_PATTERN = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL_PATTERN = re.compile(r"\b\d+(?:\.\d+)?\b")
+IN_LIST_PATTERN = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+MIN_RUNS_FOR_TREND = 4
+
+
+def normalize_query(query: str) -> str:
+    """Strip what varies between runs of the "same" query
+
+    Comments, literals, IN-list lengths, whitespace, case and trailing
+    semicolons, so `SELECT * FROM t WHERE id = 1` and
+    `select *  from t where id=2;` normalize the same way.
+    """
+    normalized = COMMENT_PATTERN.sub(" ", query)
+    normalized = STRING_LITERAL_PATTERN.sub("?", normalized)
+    normalized = NUMBER_LITERAL_PATTERN.sub("?", normalized)
+    normalized = IN_LIST_PATTERN.sub("(?...)", normalized)
+    normalized = WHITESPACE_PATTERN.sub(" ", normalized)
+    normalized = re.sub(r"\s*([(),=<>+*/-])\s*", r"\1", normalized)
+    return normalized.strip().rstrip(";").strip().lower()
+
+
+def fingerprint_query(query: str) -> str:
+    return hashlib.sha1(normalize_query(query).encode()).hexdigest()[:16]
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Linearly interpolated percentile (pct between 0 and 100)"""
+    ordered = sorted(values)
+    if not ordered:
+        raise ValueError("percentile of no values")
+    position = (len(ordered) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def get_trend(latencies: Sequence[float]) -> Optional[float]:
+    """Change in median latency of the newer half of runs vs the older half
+
+    Latencies must be in chronological order; returns e.g. 0.25 for 25% slower.
+    """
+    if len(latencies) < MIN_RUNS_FOR_TREND:
+        return None
+    middle = len(latencies) // 2
+    older = percentile(latencies[:middle], 50)
+    newer = percentile(latencies[middle:], 50)
+    if older == 0:
+        return None
+    return newer / older - 1
+
+
+def round_or_none(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds, 3)
+
+
+def pretty_trend(trend: Optional[float]) -> str:
+    if trend is None:
+        return ""
+    return f"{trend:+.0%}"
+
+
+class QueryRun(NamedTuple):
+    """One stashed execution of a query"""
+
+    query_id: int
+    fingerprint: str
+    db_connection_name: str
+    query_text: str
+    queried_at: str
+    execute_seconds: Optional[float]
+    fetch_seconds: Optional[float]
+    row_count: Optional[int]
+    byte_size: Optional[int]
+    backend_query_id: Optional[str]
+
+    @property
+    def latency_seconds(self) -> float:
+        return (self.execute_seconds or 0.0) + (self.fetch_seconds or 0.0)
+
+
+def summarize_runs(runs: List[QueryRun]) -> List[RowDict]:
+    """One row per (fingerprint, connection): run count, p50/p95 latency, trend
+
+    Runs must be in chronological order.
+    """
+    groups: Dict[Tuple[str, str], List[QueryRun]] = {}
+    for run in runs:
+        groups.setdefault((run.fingerprint, run.db_connection_name), []).append(run)
+    summaries = []
+    for (fingerprint, connection_name), group in groups.items():
+        latencies = [run.latency_seconds for run in group]
+        row_counts = [run.row_count for run in group if run.row_count is not None]
+        summaries.append(
+            {
+                "fingerprint": fingerprint,
+                "connection": connection_name,
+                "runs": len(group),
+                "p50_seconds": round(percentile(latencies, 50), 3),
+                "p95_seconds": round(percentile(latencies, 95), 3),
+                "last_seconds": round(latencies[-1], 3),
+                "trend": pretty_trend(get_trend(latencies)),
+                "median_rows": (
+                    int(percentile(row_counts, 50)) if row_counts else None
+                ),
+                "last_run_at": group[-1].queried_at,
+                "query": " ".join(group[-1].query_text.split()),
+            }
+        )
+    return sorted(summaries, key=lambda s: s["p95_seconds"], reverse=True)
+
+
+def get_run_history(runs: List[QueryRun]) -> List[RowDict]:
+    """Every run of one query, oldest first, for eyeballing a trend"""
+    return [
+        {
+            "stash_number": run.query_id,
+            "queried_at": run.queried_at,
+            "execute_seconds": round_or_none(run.execute_seconds),
+            "fetch_seconds": round_or_none(run.fetch_seconds),
+            "rows": run.row_count,
+            "bytes": run.byte_size,
+            "backend_query_id": run.backend_query_id,
+        }
+        for run in runs
+    ]
@@ -0,0 +1,95 @@
+"""Lightweight per-phase timing of a query (connect, execute, fetch, render, stash)
+
+Code marks phases with `span("phase")`; the spans only cost a clock read when
+something is recording, so they're safe to leave in library paths:
+
+    with record_timings() as timings:
+        connector = Connector(config_path, connection_name)
+        ...
+    print(timings)
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+
+class Span(NamedTuple):
+    name: str
+    seconds: float
+    depth: int = 0
+    started_at: float = 0.0
+
+
+class Timings:
+    """The spans recorded while running one query, in the order they finished"""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        self._depth = 0
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        depth = self._depth
+        self._depth += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._depth = depth
+            self.spans.append(Span(name, time.perf_counter() - start, depth, start))
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(s.seconds for s in self.spans if s.depth == 0)
+
+    def by_phase(self) -> Dict[str, float]:
+        """Seconds per phase name, summing phases that ran more than once"""
+        phases: Dict[str, float] = {}
+        for s in self.ordered_spans():
+            phases[s.name] = phases.get(s.name, 0.0) + s.seconds
+        return phases
+
+    def ordered_spans(self) -> List[Span]:
+        """Spans in start order (parents before the phases nested in them)"""
+        return sorted(self.spans, key=lambda s: s.started_at)
+
+    def __str__(self):
+        total = self.total_seconds
+        name_width = max(
+            [len("phase")] + [len(s.name) + 2 * s.depth for s in self.spans]
+        )
+        lines = [f"{'phase'.ljust(name_width)} {'seconds':>9} {'%':>6}"]
+        for s in self.ordered_spans():
+            name = ("  " * s.depth + s.name).ljust(name_width)
+            percent = 100 * s.seconds / total if total else 0.0
+            lines.append(f"{name} {s.seconds:>9.4f} {percent:>5.1f}%")
+        lines.append(f"{'total'.ljust(name_width)} {total:>9.4f}")
+        return "\n".join(lines)
+
+
+_active_timings: Optional[Timings] = None
+
+
+@contextmanager
+def record_timings(timings: Optional[Timings] = None) -> Iterator[Timings]:
+    """Collect every `span` entered inside this block into `timings`"""
+    global _active_timings
+    if timings is None:
+        timings = Timings()
+    previous = _active_timings
+    _active_timings = timings
+    try:
+        yield timings
+    finally:
+        _active_timings = previous
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time a phase if timings are being recorded, otherwise do nothing"""
+    if _active_timings is None:
+        yield
+        return
+    with _active_timings.span(name):
+        yield
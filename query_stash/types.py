@@ -1,4 +1,8 @@
-from typing import Any, Dict, MutableMapping
+from typing import Any, Dict, MutableMapping, Sequence
 
 RowDict = Dict[str, Any]
+Row = Sequence[Any]
 ConfigDict = MutableMapping[str, Any]
+Params = Dict[str, Any]
+# values for a query's placeholders, by position or (pyformat) by name
+Values = Sequence[Any] | Params
@@ -10,7 +10,7 @@ with open("README.md") as readme_file:
 
 requirements = [
     "Click>=6.0",
-    "toml==0.9.0",
+    "toml==0.9.0; python_version < '3.11'",
     "psycopg2-binary==2.9.3",
     "snowflake-connector-python==2.7.7",
     "duckdb==0.10.0",
@@ -20,6 +20,10 @@ requirements = [
     "clickhouse-driver==0.2.7",
 ]
 
+extras_requirements = {
+    "arrow": ["pyarrow"],
+}
+
 setup_requirements = [
     "pytest-runner",
 ]
@@ -45,6 +49,7 @@ setup(
         ],
     },
     install_requires=requirements,
+    extras_require=extras_requirements,
     long_description=readme,
     long_description_content_type="text/markdown",
     include_package_data=True,
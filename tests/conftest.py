@@ -0,0 +1,19 @@
+from pytest import fixture
+
+from query_stash import config as config_module
+from query_stash.session import Session
+
+
+@fixture(autouse=True)
+def config_cache_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        config_module, "CONFIG_CACHE_PATH", str(tmp_path / "config-cache.json")
+    )
+
+
+@fixture
+def session(tmp_path):
+    config_path = tmp_path / "query-stash.toml"
+    config_path.write_text('[connections.mem]\ntype = "duckdb"\npath = ":memory:"\n')
+    with Session(str(config_path), str(tmp_path / "query-stash.db")) as session:
+        yield session
@@ -0,0 +1,74 @@
+import pytest
+
+from query_stash.config import ConfigException
+from query_stash.connectors import Connector, batching
+from query_stash.connectors.batching import (
+    AdaptiveBatchSize,
+    BatchSettings,
+    get_batch_settings,
+    iter_adaptive_batches,
+)
+
+
+class FakeCursor:
+    def __init__(self, row_count):
+        self.rows = [(n, "x" * 20) for n in range(row_count)]
+        self.sizes = []
+
+    def fetchmany(self, size):
+        self.sizes.append(size)
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+
+class TestGetBatchSettings:
+    def test_it_defaults_to_fixed_batches(self):
+        assert get_batch_settings({}) == BatchSettings()
+
+    def test_it_reads_adaptive_batches_and_a_memory_budget(self):
+        settings = get_batch_settings({"batch_size": "adaptive", "batch_memory_mb": 2})
+        assert settings.adaptive
+        assert settings.memory_budget_bytes == 2 * 2**20
+
+    @pytest.mark.parametrize(
+        "config", [{"batch_size": 0}, {"batch_size": "big"}, {"batch_memory_mb": -1}]
+    )
+    def test_it_rejects_bad_settings(self, config):
+        with pytest.raises(ConfigException):
+            get_batch_settings(config)
+
+
+class TestAdaptiveBatchSize:
+    def test_it_grows_while_round_trips_are_quick(self):
+        batch_size = AdaptiveBatchSize(BatchSettings(1_000, True))
+        batch_size.observe([(1, "a")] * 1_000, 0.01)
+        assert batch_size.size == 4_000
+        batch_size.observe([(1, "a")] * 4_000, 1.0)
+        assert batch_size.size == 4_000
+
+    def test_it_keeps_batches_within_the_memory_budget(self):
+        row = (1, "x" * 1_000)
+        batch_size = AdaptiveBatchSize(BatchSettings(1_000, True, 2**20))
+        batch_size.observe([row] * 1_000, 0.01)
+        assert batch_size.size < 1_000
+        assert batch_size.size * 1_000 < 2**20
+
+
+def test_adaptive_batches_hold_every_row():
+    cursor = FakeCursor(30_000)
+    settings = BatchSettings(batching.FIRST_ADAPTIVE_BATCH_SIZE, True)
+    batches = list(iter_adaptive_batches(cursor, settings))
+    assert sum(len(batch) for batch in batches) == 30_000
+    assert cursor.sizes[:3] == [1_000, 4_000, 16_000]
+
+
+def test_connections_can_stream_adaptive_batches(tmp_path):
+    config_path = tmp_path / "query-stash.toml"
+    config_path.write_text(
+        '[connections.mem]\ntype = "duckdb"\npath = ":memory:"\n'
+        'batch_size = "adaptive"\n'
+    )
+    connector = Connector(str(config_path), "mem")
+    err, _, batches = connector.stream_results("SELECT * FROM range(6000)")
+    assert err is None
+    assert [len(batch) for batch in batches] == [1_000, 4_000, 1_000]
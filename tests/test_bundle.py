@@ -0,0 +1,83 @@
+import gzip
+
+import pytest
+from pytest import fixture
+
+from query_stash.bundle import (
+    BundleException,
+    Watermark,
+    export_bundle,
+    import_bundle,
+    parse_watermark,
+)
+from query_stash.schema import Schema
+from query_stash.sqlite import QueryStasher
+
+
+@fixture
+def source(tmp_path):
+    stasher = QueryStasher(str(tmp_path / "source.db"))
+    for number in range(3):
+        stasher.stash(
+            f"select {number} as n",
+            f"| n | {number} |",
+            "",
+            "mem",
+            "duckdb",
+            row_count=2,
+            rows=[(number, "a"), (number, None)],
+            schema=Schema(("n", "label")),
+        )
+    return stasher
+
+
+@fixture
+def target(tmp_path):
+    return QueryStasher(str(tmp_path / "target.db"))
+
+
+def test_it_parses_watermarks():
+    assert parse_watermark(None) == Watermark()
+    assert parse_watermark("12") == Watermark(query_id=12)
+    assert parse_watermark("2023-06-01T10:00") == Watermark(
+        queried_at="2023-06-01 10:00"
+    )
+    with pytest.raises(BundleException):
+        parse_watermark("last tuesday")
+
+
+class TestBundles:
+    def test_it_copies_entries_with_their_results(self, tmp_path, source, target):
+        path = str(tmp_path / "stash.qsb.gz")
+        assert "next time use --since 3" in export_bundle(path, stasher=source)
+        assert "Imported 3 " in import_bundle(path, stasher=target)
+        query_id = target.get_latest_result_query_id()
+        assert target.get_query_text(query_id)[:2] == ("select 2 as n", "mem")
+        assert target.get_result_columns(query_id) == [
+            ("n", "int"),
+            ("label", "str"),
+        ]
+        assert list(target.iter_result_row_json(query_id)) == list(
+            source.iter_result_row_json(3)
+        )
+        assert target.search_queries("select 1", 10)[0][3] == "select 1 as n"
+
+    def test_it_only_exports_entries_after_the_watermark(self, tmp_path, source):
+        path = str(tmp_path / "stash.qsb.gz")
+        assert "Exported 1 " in export_bundle(path, since="2", stasher=source)
+        with gzip.open(path, "rt") as bundle:
+            assert sum('"entry"' in line[:10] for line in bundle) == 1
+
+    def test_it_skips_entries_already_stashed(self, tmp_path, source, target):
+        path = str(tmp_path / "stash.qsb.gz")
+        export_bundle(path, since="1", stasher=source)
+        import_bundle(path, stasher=target)
+        export_bundle(path, stasher=source)
+        assert "Imported 1 stashed queries" in import_bundle(path, stasher=target)
+        assert "(3 already stashed)" in import_bundle(path, stasher=target)
+        assert len(target.search_queries("select", 10)) == 3
+
+    def test_it_rejects_files_that_arent_bundles(self, tmp_path, target):
+        path = tmp_path / "not-a-bundle.gz"
+        path.write_bytes(gzip.compress(b'{"hello": 1}\n'))
+        assert "Not a query-stash bundle" in import_bundle(str(path), stasher=target)
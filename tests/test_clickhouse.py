@@ -0,0 +1,83 @@
+from query_stash.connectors.clickhouse import (
+    ClickhouseColumnarCursor,
+    ClickhouseCursor,
+    ClickhouseStreamingCursor,
+    iter_clickhouse_arrow_batches,
+)
+
+COLUMNS = [("id", "UInt64"), ("name", "String")]
+ROWS = [(1, "a"), (2, "b"), (3, "c")]
+
+
+class FakeClient:
+    disconnected = False
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(
+        self, query, params=None, with_column_types=False, columnar=False, settings=None
+    ):
+        if not with_column_types:
+            return len(params)
+        if columnar:
+            assert settings == {"max_block_size": 2, "use_numpy": False}
+            return [list(column) for column in zip(*self.rows)], COLUMNS
+        return list(self.rows), COLUMNS
+
+    def execute_iter(self, query, with_column_types, settings):
+        assert with_column_types
+        assert settings == {"max_block_size": 2}
+        return iter([COLUMNS] + self.rows)
+
+    def disconnect(self):
+        self.disconnected = True
+
+
+def make_cursor(rows=ROWS):
+    cursor = ClickhouseStreamingCursor(FakeClient(rows), 2)
+    cursor.execute("select id, name from t")
+    return cursor
+
+
+def test_it_reads_column_names_from_the_header():
+    cursor = make_cursor([])
+    assert cursor.description == COLUMNS
+    assert cursor.fetchmany(2) == []
+
+
+def test_it_streams_rows():
+    cursor = make_cursor()
+    assert cursor.fetchmany(2) == [(1, "a"), (2, "b")]
+    assert cursor.fetchmany(2) == [(3, "c")]
+    assert cursor.fetchmany(2) == []
+    cursor.close()
+    assert cursor.client.disconnected
+
+
+def test_it_fetches_rows_with_the_native_client():
+    with ClickhouseCursor(FakeClient(ROWS)) as cursor:
+        cursor.execute("select id, name from t")
+        assert cursor.description == COLUMNS
+        assert cursor.rowcount == 3
+        assert cursor.fetchall() == ROWS
+        assert cursor.fetchall() == []
+        cursor.executemany("insert into t values", [(4, "d"), (5, "e")])
+        assert cursor.rowcount == 2
+    assert cursor.client.disconnected
+
+
+def test_it_makes_arrow_batches_of_batch_size_rows_from_columns():
+    cursor = ClickhouseColumnarCursor(FakeClient(ROWS), 2)
+    cursor.execute("select id, name from t")
+    batches = list(iter_clickhouse_arrow_batches(cursor, 2))
+    assert [batch.num_rows for batch in batches] == [2, 1]
+    assert batches[0].schema.names == ["id", "name"]
+    assert batches[1].to_pylist() == [{"id": 3, "name": "c"}]
+
+
+def test_an_empty_columnar_result_has_no_batches():
+    cursor = ClickhouseColumnarCursor(FakeClient([]), 2)
+    cursor.execute("select id, name from t")
+    assert cursor.description == COLUMNS
+    assert list(iter_clickhouse_arrow_batches(cursor, 2)) == []
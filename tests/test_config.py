@@ -3,11 +3,15 @@ from unittest.mock import patch
 import pytest
 from pytest import fixture
 
+from query_stash import config as config_module
 from query_stash.config import (
     ConfigException,
     config_directory_exists,
     get_config,
+    get_connection_config,
     get_connection_from_config,
+    load_config,
+    validate_connection,
 )
 
 
@@ -28,6 +32,69 @@ class TestGetConfig:
         }
 
 
+class TestLoadConfig:
+    @fixture
+    def config_path(self, tmp_path):
+        path = tmp_path / "query-stash.toml"
+        path.write_text('[connections.mem]\ntype = "duckdb"\npath = ":memory:"\n')
+        return path
+
+    def test_it_reuses_the_parsed_config_until_the_file_changes(self, config_path):
+        first = load_config(str(config_path))
+        assert load_config(str(config_path)) is first
+        config_path.write_text('[connections.db]\ntype = "duckdb"\npath = "x.db"\n')
+        assert list(load_config(str(config_path)).connections) == ["db"]
+
+    def test_it_reads_the_on_disk_cache_instead_of_parsing(
+        self, config_path, monkeypatch
+    ):
+        load_config(str(config_path))
+        config_module._loaded_configs.clear()
+        monkeypatch.setattr(config_module, "parse_config", None)
+        assert load_config(str(config_path)).config["connections"]["mem"] == {
+            "type": "duckdb",
+            "path": ":memory:",
+        }
+
+
+    def test_configs_with_passwords_are_not_cached(self, config_path):
+        load_config(str(config_path))
+        config_path.write_text(
+            '[connections.pg]\ntype = "postgres"\nhost = "localhost"\n'
+            'user = "me"\npassword = "hunter2"\nport = 5432\ndbname = "db"\n'
+        )
+        assert load_config(str(config_path)).config["connections"]["pg"]["password"]
+        cache_text = open(config_module.CONFIG_CACHE_PATH).read()
+        assert "hunter2" not in cache_text
+        assert str(config_path) not in cache_text
+
+
+class TestConnectionConfig:
+    def test_it_reads_secrets_from_the_environment_when_resolved(self, monkeypatch):
+        settings = {"type": "duckdb", "path_env": "QUERY_STASH_TEST_PATH"}
+        connection = validate_connection("mem", settings)
+        assert connection.problems == ()
+        monkeypatch.setenv("QUERY_STASH_TEST_PATH", ":memory:")
+        assert connection.resolve() == {"type": "duckdb", "path": ":memory:"}
+
+    def test_it_errors_on_unset_secrets(self, monkeypatch):
+        monkeypatch.delenv("QUERY_STASH_TEST_PATH", raising=False)
+        settings = {"type": "duckdb", "path_env": "QUERY_STASH_TEST_PATH"}
+        with pytest.raises(ConfigException):
+            validate_connection("mem", settings).resolve()
+
+    def test_it_only_errors_on_a_misconfigured_connection_when_its_used(self):
+        connection = validate_connection("pg", {"type": "postgres", "host": "x"})
+        assert connection.problems == ("missing user, password, port, dbname",)
+        with pytest.raises(ConfigException):
+            connection.resolve()
+
+    def test_it_errors_on_unknown_connection_names(self):
+        loaded = load_config(config_path="./tests/test-config.toml")
+        with pytest.raises(ConfigException):
+            get_connection_config(loaded, "wombat")
+
+
 class TestGetConnectionFromConfig:
     @fixture
     def single_connection_config(self):
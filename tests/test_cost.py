@@ -0,0 +1,93 @@
+import pytest
+
+from query_stash.config import ConfigException
+from query_stash.connectors import Connector
+from query_stash.connectors.cost import (
+    CostGuardSettings,
+    PlanEstimate,
+    get_cost_guard_settings,
+    get_exceeded_limits,
+)
+
+
+class TestGetCostGuardSettings:
+    def test_it_is_off_by_default(self):
+        assert not get_cost_guard_settings({}).enabled
+
+    def test_it_reads_limits(self):
+        settings = get_cost_guard_settings(
+            {"max_estimated_rows": 1000, "max_scanned_gb": 2, "over_limit": "prompt"}
+        )
+        assert settings.enabled
+        assert settings.max_rows == 1000
+        assert settings.max_bytes == 2 * 2**30
+        assert settings.over_limit == "prompt"
+
+    @pytest.mark.parametrize(
+        "config",
+        [
+            {"max_estimated_rows": -1},
+            {"max_estimated_cost": "lots"},
+            {"over_limit": "ask"},
+        ],
+    )
+    def test_it_rejects_bad_settings(self, config):
+        with pytest.raises(ConfigException):
+            get_cost_guard_settings(config)
+
+
+def test_it_lists_the_limits_an_estimate_goes_over():
+    settings = CostGuardSettings(max_rows=1000, max_cost=50, max_partitions=10)
+    estimate = PlanEstimate(rows=5000, cost=20, partitions=11)
+    assert get_exceeded_limits(estimate, settings) == [
+        "~5,000 rows (limit 1,000)",
+        "11 partitions scanned (limit 10)",
+    ]
+    assert get_exceeded_limits(PlanEstimate(), settings) == []
+
+
+class TestConnectorCostGuard:
+    def make_connector(self, tmp_path, over_limit="refuse", confirm=None):
+        config_path = tmp_path / "query-stash.toml"
+        config_path.write_text(
+            '[connections.mem]\ntype = "duckdb"\npath = ":memory:"\n'
+            f'max_estimated_rows = 1000\nover_limit = "{over_limit}"\n'
+        )
+        return Connector(str(config_path), "mem", confirm_over_limit=confirm)
+
+    def test_it_refuses_queries_over_the_limits(self, tmp_path):
+        connector = self.make_connector(tmp_path)
+        err, _, rows = connector.get_rows("SELECT * FROM range(100000)")
+        assert "rows (limit 1,000)" in err
+        assert rows == []
+        err, _, rows = connector.get_rows("SELECT 42 AS answer")
+        assert err is None
+        assert rows == [[42]]
+
+    def test_it_caches_estimates_by_fingerprint(self, tmp_path):
+        connector = self.make_connector(tmp_path)
+        connector.get_rows("SELECT * FROM range(100000)")
+        connector.get_rows("SELECT * FROM range(200000)")
+        assert len(connector.plan_estimates) == 1
+
+    def test_it_asks_before_running_when_set_to_prompt(self, tmp_path):
+        asked = []
+
+        def confirm(message):
+            asked.append(message)
+            return True
+
+        connector = self.make_connector(tmp_path, "prompt", confirm)
+        err, _, rows = connector.get_rows("SELECT * FROM range(2000)")
+        assert err is None
+        assert len(rows) == 2000
+        assert len(asked) == 1
+
+    def test_it_checks_parameterized_queries_with_their_first_values(self, tmp_path):
+        connector = self.make_connector(tmp_path)
+        with connector.prepare("SELECT * FROM range(:n)") as prepared:
+            err, _, rows = prepared.get_rows({"n": 100000})
+            assert "rows (limit 1,000)" in err
+            assert rows == []
+            err, _ = prepared.execute_many([{"n": 100000}])
+            assert "rows (limit 1,000)" in err
@@ -0,0 +1,97 @@
+from decimal import Decimal
+
+import pytest
+
+from query_stash.diff import (
+    DiffException,
+    DiffSide,
+    detect_key_columns,
+    diff_results,
+    format_diff,
+    iter_row_json_batches,
+)
+
+
+def make_side(label, column_names, rows):
+    return DiffSide(
+        label,
+        tuple(column_names),
+        lambda: iter_row_json_batches(rows, batch_size=2),
+        lambda row_numbers: [rows[n] for n in row_numbers],
+    )
+
+
+OLD = make_side(
+    "old",
+    ["id", "total"],
+    [(1, Decimal("1.50")), (2, Decimal("2.00")), (3, Decimal("3.00"))],
+)
+NEW = make_side(
+    "new",
+    ["id", "total"],
+    [(3, Decimal("3.00")), (2, Decimal("2.50")), (4, Decimal("4.00"))],
+)
+
+
+def test_it_detects_id_columns():
+    assert detect_key_columns(["name", "ID"]) == ("ID",)
+    assert detect_key_columns(["customer_id", "order_id"]) == ("customer_id",)
+    assert detect_key_columns(["name", "customer_id"]) == ()
+
+
+def test_it_diffs_on_a_detected_key():
+    diff = diff_results(OLD, NEW)
+    assert diff.key_columns == ("id",)
+    assert diff.added == [2]
+    assert diff.removed == [0]
+    assert diff.changed == [(1, 1)]
+    assert diff.unchanged == 1
+
+
+def test_it_diffs_on_given_key_columns():
+    diff = diff_results(OLD, NEW, ["total"])
+    assert diff.added == [1, 2]
+    assert diff.removed == [0, 1]
+    assert diff.changed == []
+
+
+def test_duplicate_detected_keys_fall_back_to_whole_rows():
+    old = make_side("old", ["id", "n"], [(1, "a"), (1, "a"), (2, "b")])
+    new = make_side("new", ["id", "n"], [(1, "a"), (2, "c")])
+    diff = diff_results(old, new)
+    assert diff.key_columns == ()
+    assert diff.added == [1]
+    assert diff.removed == [1, 2]
+    assert diff.unchanged == 1
+
+
+def test_duplicate_given_keys_are_an_error():
+    old = make_side("old", ["id", "n"], [(1, "a"), (1, "b")])
+    with pytest.raises(DiffException, match="isn't unique in old"):
+        diff_results(old, old, ["id"])
+
+
+def test_results_with_different_columns_cant_be_diffed():
+    with pytest.raises(DiffException, match="different columns"):
+        diff_results(OLD, make_side("new", ["id"], [(1,)]))
+
+
+def test_it_formats_a_summary_and_the_differences():
+    text = format_diff(diff_results(OLD, NEW), OLD, NEW, limit=5)
+    assert text.splitlines()[0] == (
+        "old -> new (on id): 1 added, 1 removed, 1 changed, 1 unchanged"
+    )
+    assert "Added (1 of 1):" in text
+    assert "Removed (1 of 1):" in text
+    assert "Changed (1 of 1):" in text
+
+
+def test_keys_with_equal_python_hashes_are_still_different_keys():
+    # hash(-1) == hash(-2) in CPython
+    old = make_side("old", ["id", "n"], [(-1, "a"), (-2, "b")])
+    new = make_side("new", ["id", "n"], [(-1, "a"), (-2, "c")])
+    for diff in (diff_results(old, new, ["id"]), diff_results(old, new)):
+        assert diff.key_columns == ("id",)
+        assert diff.changed == [(1, 1)]
+        assert diff.added == diff.removed == []
+        assert diff.unchanged == 1
@@ -0,0 +1,101 @@
+import csv
+import json
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from pytest import fixture
+
+from query_stash.connectors import Connector
+from query_stash.export import (
+    BatchWriter,
+    CsvWriter,
+    ExportException,
+    JsonlWriter,
+    get_batch_writer,
+    write_batches,
+)
+
+COLUMN_NAMES = ["id", "amount", "created_at"]
+BATCHES = [
+    [(1, Decimal("1.50"), datetime(2023, 1, 1)), (2, None, datetime(2023, 1, 2))],
+    [(3, Decimal("3"), None)],
+]
+
+
+@fixture
+def duckdb_config_path(tmp_path):
+    config_path = tmp_path / "query-stash.toml"
+    config_path.write_text(
+        '[connections]\n[connections.mem]\ntype = "duckdb"\npath = ":memory:"\n'
+    )
+    return str(config_path)
+
+
+def test_batch_writers_must_write_rows():
+    with pytest.raises(TypeError):
+        BatchWriter("-", ["id"])
+
+
+class TestCsvWriter:
+    def test_it_writes_a_header_and_every_batch(self, tmp_path):
+        output_path = str(tmp_path / "out.csv")
+        row_count = write_batches(CsvWriter(output_path, COLUMN_NAMES), BATCHES)
+        assert row_count == 3
+        with open(output_path) as f:
+            rows = list(csv.reader(f))
+        assert rows == [
+            ["id", "amount", "created_at"],
+            ["1", "1.50", "2023-01-01 00:00:00"],
+            ["2", "", "2023-01-02 00:00:00"],
+            ["3", "3", ""],
+        ]
+
+
+class TestJsonlWriter:
+    def test_it_writes_one_object_per_row(self, tmp_path):
+        output_path = str(tmp_path / "out.jsonl")
+        write_batches(JsonlWriter(output_path, COLUMN_NAMES), BATCHES)
+        with open(output_path) as f:
+            rows = [json.loads(line) for line in f]
+        assert rows[0] == {
+            "id": 1,
+            "amount": "1.50",
+            "created_at": "2023-01-01T00:00:00",
+        }
+        assert rows[2] == {"id": 3, "amount": "3", "created_at": None}
+
+
+class TestArrowWriters:
+    def test_parquet_keeps_types_and_null_first_batches(self, tmp_path):
+        pq = pytest.importorskip("pyarrow.parquet")
+        output_path = str(tmp_path / "out.parquet")
+        batches = [[(1, None)], [(2, "two")]]
+        writer = get_batch_writer("parquet", output_path, ["id", "name"])
+        assert write_batches(writer, batches) == 2
+        table = pq.read_table(output_path)
+        assert table.to_pydict() == {"id": [1, 2], "name": [None, "two"]}
+
+    def test_arrow_needs_an_output_path(self):
+        pytest.importorskip("pyarrow")
+        with pytest.raises(ExportException):
+            get_batch_writer("arrow", None, ["id"])
+
+
+class TestConnectorStreamResults:
+    def test_it_streams_tuple_batches(self, duckdb_config_path):
+        connector = Connector(duckdb_config_path, "mem")
+        err, column_names, batches = connector.stream_results(
+            "SELECT range AS id, range * 2 AS doubled FROM range(5)", batch_size=2
+        )
+        assert err is None
+        assert column_names == ["id", "doubled"]
+        assert list(batches) == [[(0, 0), (1, 2)], [(2, 4), (3, 6)], [(4, 8)]]
+
+    def test_it_streams_arrow_batches(self, duckdb_config_path):
+        pytest.importorskip("pyarrow")
+        connector = Connector(duckdb_config_path, "mem")
+        err, column_names, batches = connector.stream_results(
+            "SELECT range AS id FROM range(5)", batch_size=2, arrow=True
+        )
+        assert sum(batch.num_rows for batch in batches) == 5
@@ -0,0 +1,147 @@
+from decimal import Decimal
+
+import pandas as pd
+import pytest
+
+from query_stash.config import ConfigException
+from query_stash.formatting import FormattingRule, FormattingRules
+from query_stash.render import (
+    DEFAULT_FORMATTING_RULES,
+    get_column_specs,
+    get_formatting_rules,
+)
+
+
+class TestFormattingRules:
+    def setup_method(self):
+        self.it = FormattingRules(
+            [
+                FormattingRule("a", r"_id$"),
+                FormattingRule("b", r"s$", ("integer",)),
+                FormattingRule("c", r"^count", ("number",)),
+            ]
+        )
+
+    def test_first_matching_rule_wins(self):
+        assert self.it.get_formatter_name("customer_id", int) == "a"
+        assert self.it.get_formatter_name("orders", int) == "b"
+        assert self.it.get_formatter_name("count_x", float) == "c"
+
+    def test_type_must_match(self):
+        assert self.it.get_formatter_name("orders", str) == "plain"
+
+    def test_every_matching_pattern_is_reported(self):
+        assert self.it.matching_patterns("counts") == {1, 2}
+        assert self.it.matching_patterns("name") == set()
+
+    def test_timestamps_include_pandas_timestamps(self):
+        rules = FormattingRules([FormattingRule("datetime", types=("timestamp",))])
+        assert rules.get_formatter_name("created_at", pd.Timestamp) == "datetime"
+
+    def test_patterns_with_flags_or_groups_are_matched_on_their_own(self):
+        rules = FormattingRules(
+            [
+                FormattingRule("a", r"(?i)_usd$"),
+                FormattingRule("b", r"(x)\1"),
+                FormattingRule("c", r"(?P<n>y)(?P=n)"),
+                FormattingRule("d", r"(?P<n>z)"),
+                FormattingRule("e", r"^id$"),
+            ]
+        )
+        assert rules.matching_patterns("REVENUE_USD") == {0}
+        assert rules.matching_patterns("xx_yy") == {1, 2}
+        assert rules.matching_patterns("x_y_z") == {3}
+        assert rules.matching_patterns("id") == {4}
+
+    def test_decisions_are_memoized(self):
+        self.it.get_formatter_name("orders", int)
+        assert self.it._decisions == {("orders", "int"): "b"}
+
+
+class TestDefaultFormattingRules:
+    def setup_method(self):
+        self.it = FormattingRules(DEFAULT_FORMATTING_RULES)
+
+    def test_it_keeps_the_builtin_choices(self):
+        assert self.it.get_formatter_name("total_groups", int) == "int_commas"
+        assert self.it.get_formatter_name("user_id", int) == "decimal_no_commas"
+        assert self.it.get_formatter_name("price", Decimal) == "decimal"
+        assert self.it.get_formatter_name("name", str) == "plain"
+
+
+class TestGetFormattingRules:
+    def test_config_rules_come_before_the_defaults(self):
+        config = {
+            "formatting": {
+                "rules": [
+                    {"pattern": "_usd$", "types": ["number"], "formatter": "money"},
+                    {"pattern": "_pct$", "formatter": "percent"},
+                ]
+            }
+        }
+        rules = get_formatting_rules(config)
+        assert rules.get_formatter_name("revenue_usd", Decimal) == "money"
+        assert rules.get_formatter_name("share_pct", float) == "percent"
+        assert rules.get_formatter_name("user_id", int) == "decimal_no_commas"
+
+    def test_a_single_type_can_be_a_string(self):
+        config = {
+            "formatting": {
+                "rules": [{"pattern": "_n$", "types": "int", "formatter": "bytes"}]
+            }
+        }
+        assert get_formatting_rules(config).get_formatter_name("files_n", int) == (
+            "bytes"
+        )
+
+    def test_it_rejects_types_that_are_not_names(self):
+        config = {"formatting": {"rules": [{"types": [1], "formatter": "money"}]}}
+        with pytest.raises(ConfigException):
+            get_formatting_rules(config)
+
+    def test_patterns_that_only_compile_alone_are_accepted(self):
+        config = {
+            "formatting": {
+                "rules": [
+                    {"pattern": "(?i)_usd$", "formatter": "money"},
+                    {"pattern": "(?P<p>_pct)$", "formatter": "percent"},
+                    {"pattern": "(?P<p>_bytes)$", "formatter": "bytes"},
+                ]
+            }
+        }
+        rules = get_formatting_rules(config)
+        assert rules.get_formatter_name("Revenue_USD", Decimal) == "money"
+        assert rules.get_formatter_name("share_pct", float) == "percent"
+        assert rules.get_formatter_name("file_bytes", int) == "bytes"
+
+    def test_compiled_rules_are_reused(self):
+        config = {"formatting": {"rules": [{"pattern": "b$", "formatter": "bytes"}]}}
+        assert get_formatting_rules(config) is get_formatting_rules(dict(config))
+
+    def test_it_rejects_unknown_formatters(self):
+        config = {"formatting": {"rules": [{"pattern": "x", "formatter": "fancy"}]}}
+        with pytest.raises(ConfigException):
+            get_formatting_rules(config)
+
+    def test_it_rejects_bad_patterns(self):
+        config = {"formatting": {"rules": [{"pattern": "(", "formatter": "money"}]}}
+        with pytest.raises(ConfigException):
+            get_formatting_rules(config)
+
+    def test_configured_formatters_size_their_columns(self):
+        config = {
+            "formatting": {"rules": [{"pattern": "_bytes$", "formatter": "bytes"}]}
+        }
+        rows = [{"file_bytes": 3 * 1024 * 1024}, {"file_bytes": None}]
+        (spec,) = get_column_specs(rows, formatting_rules=get_formatting_rules(config))
+        assert spec.transform(rows[0]["file_bytes"]) == "3.0 MiB   "
+        assert spec.width == len("file_bytes")
+
+    def test_untyped_rules_leave_text_cells_alone(self):
+        config = {
+            "formatting": {"rules": [{"pattern": "_pct$", "formatter": "percent"}]}
+        }
+        rows = [{"share_pct": "n/a"}, {"share_pct": 0.5}]
+        (spec,) = get_column_specs(rows, formatting_rules=get_formatting_rules(config))
+        assert spec.transform("n/a").strip() == "¿?"
+        assert spec.transform(0.5).strip() == "50.00%"
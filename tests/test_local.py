@@ -0,0 +1,86 @@
+from datetime import datetime
+from decimal import Decimal
+
+from pytest import fixture
+
+from query_stash.local import find_stash_references, get_decimal_type, run_local_query
+from query_stash.sqlite import QueryStasher
+
+
+@fixture
+def stasher(tmp_path):
+    return QueryStasher(str(tmp_path / "query-stash.db"))
+
+
+@fixture
+def local_db_path(tmp_path):
+    return str(tmp_path / "results.duckdb")
+
+
+def stash_rows(stasher, rows):
+    return stasher.stash("select ...", "| ... |", "", "mem", "duckdb", rows=rows)
+
+
+def test_it_finds_each_stash_reference_once():
+    query = 'select * from stash.q_12 join STASH."q_3" using (id) join stash.q_12 x'
+    assert find_stash_references(query) == [12, 3]
+
+
+def test_decimal_type_fits_every_value():
+    assert get_decimal_type([Decimal("1.5"), None, Decimal("-123.25")]) == (
+        "DECIMAL(5, 2)"
+    )
+    assert get_decimal_type([Decimal("1e40")]) == "DOUBLE"
+
+
+class TestRunLocalQuery:
+    def test_it_queries_a_stashed_result_with_its_types(self, stasher, local_db_path):
+        query_id = stash_rows(
+            stasher,
+            [
+                {"id": 1, "total": Decimal("10.25"), "placed_at": datetime(2023, 1, 2)},
+                {"id": None, "total": Decimal("1.5"), "placed_at": None},
+            ],
+        )
+        err, schema, rows = run_local_query(
+            f"select id, total * 2 as doubled, placed_at from stash.q_{query_id}"
+            " order by id nulls last",
+            stasher,
+            local_db_path,
+        )
+        assert err is None
+        assert schema.names == ("id", "doubled", "placed_at")
+        assert rows == [
+            (1, Decimal("20.50"), datetime(2023, 1, 2)),
+            (None, Decimal("3.00"), None),
+        ]
+
+    def test_it_joins_stashed_results(self, stasher, local_db_path):
+        first = stash_rows(stasher, [{"id": 1, "name": "a"}, {"id": 2, "name": "b"}])
+        second = stash_rows(stasher, [{"id": 2, "amount": 5.5}])
+        err, _, rows = run_local_query(
+            f"select name, amount from stash.q_{first} join stash.q_{second} using (id)",
+            stasher,
+            local_db_path,
+        )
+        assert err is None
+        assert rows == [("b", 5.5)]
+
+    def test_loaded_results_are_kept(self, stasher, local_db_path):
+        query_id = stash_rows(stasher, [{"id": 1}])
+        query = f"select count(*) from stash.q_{query_id}"
+        run_local_query(query, stasher, local_db_path)
+        with stasher.get_sqlite_conn() as conn:
+            conn.execute("DELETE FROM query_result_columns")
+        assert run_local_query(query, stasher, local_db_path)[2] == [(1,)]
+
+    def test_it_reports_missing_results(self, stasher, local_db_path):
+        err, _, rows = run_local_query(
+            "select * from stash.q_7", stasher, local_db_path
+        )
+        assert "Stash 7 has no stored result rows" in err
+        assert rows == []
+
+    def test_it_reports_sql_errors(self, stasher, local_db_path):
+        err, _, _ = run_local_query("select nope", stasher, local_db_path)
+        assert "nope" in err
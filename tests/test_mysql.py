@@ -0,0 +1,31 @@
+from query_stash.connectors import mysql
+from query_stash.connectors.mysql import get_mysql_connection
+
+CONFIG = {
+    "dbname": "jaffle_shop",
+    "user": "root",
+    "password": "root",
+    "host": "localhost",
+    "port": 3306,
+}
+
+
+def connect_with(monkeypatch, config, have_cext=True):
+    monkeypatch.setattr(mysql, "HAVE_CEXT", have_cext)
+    monkeypatch.setattr(mysql, "connect", lambda **kwargs: kwargs)
+    return get_mysql_connection(config)
+
+
+def test_it_uses_the_c_extension_when_installed(monkeypatch):
+    options = connect_with(monkeypatch, CONFIG)
+    assert options["use_pure"] is False
+    assert options["consume_results"] is True
+
+
+def test_it_falls_back_to_pure_python(monkeypatch):
+    assert connect_with(monkeypatch, CONFIG, have_cext=False)["use_pure"] is True
+
+
+def test_use_pure_can_be_configured(monkeypatch):
+    options = connect_with(monkeypatch, {**CONFIG, "use_pure": True})
+    assert options["use_pure"] is True
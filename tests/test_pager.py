@@ -0,0 +1,79 @@
+from datetime import datetime
+from decimal import Decimal
+
+from pytest import fixture
+
+from query_stash.pager import PagerView, StashedResult
+from query_stash.sqlite import QueryStasher
+
+
+@fixture
+def stasher(tmp_path):
+    return QueryStasher(str(tmp_path / "query-stash.db"))
+
+
+@fixture
+def result(stasher):
+    rows = [
+        {"id": i, "name": f"customer {i}", "num_orders": i * 1_000}
+        for i in range(1_200)
+    ]
+    query_id = stasher.stash("select 1", "", "", "mem", "duckdb", rows=rows)
+    return StashedResult(stasher, query_id)
+
+
+class TestStashedResult:
+    def test_it_knows_its_shape(self, result):
+        assert result.column_names == ["id", "name", "num_orders"]
+        assert result.row_count == 1_200
+
+    def test_it_gets_rows_across_pages(self, result):
+        rows = result.get_rows(498, 4)
+        assert [row[0] for row in rows] == [498, 499, 500, 501]
+
+    def test_it_stops_at_the_last_row(self, result):
+        assert len(result.get_rows(1_198, 10)) == 2
+
+    def test_it_keeps_value_types(self, stasher):
+        rows = [
+            {"at": datetime(2023, 1, 1, 12), "amount": Decimal("1.10"), "x": None},
+            {"at": datetime(2023, 1, 2), "amount": Decimal("2"), "x": 1.5},
+        ]
+        query_id = stasher.stash("select 1", "", "", "mem", "duckdb", rows=rows)
+        stashed = StashedResult(stasher, query_id)
+        assert stashed.get_rows(0, 2) == [list(r.values()) for r in rows]
+
+
+class TestPagerView:
+    def test_it_renders_only_the_visible_window(self, result):
+        view = PagerView(result, height=5, width=36)
+        lines = view.render()
+        assert lines == [
+            "| id   | name          |",
+            "| ---- | ------------- |",
+            "| 0    | customer 0    |",
+            "| 1    | customer 1    |",
+            "rows 1-2 of 1,200 · columns 1-2 of 3",
+        ]
+
+    def test_it_scrolls_columns(self, result):
+        view = PagerView(result, height=5, width=36)
+        view.scroll_columns(2)
+        assert view.render()[2] == "| 0          |"
+
+    def test_it_does_not_scroll_past_the_last_row(self, result):
+        view = PagerView(result, height=5, width=36)
+        view.scroll_rows(5_000)
+        assert view.top_row == 1_198
+
+    def test_it_jumps_to_a_row(self, result):
+        view = PagerView(result, height=5, width=36)
+        view.jump_to_row(700)
+        assert view.render()[2].startswith("| 699 ")
+
+    def test_it_searches_forward(self, result):
+        view = PagerView(result, height=5, width=36)
+        view.search("CUSTOMER 1099")
+        assert view.top_row == 1_099
+        view.search_next()
+        assert "not found" in view.message
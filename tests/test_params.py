@@ -0,0 +1,73 @@
+import pytest
+
+from query_stash.connectors.prepared import NUMERIC, PYFORMAT, QMARK, bind_query
+from query_stash.params import (
+    ParameterException,
+    describe_params,
+    get_param_sets,
+    parse_param,
+)
+
+
+class TestParseParam:
+    def test_values_bind_as_json_scalars_or_text(self):
+        assert parse_param("id=42") == ("id", 42)
+        assert parse_param(":open=true") == ("open", True)
+        assert parse_param('zip="02134"') == ("zip", "02134")
+        assert parse_param("zip=02134") == ("zip", "02134")
+        assert parse_param("status=open=ish") == ("status", "open=ish")
+
+    @pytest.mark.parametrize("text", ["id", "=42", "1st=a"])
+    def test_it_rejects_anything_but_name_value(self, text):
+        with pytest.raises(ParameterException):
+            parse_param(text)
+
+
+class TestGetParamSets:
+    def test_params_are_added_to_each_set_from_a_file(self, tmp_path):
+        param_file = tmp_path / "params.csv"
+        param_file.write_text("id,name\n1,alice\n2,bob\n")
+        assert get_param_sets(["active=true"], str(param_file)) == [
+            {"id": 1, "name": "alice", "active": True},
+            {"id": 2, "name": "bob", "active": True},
+        ]
+
+    def test_it_reads_json_files(self, tmp_path):
+        param_file = tmp_path / "params.json"
+        param_file.write_text('{"id": 1}')
+        assert get_param_sets((), str(param_file)) == [{"id": 1}]
+        param_file.write_text('[{"id": 1}, 2]')
+        with pytest.raises(ParameterException):
+            get_param_sets((), str(param_file))
+
+    def test_without_a_file_there_is_one_set(self):
+        assert get_param_sets(["id=1"]) == [{"id": 1}]
+
+
+def test_it_describes_params_as_a_comment():
+    assert describe_params({"id": 1, "name": "a"}) == '-- :id = 1, :name = "a"'
+
+
+class TestBindQuery:
+    QUERY = "select :id::text, ':id' -- :id\nwhere a % 2 = :b and x = :id"
+
+    def test_numeric_placeholders_reuse_a_number_per_name(self):
+        bound = bind_query(self.QUERY, NUMERIC)
+        assert (
+            bound.text == "select $1::text, ':id' -- :id\nwhere a % 2 = $2 and x = $1"
+        )
+        assert bound.get_values({"id": 7, "b": 1}) == [7, 1]
+
+    def test_qmark_placeholders_take_a_value_each(self):
+        bound = bind_query(self.QUERY, QMARK)
+        assert bound.text == "select ?::text, ':id' -- :id\nwhere a % 2 = ? and x = ?"
+        assert bound.get_values({"id": 7, "b": 1}) == [7, 1, 7]
+
+    def test_pyformat_placeholders_escape_percent_signs(self):
+        bound = bind_query("select :id, '100%' where a % 2 = 0", PYFORMAT)
+        assert bound.text == "select %(id)s, '100%%' where a %% 2 = 0"
+        assert bound.get_values({"id": 7, "extra": 1}) == {"id": 7}
+
+    def test_it_needs_a_value_for_every_parameter(self):
+        with pytest.raises(ParameterException, match=":b"):
+            bind_query(self.QUERY, NUMERIC).get_values({"id": 7})
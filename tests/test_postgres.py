@@ -0,0 +1,109 @@
+import io
+
+import psycopg2
+import pytest
+
+from query_stash.connectors.postgres import (
+    copy_postgres_csv,
+    get_copy_csv_query,
+    get_postgres_plan_estimate,
+)
+
+
+class FakeCopyCursor:
+    rowcount = -1
+
+    def copy_expert(self, sql, file):
+        self.sql = sql
+        file.write("id\n1\n2\n")
+        self.rowcount = 2
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class FakeConnection:
+    def cursor(self):
+        self.last_cursor = FakeCopyCursor()
+        return self.last_cursor
+
+
+def test_copy_query_drops_trailing_semicolons():
+    assert get_copy_csv_query("select 1;\n") == (
+        "COPY (\nselect 1\n) TO STDOUT WITH (FORMAT csv, HEADER true)"
+    )
+
+
+def test_copy_query_survives_a_trailing_comment():
+    assert get_copy_csv_query("select 1 -- one") == (
+        "COPY (\nselect 1 -- one\n) TO STDOUT WITH (FORMAT csv, HEADER true)"
+    )
+
+
+def test_it_copies_csv_into_the_output_file():
+    conn = FakeConnection()
+    output = io.StringIO()
+    assert copy_postgres_csv(conn, "select 1", output) == 2
+    assert output.getvalue() == "id\n1\n2\n"
+    assert conn.last_cursor.sql.startswith("COPY (\nselect 1\n)")
+
+
+class FakeExplainCursor:
+    def __init__(self, plan):
+        self.plan = plan
+        self.executed = []
+
+    def execute(self, sql, values=None):
+        self.executed.append(sql.split(" (")[0])
+        if sql.startswith("EXPLAIN") and self.plan is None:
+            raise psycopg2.ProgrammingError("EXPLAIN doesn't take this")
+
+    def fetchone(self):
+        return ([{"Plan": self.plan}],)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class FakeExplainConnection:
+    def __init__(self, plan=None):
+        self.last_cursor = FakeExplainCursor(plan)
+
+    def cursor(self):
+        return self.last_cursor
+
+
+def test_it_explains_queries_in_a_savepoint():
+    conn = FakeExplainConnection({"Plan Rows": 10, "Total Cost": 2.5})
+    estimate = get_postgres_plan_estimate(conn, "select 1")
+    assert (estimate.rows, estimate.cost) == (10, 2.5)
+    assert conn.last_cursor.executed == [
+        "SAVEPOINT query_stash_explain",
+        "EXPLAIN",
+        "RELEASE SAVEPOINT query_stash_explain",
+    ]
+
+
+def test_statements_it_cant_explain_only_roll_back_the_savepoint():
+    conn = FakeExplainConnection()
+    with pytest.raises(psycopg2.ProgrammingError):
+        get_postgres_plan_estimate(conn, "vacuum")
+    assert conn.last_cursor.executed == [
+        "SAVEPOINT query_stash_explain",
+        "EXPLAIN",
+        "ROLLBACK TO SAVEPOINT query_stash_explain",
+        "RELEASE SAVEPOINT query_stash_explain",
+    ]
+
+
+def test_it_estimates_the_largest_row_count_in_the_plan():
+    scan = {"Plan Rows": 5_000_000, "Total Cost": 80_000.0}
+    plan = {"Plan Rows": 1, "Total Cost": 92_500.0, "Plans": [{**scan, "Plans": []}]}
+    estimate = get_postgres_plan_estimate(FakeExplainConnection(plan), "select 1")
+    assert (estimate.rows, estimate.cost) == (5_000_000, 92_500.0)
@@ -11,6 +11,8 @@ from click.testing import CliRunner
 from query_stash import cli, query_stash
 from query_stash.cli import query
 from query_stash.render import get_rendered_table
+from query_stash.schema import Schema
+from query_stash.session import StashedTable
 
 
 def test_command_line_interface():
@@ -32,10 +34,124 @@ def rendered_table():
 @patch("query_stash.cli.connect_and_query_db")
 def test_command_query(patched_connect_and_query_db, rendered_table):
     """Test the CLI."""
-    patched_connect_and_query_db.return_value = rendered_table
+    patched_connect_and_query_db.return_value = StashedTable(str(rendered_table))
     runner = CliRunner()
     result = runner.invoke(
         cli.query, ["select * from dbt_collin.raw_customers limit 8"]
     )
     assert result.output == str(rendered_table) + "\n"
     assert result.exit_code == 0
+
+
+@patch("query_stash.cli.connect_and_query_db")
+def test_command_query_with_profile(patched_connect_and_query_db, rendered_table):
+    patched_connect_and_query_db.return_value = StashedTable(str(rendered_table))
+    runner = CliRunner()
+    result = runner.invoke(cli.query, ["select 1", "--profile"])
+    assert result.exit_code == 0
+    assert "total" in result.output
+
+
+@patch("query_stash.cli.QueryStasher")
+@patch("query_stash.cli.run_pager")
+@patch("query_stash.cli.connect_and_query_db")
+def test_command_query_pages_only_its_own_result(
+    patched_connect_and_query_db, patched_run_pager, patched_query_stasher
+):
+    patched_connect_and_query_db.return_value = StashedTable("table", 7)
+    result = CliRunner().invoke(cli.query, ["select 1", "--pager"])
+    assert result.exit_code == 0
+    assert patched_run_pager.call_args.args[1] == 7
+    assert patched_connect_and_query_db.call_args.kwargs["pager"]
+
+    patched_run_pager.reset_mock()
+    patched_connect_and_query_db.return_value = StashedTable("┆no such table┆")
+    result = CliRunner().invoke(cli.query, ["select * from nope", "--pager"])
+    assert result.output == "┆no such table┆\n"
+    patched_run_pager.assert_not_called()
+
+
+@patch("query_stash.cli.get_result_scan")
+@patch("query_stash.cli.connect_and_query_db")
+def test_command_query_result_of(
+    patched_connect_and_query_db, patched_get_result_scan, rendered_table
+):
+    patched_connect_and_query_db.return_value = StashedTable(str(rendered_table))
+    patched_get_result_scan.return_value = (
+        "SELECT * FROM TABLE(RESULT_SCAN('x'))",
+        "snow",
+    )
+    result = CliRunner().invoke(cli.query, ["--result-of", "7"])
+    assert result.exit_code == 0
+    patched_get_result_scan.assert_called_once_with(7)
+    kwargs = patched_connect_and_query_db.call_args.kwargs
+    assert kwargs["query"] == "SELECT * FROM TABLE(RESULT_SCAN('x'))"
+    assert kwargs["connection_name"] == "snow"
+
+
+@patch("query_stash.cli.query_stash_locally")
+def test_command_local(patched_query_stash_locally, rendered_table):
+    patched_query_stash_locally.return_value = str(rendered_table)
+    runner = CliRunner()
+    result = runner.invoke(cli.local, ["select * from stash.q_1"])
+    assert result.exit_code == 0
+    assert result.output == str(rendered_table) + "\n"
+    assert patched_query_stash_locally.call_args.kwargs["query"] == (
+        "select * from stash.q_1"
+    )
+
+
+@patch("query_stash.cli.diff_query_results")
+def test_command_diff(patched_diff_query_results):
+    patched_diff_query_results.return_value = "#1 -> #2 (on id): 0 added"
+    runner = CliRunner()
+    result = runner.invoke(cli.diff, ["1", "2", "--key", "id, region"])
+    assert result.exit_code == 0
+    assert patched_diff_query_results.call_args.args[:3] == (1, 2, ["id", "region"])
+
+
+@patch("query_stash.cli.submit_queries")
+def test_command_submit(patched_submit_queries):
+    patched_submit_queries.return_value = ["01b2-a", "01b2-b"]
+    result = CliRunner().invoke(cli.submit, ["select 1", "select 2"])
+    assert result.exit_code == 0
+    assert result.output == "01b2-a\n01b2-b\n"
+    assert patched_submit_queries.call_args.args[2] == ("select 1", "select 2")
+
+
+class FakeStasher:
+    def __init__(self, connection_name):
+        self.connection_name = connection_name
+
+    def get_result_columns(self, query_id):
+        return [("n", "int")]
+
+    def iter_result_row_json(self, query_id):
+        yield ["[1]", "[2]"]
+
+    def get_result_rows_by_number(self, query_id, row_numbers):
+        return [((1,), (2,))[row_number] for row_number in row_numbers]
+
+    def get_query_text(self, query_id):
+        return "select n from stash.q_1", self.connection_name, None
+
+
+@patch("query_stash.query_stash.run_local_query")
+@patch("query_stash.query_stash.QueryStasher")
+def test_diff_reruns_local_queries_locally(patched_query_stasher, patched_run_local):
+    patched_query_stasher.return_value = FakeStasher("local")
+    patched_run_local.return_value = (None, Schema(("n",)), [(1,), (3,)])
+    diff = query_stash.diff_query_results(2)
+    assert patched_run_local.call_args.args[0] == "select n from stash.q_1"
+    assert "#2 -> live" in diff
+
+
+@patch("query_stash.query_stash.QueryStasher")
+def test_diff_reports_connections_missing_from_the_config(
+    patched_query_stasher, tmp_path
+):
+    config_path = tmp_path / "config.toml"
+    config_path.write_text('[connections.mem]\ntype = "duckdb"\npath = ":memory:"\n')
+    patched_query_stasher.return_value = FakeStasher("gone")
+    diff = query_stash.diff_query_results(2, config_path=str(config_path))
+    assert diff.startswith("Unknown connection 'gone'")
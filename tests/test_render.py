@@ -1,15 +1,24 @@
 from datetime import datetime
+from decimal import Decimal
 
+import pytest
+
+from query_stash import render
 from query_stash.render import (
     ColumnSpec,
     RenderedPivotedTable,
     RenderedTable,
+    RenderException,
     clean_column_headers_for_rows,
+    fit_to_width,
     get_clean_headers,
     get_rendered_table,
+    iter_printable_chunks_in_parallel,
     pretty_datetime,
+    sample_rows,
     should_be_formatted_with_commas,
 )
+from query_stash.schema import Schema
 
 
 class TestPrettyDateTime:
@@ -204,3 +213,155 @@ class TestGuessRowCollection:
 | --- |\
 """
         assert expected == str(row_collection)
+
+
+class TestFitToWidth:
+    def test_it_pads_short_values(self):
+        assert fit_to_width("Sam", 5) == "Sam  "
+
+    def test_it_truncates_by_default(self):
+        assert fit_to_width("Jack Gabriel", 8) == "Jack Ga…"
+
+    def test_it_can_keep_both_ends(self):
+        assert fit_to_width("Jack Gabriel", 8, "middle") == "Jack…iel"
+
+    def test_it_can_hash_out_values(self):
+        assert fit_to_width("27,596,962,761", 6, "hash") == "######"
+
+
+class TestGetRenderedTableWidths:
+    @property
+    def rows(self):
+        return [{"id": i, "name": "x" * (i % 50)} for i in range(1_000)]
+
+    def test_it_caps_widths(self):
+        table = get_rendered_table(self.rows, max_width=10)
+        assert [spec.width for spec in table.column_specs] == [3, 10]
+
+    def test_it_applies_the_overflow_policy(self):
+        table = get_rendered_table(self.rows, max_width=10, overflow="hash")
+        assert table.column_specs[1].transform("x" * 20) == "#" * 10
+
+    def test_it_estimates_widths_from_a_sample(self):
+        rows = self.rows + [{"id": 1_000, "name": "x" * 200}]
+        table = get_rendered_table(rows, width_sample_size=100)
+        assert table.column_specs[0].width == 4  # the last row is always sampled
+        assert table.column_specs[1].width == 200
+        rows.insert(500, {"id": 0, "name": "y" * 300})
+        table = get_rendered_table(rows, width_sample_size=100)
+        assert table.column_specs[1].width < 300
+
+
+class TestSampleRows:
+    def test_it_returns_small_results_whole(self):
+        rows = [{"id": 1}, {"id": 2}]
+        assert sample_rows(rows, 10) is rows
+
+    def test_it_keeps_order_and_the_first_and_last_rows(self):
+        rows = [{"id": i} for i in range(100)]
+        sample = sample_rows(rows, 10)
+        assert len(sample) == 10
+        assert sample[0] == {"id": 0} and sample[-1] == {"id": 99}
+        assert sample == sorted(sample, key=lambda r: r["id"])
+
+
+class TestGetRenderedTableColumns:
+    @property
+    def rows(self):
+        return [
+            {"id": i, "name": f"customer {i}", "count(*)": i, "notes": "x" * 30}
+            for i in range(3)
+        ]
+
+    def test_it_projects_columns_in_the_order_asked(self):
+        table = get_rendered_table(self.rows, columns=["NAME", "count(*)"])
+        assert table.header_row == "| name       | count |"
+        assert table.make_printable_row(table.rows[1]) == "| customer 1 | 1     |"
+
+    def test_it_errors_on_unknown_columns(self):
+        with pytest.raises(RenderException):
+            get_rendered_table(self.rows, columns=["wombats"])
+
+    def test_it_only_sizes_columns_that_fit(self):
+        rows = [
+            {"id": i, "name": f"customer {i}", "total": i, "notes": "x" * 30}
+            for i in range(3)
+        ]
+        table = get_rendered_table(rows, max_table_width=30)
+        assert [s.name for s in table.column_specs] == ["id", "name", "total"]
+        assert table.hidden_columns == ["notes"]
+        assert str(table).split("\n")[-1] == (
+            "… 1 more columns (see them with query-stash view): notes"
+        )
+
+    def test_it_shrinks_a_first_column_wider_than_the_table(self):
+        table = get_rendered_table(self.rows, columns=["notes"], max_table_width=20)
+        assert table.column_specs[0].width == 16
+        assert table.hidden_columns == []
+
+
+class TestGetRenderedTableTupleRows:
+    def setup_method(self):
+        self.schema = Schema(("id", "name", "count"))
+        self.rows = [(i, f"customer {i}", i * 1000) for i in range(3)]
+
+    def test_it_renders_like_dict_rows(self):
+        table = get_rendered_table(self.rows, schema=self.schema)
+        dict_table = get_rendered_table(self.schema.to_dicts(self.rows))
+        assert str(table) == str(dict_table)
+
+    def test_it_projects_columns_by_position(self):
+        table = get_rendered_table(
+            self.rows, columns=["count", "id"], schema=self.schema
+        )
+        assert table.make_printable_row(table.rows[2]) == "| 2,000 | 2  |"
+
+    def test_a_single_row_is_pivoted(self):
+        table = get_rendered_table(self.rows[:1], schema=self.schema)
+        assert str(table).split("\n")[2] == "| name  | customer 0 |"
+
+    def test_repeated_column_names_keep_their_own_values(self):
+        schema = Schema.from_description(
+            [("id", 0), ("id", 0), ("count(*)", 0), ("count", 0)]
+        )
+        rows = [(1, 10, 5, 6), (2, 20, 7, 8)]
+        table = get_rendered_table(rows, schema=schema)
+        assert table.make_printable_row(rows[1]) == "| 2  | 20 | 7     | 8     |"
+        pivoted = get_rendered_table(rows[:1], schema=schema)
+        assert "| id    | 10    |" in str(pivoted)
+
+
+class TestParallelRendering:
+    def setup_method(self):
+        self.rows = [
+            {
+                "id": i,
+                "name": f"customer {i}" if i % 3 else None,
+                "total_usd": Decimal(i) / 7,
+                "created_at": datetime(2023, 1, 1 + i % 28),
+            }
+            for i in range(25)
+        ]
+
+    def test_it_formats_chunks_in_order_like_one_process(self, monkeypatch):
+        monkeypatch.setattr(render, "PARALLEL_RENDER_MIN_ROWS", 10)
+        table = get_rendered_table(self.rows, max_width=12)
+        expected = str(table)
+        parallel_table = RenderedTable(table.column_specs, table.rows, processes=2)
+        chunks = list(
+            iter_printable_chunks_in_parallel(
+                parallel_table.column_specs,
+                parallel_table.cell_keys,
+                parallel_table.rows,
+                processes=2,
+                chunk_size=4,
+            )
+        )
+        assert len(chunks) == 7
+        assert "\n".join(chunks) == table.printable_rows
+        assert str(parallel_table) == expected
+
+    def test_small_tables_stay_in_process(self):
+        table = get_rendered_table(self.rows, processes=2)
+        assert table.processes == 2
+        assert str(table) == str(get_rendered_table(self.rows))
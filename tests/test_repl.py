@@ -0,0 +1,58 @@
+import io
+
+from query_stash.repl import Repl, StashCompleter, get_statement
+
+
+def run_lines(session, lines):
+    output = io.StringIO()
+    remaining = iter(lines)
+
+    def read_line(prompt):
+        try:
+            return next(remaining)
+        except StopIteration:
+            raise EOFError
+
+    Repl(session, "mem", read_line, output).run()
+    return output.getvalue()
+
+
+def test_statements_end_with_a_semicolon_or_a_blank_line():
+    assert get_statement(["select 1"]) is None
+    assert get_statement(["select", "1;"]) == "select\n1"
+    assert get_statement(["select 1", ""]) == "select 1"
+    assert get_statement([""]) is None
+
+
+class TestRepl:
+    def test_it_runs_queries_on_one_connection(self, session):
+        output = run_lines(
+            session,
+            [
+                "create table orders as select range as order_id from range(3);",
+                "select order_id",
+                "from orders;",
+            ],
+        )
+        assert "| order_id |" in output
+        assert list(session.connectors) == ["mem"]
+        assert session.stasher.get_recent_queries("mem", 1) == [
+            "select order_id\nfrom orders"
+        ]
+
+    def test_it_keeps_going_after_errors(self, session):
+        output = run_lines(session, ["select * from nope;", "select 42 as answer;"])
+        assert "nope" in output
+        assert "answer" in output
+
+    def test_it_stops_at_quit(self, session):
+        output = run_lines(session, ["\\q", "select 42 as answer;"])
+        assert "answer" not in output
+
+
+def test_it_completes_names_from_the_stash(session):
+    session.query("select 1 as order_total, 2 as order_count")
+    completer = StashCompleter(session)
+    assert completer.get_candidates("order_") == ["order_count", "order_total"]
+    assert completer.complete("ORDER_T", 0) == "order_total"
+    assert completer.complete("ORDER_T", 1) is None
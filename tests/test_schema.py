@@ -0,0 +1,17 @@
+from query_stash.schema import Schema
+
+
+class TestSchema:
+    def test_it_cleans_names_from_a_cursor_description(self):
+        description = [("id", 23, None), ("count(*)", 20, None)]
+        schema = Schema.from_description(description)
+        assert schema.names == ("id", "count")
+        assert schema.type_codes == (23, 20)
+
+    def test_statements_without_results_have_no_columns(self):
+        assert Schema.from_description(None).names == ()
+
+    def test_it_finds_column_positions(self):
+        schema = Schema(("id", "name"))
+        assert schema.position("name") == 1
+        assert schema.to_dicts([(1, "Sam")]) == [{"id": 1, "name": "Sam"}]
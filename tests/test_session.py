@@ -0,0 +1,145 @@
+import io
+
+import duckdb
+from pytest import fixture, raises
+
+from query_stash import session as session_module
+from query_stash.schema import Schema
+from query_stash.sqlite import ResultRowSettings
+
+
+class TestSession:
+    def test_it_reuses_each_connection(self, session):
+        session.get_rows("create table orders as select 1 as id, 'open' as status")
+        err, schema, rows = session.get_rows("select * from orders", "mem")
+        assert err is None
+        assert schema.names == ("id", "status")
+        assert rows == [[1, "open"]]
+        assert list(session.connectors) == ["mem"]
+
+    def test_it_renders_and_stashes_queries(self, session):
+        table_text = session.query("select 42 as answer")
+        assert "42" in table_text
+        assert session.stasher.get_latest_result_query_id() is not None
+        assert session.stasher.search_queries("answer", 10)[0][2] == "mem"
+        assert session.last_stash_id == session.stasher.get_latest_result_query_id()
+
+    def test_failed_queries_have_no_stash_id(self, session):
+        session.query("select 42 as answer")
+        session.query("select 1 where false")
+        assert session.last_stash_id is None
+
+    def test_it_writes_tables_to_an_output_as_they_render(self, session):
+        output = io.StringIO()
+        table_text = session.query("select 42 as answer", output=output)
+        assert output.getvalue() == table_text + "\n"
+
+    def test_it_commits_each_statement_or_rolls_it_back(self, session, monkeypatch):
+        connector = session.get_connector()
+        ended = []
+        monkeypatch.setattr(connector, "commit", lambda: ended.append("commit"))
+        monkeypatch.setattr(connector, "rollback", lambda: ended.append("rollback"))
+        session.query("select 42 as answer")
+        session.export("select 42 as answer", "csv", str(session.config_path) + ".csv")
+        with raises(duckdb.Error):
+            session.get_rows("select * from no_such_table")
+        assert ended == ["commit", "commit", "rollback"]
+
+    def test_paged_queries_stash_an_excerpt_and_every_row(self, session):
+        session.stasher.result_row_settings = ResultRowSettings(max_rows=10)
+        table_text = session.query("select range as n from range(200)", pager=True)
+        assert len(table_text.split("\n")) == session_module.PAGED_EXCERPT_LINES
+        assert session.stasher.get_result_row_count(session.last_stash_id) == 200
+
+    def test_closing_it_closes_its_connections(self, session):
+        session.get_rows("select 1")
+        session.close()
+        assert session.connectors == {}
+        assert session.stasher._conn is None
+
+
+class TestParameterizedQueries:
+    def test_it_runs_a_query_once_per_parameter_set(self, session):
+        table_text = session.query_each(
+            "select :n * 2 as doubled, ':n' as literal", [{"n": 1}, {"n": 21}]
+        )
+        assert "-- :n = 21" in table_text
+        assert "42" in table_text
+        assert ":n" in table_text
+        stashed = session.stasher.search_queries("doubled", 10)
+        assert len(stashed) == 2
+
+    def test_a_missing_value_ends_the_batch(self, session):
+        table_text = session.query_each("select :n as n", [{"m": 1}, {"n": 2}])
+        assert table_text == "-- :m = 1\nNo value given for :n"
+
+    def test_driver_errors_end_the_batch_but_keep_earlier_runs(self, session):
+        table_text = session.query_each(
+            "select 10 // :n as tenths", [{"n": 5}, {"n": "five"}, {"n": 1}]
+        )
+        assert table_text.startswith("-- :n = 5\n")
+        assert '-- :n = "five"\n┆Conversion Error' in table_text
+        assert "-- :n = 1" not in table_text
+        assert len(session.stasher.search_queries("tenths", 10)) == 1
+
+    def test_it_runs_statements_as_one_batch(self, session):
+        session.get_rows("create table seen (id integer, name varchar)")
+        summary = session.execute_many(
+            "insert into seen values (:id, :name)",
+            [{"id": 1, "name": "a"}, {"id": 2, "name": "b"}],
+        )
+        assert summary == "Ran for 2 parameter sets"
+        _, _, rows = session.get_rows("select * from seen order by id")
+        assert rows == [[1, "a"], [2, "b"]]
+
+
+class FakeSnowflakeConnector:
+    connection_name = "snow"
+    connection_type = "snowflake"
+
+    def __init__(self):
+        self.polls = {}
+
+    def submit_query(self, query):
+        query_id = f"q{len(self.polls)}"
+        # each query finishes after it's been polled once per its number
+        self.polls[query_id] = len(self.polls)
+        return None, query_id
+
+    def poll_submitted_query(self, query_id):
+        self.polls[query_id] -= 1
+        return None, self.polls[query_id] >= 0
+
+    def get_submitted_rows(self, query_id):
+        return None, Schema(("query_id",)), [(query_id,)]
+
+    def close(self):
+        pass
+
+
+class TestSubmittedQueries:
+    @fixture
+    def connector(self, session, monkeypatch):
+        connector = FakeSnowflakeConnector()
+        session.connectors["snow"] = connector
+        monkeypatch.setattr(session_module, "FIRST_POLL_SECONDS", 0)
+        return connector
+
+    def test_it_collects_queries_as_they_finish(self, session, connector):
+        for query in ("select 'slow'", "select 'quick'"):
+            session.submit(query, "snow")
+        connector.polls["q0"] = 2
+        collected = [
+            (submitted.backend_query_id, table_text)
+            for submitted, table_text in session.collect()
+        ]
+        assert [query_id for query_id, _ in collected] == ["q1", "q0"]
+        assert "q1" in collected[0][1]
+        assert session.stasher.get_pending_submitted_queries() == []
+
+    def test_it_leaves_running_queries_for_later(self, session, connector):
+        session.submit("select 1", "snow")
+        session.submit("select 2", "snow")
+        assert [s.query_text for s, _ in session.collect(wait=False)] == ["select 1"]
+        pending = session.stasher.get_pending_submitted_queries()
+        assert [submitted.backend_query_id for submitted in pending] == ["q1"]
@@ -0,0 +1,64 @@
+import pytest
+from snowflake.connector.connection import SnowflakeConnection
+from snowflake.connector.constants import QueryStatus
+from snowflake.connector.errors import ProgrammingError
+
+from query_stash.connectors.snowflake import (
+    get_result_scan_query,
+    iter_snowflake_arrow_batches,
+    snowflake_query_is_running,
+)
+
+
+class FakeArrowCursor:
+    def __init__(self, tables):
+        self.tables = tables
+
+    def fetch_arrow_batches(self):
+        return iter(self.tables)
+
+
+def test_it_splits_result_chunks_into_batches():
+    pyarrow = pytest.importorskip("pyarrow")
+    chunks = [pyarrow.table({"id": list(range(5))}), pyarrow.table({"id": [5]})]
+    batches = list(iter_snowflake_arrow_batches(FakeArrowCursor(chunks), 2))
+    assert [batch.num_rows for batch in batches] == [2, 2, 1, 1]
+
+
+def test_it_builds_result_scan_queries():
+    query_id = "01b2c3d4-0000-1a2b-0000-0001e2f3a4b5"
+    assert get_result_scan_query(query_id) == (
+        f"SELECT * FROM TABLE(RESULT_SCAN('{query_id}'))"
+    )
+
+
+def test_it_rejects_things_that_arent_query_ids():
+    with pytest.raises(ValueError):
+        get_result_scan_query("x'); DROP TABLE t; --")
+
+
+class FakeAsyncConnection:
+    def __init__(self, statuses):
+        self.statuses = statuses
+
+    def get_query_status_throw_if_error(self, query_id):
+        status = self.statuses[query_id]
+        if status == QueryStatus.FAILED_WITH_ERROR:
+            raise ProgrammingError(f"Query {query_id} failed")
+        return status
+
+    is_still_running = staticmethod(SnowflakeConnection.is_still_running)
+
+
+def test_it_polls_submitted_queries():
+    conn = FakeAsyncConnection(
+        {"queued": QueryStatus.QUEUED, "done": QueryStatus.SUCCESS}
+    )
+    assert snowflake_query_is_running(conn, "queued")
+    assert not snowflake_query_is_running(conn, "done")
+
+
+def test_it_raises_for_failed_submitted_queries():
+    conn = FakeAsyncConnection({"failed": QueryStatus.FAILED_WITH_ERROR})
+    with pytest.raises(ProgrammingError):
+        snowflake_query_is_running(conn, "failed")
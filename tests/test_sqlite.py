@@ -0,0 +1,215 @@
+import sqlite3
+
+import pytest
+from pytest import fixture
+
+from query_stash.config import ConfigException
+from query_stash.schema import Schema
+from query_stash.sqlite import (
+    QueryStasher,
+    ResultRowSettings,
+    SearchIndexSettings,
+    get_result_row_settings,
+    get_results_excerpt,
+    get_search_index_settings,
+)
+from query_stash.timing import Timings
+
+
+@fixture
+def stasher(tmp_path):
+    return QueryStasher(str(tmp_path / "query-stash.db"))
+
+
+class TestQueryStasher:
+    def test_stash_returns_the_new_query_id(self, stasher):
+        first = stasher.stash("select 1", "| 1 |", "", "mem", "duckdb")
+        second = stasher.stash("select 2", "| 2 |", "", "mem", "duckdb")
+        assert second == first + 1
+
+    def test_it_persists_timings_with_the_query(self, stasher):
+        timings = Timings()
+        with timings.span("execute"):
+            pass
+        with timings.span("fetch"):
+            pass
+        query_id = stasher.stash("select 1", "| 1 |", "", "mem", "duckdb", timings)
+        assert [phase for phase, _ in stasher.get_timings(query_id)] == [
+            "execute",
+            "fetch",
+        ]
+
+    def test_it_reports_creating_the_stash_on_stderr(self, tmp_path, capsys):
+        QueryStasher(str(tmp_path / "new.db"))
+        captured = capsys.readouterr()
+        assert captured.out == ""
+        assert "Creating SQLite database" in captured.err
+
+    def test_it_adds_missing_tables_to_an_existing_stash(self, tmp_path):
+        db_path = str(tmp_path / "query-stash.db")
+        stasher = QueryStasher(db_path)
+        with stasher.get_sqlite_conn() as conn:
+            conn.execute("DROP TABLE query_timings")
+        QueryStasher(db_path)
+        assert stasher.get_timings(1) == []
+
+    def test_it_records_query_stats(self, stasher):
+        timings = Timings()
+        with timings.span("execute"):
+            pass
+        query_id = stasher.stash(
+            "select 1",
+            "| 1 |",
+            "",
+            "mem",
+            "duckdb",
+            timings,
+            row_count=1,
+            backend_query_id="01ab",
+        )
+        [run] = stasher.get_query_runs(connection_name="mem")
+        assert run.query_id == query_id
+        assert run.query_text == "select 1"
+        assert run.fetch_seconds is None
+        assert run.row_count == 1
+        assert run.byte_size == 5
+        assert run.backend_query_id == "01ab"
+        assert stasher.get_query_runs(connection_name="other") == []
+
+    def test_it_stashes_tuple_rows_with_their_schema(self, stasher):
+        schema = Schema(("id", "name"))
+        query_id = stasher.stash(
+            "select 1", "", "", "mem", "duckdb", rows=[(1, "Sam")], schema=schema
+        )
+        assert stasher.get_result_columns(query_id) == [("id", "int"), ("name", "str")]
+        assert stasher.get_result_rows(query_id, 0, 10) == [[1, "Sam"]]
+
+    def test_it_finds_backend_query_ids(self, stasher):
+        query_id = stasher.stash(
+            "select 1", "", "", "snow", "snowflake", backend_query_id="01ab"
+        )
+        assert stasher.get_backend_query_id(query_id) == ("01ab", "snow")
+        other_id = stasher.stash("select 1", "", "", "mem", "duckdb")
+        assert stasher.get_backend_query_id(other_id) is None
+
+    def test_it_reads_stashed_rows_as_json_in_batches(self, stasher):
+        rows = [(i,) for i in range(5)]
+        query_id = stasher.stash(
+            "select 1", "", "", "mem", "duckdb", rows=rows, schema=Schema(("id",))
+        )
+        batches = list(stasher.iter_result_row_json(query_id, batch_size=2))
+        assert batches == [["[0]", "[1]"], ["[2]", "[3]"], ["[4]"]]
+
+    def test_it_only_stores_rows_of_results_within_the_limits(self, tmp_path):
+        stasher = QueryStasher(
+            str(tmp_path / "query-stash.db"),
+            result_row_settings=ResultRowSettings(max_rows=2, max_mb=0.0001),
+        )
+        schema = Schema(("name",))
+
+        def stash(rows, **kwargs):
+            query_id = stasher.stash(
+                "select 1", "", "", "mem", "duckdb", rows=rows, schema=schema, **kwargs
+            )
+            return stasher.get_result_row_count(query_id)
+
+        assert stash([("a",), ("b",)]) == 2
+        assert stash([("a",), ("b",), ("c",)]) == 0
+        assert stash([("x" * 200,)]) == 0
+        assert stash([("a",), ("b",), ("c",)], keep_all_rows=True) == 3
+
+    def test_it_reads_each_entry_with_its_own_columns(self, stasher):
+        for name in ("a", "b", "c"):
+            stasher.stash(
+                f"select 1 as {name}",
+                "",
+                "",
+                "mem",
+                "duckdb",
+                rows=[(1,)],
+                schema=Schema((name,)),
+            )
+        entries = stasher.iter_entries(since_query_id=1)
+        assert next(entries).columns == [(0, "b", "int")]
+        assert [entry.columns for entry in entries] == [[(0, "c", "int")]]
+
+
+OLD_FTS_QUERIES_TABLE_QUERY = """\
+CREATE VIRTUAL TABLE queries USING fts5(
+    query_text
+    , results_as_table_text
+    , tags
+    , queried_at
+    , db_connection_type
+    , db_connection_name
+);"""
+
+
+class TestSearchIndex:
+    def test_it_finds_substrings_of_identifiers(self, stasher):
+        query_id = stasher.stash(
+            "select * from dbt_collin.raw_customers", "| id |", "", "pg", "postgres"
+        )
+        stasher.stash("select 1", "| 1 |", "", "pg", "postgres")
+        found = stasher.search_queries("COLLIN.RAW_CUST")
+        assert [row[0] for row in found] == [query_id]
+        assert found[0][2:] == ("pg", "select * from dbt_collin.raw_customers")
+
+    def test_it_scans_for_text_too_short_for_trigrams(self, stasher):
+        query_id = stasher.stash("select 'ab'", "", "", "pg", "postgres")
+        stasher.stash("select 1", "", "", "pg", "postgres")
+        assert [row[0] for row in stasher.search_queries("ab")] == [query_id]
+
+    def test_it_only_indexes_an_excerpt_of_results(self, tmp_path):
+        settings = SearchIndexSettings(result_excerpt_kb=1)
+        stasher = QueryStasher(str(tmp_path / "stash.db"), settings)
+        stasher.stash("select 1", "| early |" + "x" * 2000 + "late", "", "m", "d")
+        assert stasher.search_queries("early")
+        assert stasher.search_queries("late") == []
+
+    def test_it_moves_an_old_stash_onto_the_search_index(self, tmp_path):
+        db_path = str(tmp_path / "stash.db")
+        with sqlite3.connect(db_path) as conn:
+            conn.execute(OLD_FTS_QUERIES_TABLE_QUERY)
+            conn.execute(
+                "INSERT INTO queries (rowid, query_text, db_connection_name) "
+                "VALUES (41, 'select * from orders', 'pg')"
+            )
+        stasher = QueryStasher(db_path)
+        assert stasher.get_query_text(41)[:2] == ("select * from orders", "pg")
+        assert [row[0] for row in stasher.search_queries("orders")] == [41]
+        assert stasher.stash("select 2", "", "", "pg", "postgres") == 42
+
+    def test_a_new_tokenizer_rebuilds_the_index(self, stasher):
+        stasher.stash("select * from raw_customers", "", "", "pg", "postgres")
+        rebuilt = QueryStasher(
+            stasher.sqlite_db_path, SearchIndexSettings(tokenizer="unicode61")
+        )
+        assert rebuilt.tokenizer == "unicode61"
+        assert rebuilt.search_queries("raw_customers")
+        assert rebuilt.search_queries("custom") == []
+        assert QueryStasher(stasher.sqlite_db_path).tokenizer == "unicode61"
+
+
+def test_search_index_settings_come_from_the_config():
+    config = {"stash": {"tokenizer": "unicode61", "index_results": "header"}}
+    assert get_search_index_settings(config) == SearchIndexSettings(
+        "unicode61", "header", 4
+    )
+    with pytest.raises(ConfigException):
+        get_search_index_settings({"stash": {"index_results": "all"}})
+
+
+def test_result_row_limits_come_from_the_config():
+    config = {"stash": {"max_result_rows": 10, "max_result_mb": 0}}
+    assert get_result_row_settings(config) == ResultRowSettings(10, 0)
+    assert get_result_row_settings() == ResultRowSettings()
+    with pytest.raises(ConfigException):
+        get_result_row_settings({"stash": {"max_result_rows": "lots"}})
+
+
+def test_header_excerpts_skip_break_lines():
+    settings = SearchIndexSettings(result_excerpt="header")
+    assert get_results_excerpt("| id |\n| -- |\n| 1  |", settings) == "| id |"
+    assert get_results_excerpt("| -- | - |\n| id | 1 |", settings) == "| id | 1 |"
+    assert get_results_excerpt("| id |", settings._replace(result_excerpt="none")) == ""
@@ -0,0 +1,77 @@
+from pytest import approx
+
+from query_stash.stats import (
+    QueryRun,
+    fingerprint_query,
+    get_trend,
+    normalize_query,
+    percentile,
+    summarize_runs,
+)
+
+
+def make_run(query_id, latency, fingerprint="abc", connection="mem", rows=10):
+    return QueryRun(
+        query_id=query_id,
+        fingerprint=fingerprint,
+        db_connection_name=connection,
+        query_text="select *\n  from t",
+        queried_at=f"2023-01-0{query_id} 00:00:00",
+        execute_seconds=latency,
+        fetch_seconds=0.0,
+        row_count=rows,
+        byte_size=100,
+        backend_query_id=None,
+    )
+
+
+class TestNormalizeQuery:
+    def test_it_ignores_literals_whitespace_case_and_comments(self):
+        one = "SELECT * FROM t WHERE id = 1 AND name = 'Sam' -- first"
+        two = "select *\n  from t\nwhere id=22 and name='Layla';"
+        assert normalize_query(one) == normalize_query(two)
+        assert fingerprint_query(one) == fingerprint_query(two)
+
+    def test_it_collapses_in_lists(self):
+        assert normalize_query("select 1 from t where id in (1, 2, 3)") == (
+            normalize_query("select 1 from t where id in (4)")
+        )
+
+    def test_it_distinguishes_different_queries(self):
+        assert fingerprint_query("select * from a") != fingerprint_query(
+            "select * from b"
+        )
+
+
+class TestPercentile:
+    def test_it_interpolates(self):
+        assert percentile([1, 2, 3, 4], 50) == 2.5
+        assert percentile([4, 1, 3, 2], 100) == 4
+        assert percentile([7], 95) == 7
+
+
+class TestGetTrend:
+    def test_it_needs_enough_runs(self):
+        assert get_trend([1, 2, 3]) is None
+
+    def test_it_compares_newer_runs_to_older_runs(self):
+        assert get_trend([1, 1, 2, 2]) == approx(1.0)
+
+
+class TestSummarizeRuns:
+    def test_it_groups_by_fingerprint_and_connection(self):
+        runs = [
+            make_run(1, 1.0),
+            make_run(2, 3.0),
+            make_run(3, 0.5, fingerprint="def"),
+            make_run(4, 2.0, connection="snowflake"),
+        ]
+        summaries = summarize_runs(runs)
+        assert [(s["fingerprint"], s["connection"], s["runs"]) for s in summaries] == [
+            ("abc", "mem", 2),
+            ("abc", "snowflake", 1),
+            ("def", "mem", 1),
+        ]
+        assert summaries[0]["p50_seconds"] == 2.0
+        assert summaries[0]["last_seconds"] == 3.0
+        assert summaries[0]["query"] == "select * from t"
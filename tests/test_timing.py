@@ -0,0 +1,56 @@
+from query_stash.timing import Timings, record_timings, span
+
+
+class TestSpan:
+    def test_it_does_nothing_when_not_recording(self):
+        with span("execute"):
+            pass
+
+    def test_it_records_phases_into_the_active_timings(self):
+        with record_timings() as timings:
+            with span("execute"):
+                pass
+            with span("fetch"):
+                with span("duckdb.to_pandas"):
+                    pass
+        assert [s.name for s in timings.ordered_spans()] == [
+            "execute",
+            "fetch",
+            "duckdb.to_pandas",
+        ]
+        assert [s.depth for s in timings.ordered_spans()] == [0, 0, 1]
+
+    def test_it_stops_recording_when_the_block_exits(self):
+        with record_timings() as timings:
+            pass
+        with span("execute"):
+            pass
+        assert timings.spans == []
+
+
+class TestTimings:
+    def test_it_sums_repeated_phases(self):
+        timings = Timings()
+        for _ in range(3):
+            with timings.span("fetch"):
+                pass
+        assert list(timings.by_phase()) == ["fetch"]
+        assert timings.by_phase()["fetch"] == sum(s.seconds for s in timings.spans)
+
+    def test_total_only_counts_top_level_phases(self):
+        timings = Timings()
+        with timings.span("fetch"):
+            with timings.span("duckdb.to_pandas"):
+                pass
+        assert timings.total_seconds == timings.spans[-1].seconds
+
+    def test_it_prints_a_breakdown(self):
+        timings = Timings()
+        with timings.span("fetch"):
+            with timings.span("duckdb.to_pandas"):
+                pass
+        lines = str(timings).split("\n")
+        assert lines[0].split() == ["phase", "seconds", "%"]
+        assert lines[1].startswith("fetch ")
+        assert lines[2].startswith("  duckdb.to_pandas ")
+        assert lines[3].startswith("total ")